@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Necesario para /api/stream/... (SSE) y para aprovechar las vistas de /api/async/...
+Ejemplo: uvicorn config.asgi:application --workers 2
 """
 
 import os
@@ -6,6 +6,7 @@ Generated by 'django-admin startproject' using Django 5.2.8.
 
 from pathlib import Path
 import os
+import sys
 from dotenv import load_dotenv  # Importante para leer el .env
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Constraints de exclusión (reservas sin solapamiento)
 
     # Third party apps
     'rest_framework',
@@ -49,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',  # Primero: mide la request completa (ver core/metrics.py)
+    'core.query_checks.QueryInspectorMiddleware',  # Solo con QUERY_INSPECTOR=True (desarrollo)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     
@@ -133,6 +137,36 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 
+# =========================================================
+#  CACHÉ COMPARTIDO (versiones de precios/catálogo, ETags)
+# =========================================================
+
+# Los contadores de versión (core/versioning.py) tienen que verse igual desde
+# todos los workers: con un caché por proceso un worker seguiría cotizando con
+# tarifas viejas después de que otro guardó un cambio.
+# CACHE_URL=redis://host:6379/0 (recomendado, requiere el paquete redis) o
+# memcached://host:11211 (requiere pymemcache); sin CACHE_URL se usa una tabla
+# de la propia BD (la crea la migración 0011 o 'manage.py createcachetable').
+CACHE_URL = os.getenv('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}
+elif CACHE_URL.startswith('memcached://'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': CACHE_URL.removeprefix('memcached://'),
+    }
+else:
+    SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'core_cache'}
+
+# Los tests corren en un solo proceso y cuentan consultas con assertNumQueries:
+# ahí el caché en memoria alcanza y no suma consultas a la tabla de caché.
+TESTING = sys.argv[1:2] == ['test']
+if TESTING and not CACHE_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+else:
+    CACHES = {'default': SHARED_CACHE}
+
+
 # =========================================================
 #  CONFIGURACIÓN ADICIONAL (DRF & CORS)
 # =========================================================
@@ -152,4 +186,95 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny', # Para desarrollo inicial facilita las cosas
     ]
-}
\ No newline at end of file
+}
+
+
+# =========================================================
+#  PAGOS (Mercado Pago)
+# =========================================================
+
+# 'mercadopago' o 'fake' (pasarela en memoria de core/fakes.py, sin red)
+PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'mercadopago')
+
+# Cliente HTTP compartido por proceso (core/gateway.py)
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_CONNECT_TIMEOUT', '3'))
+PAYMENT_GATEWAY_READ_TIMEOUT = float(os.getenv('PAYMENT_GATEWAY_READ_TIMEOUT', '10'))
+PAYMENT_GATEWAY_MAX_RETRIES = int(os.getenv('PAYMENT_GATEWAY_MAX_RETRIES', '2'))
+PAYMENT_GATEWAY_POOL_SIZE = int(os.getenv('PAYMENT_GATEWAY_POOL_SIZE', '10'))
+
+# Circuit breaker: se abre tras N fallas seguidas y prueba de nuevo tras X segundos
+PAYMENT_GATEWAY_BREAKER_THRESHOLD = int(os.getenv('PAYMENT_GATEWAY_BREAKER_THRESHOLD', '5'))
+PAYMENT_GATEWAY_BREAKER_RESET_SECONDS = float(os.getenv('PAYMENT_GATEWAY_BREAKER_RESET_SECONDS', '30'))
+
+# Outbox de preferencias de pago: además del worker (process_payment_outbox),
+# el propio proceso web despacha la preferencia en un thread al confirmar la transacción.
+PAYMENT_OUTBOX_INLINE_DISPATCH = os.getenv('PAYMENT_OUTBOX_INLINE_DISPATCH', 'True') == 'True'
+PAYMENT_OUTBOX_INLINE_WORKERS = int(os.getenv('PAYMENT_OUTBOX_INLINE_WORKERS', '4'))
+
+
+# =========================================================
+#  CICLO DE VIDA DE RESERVAS (manage.py run_reservation_lifecycle)
+# =========================================================
+
+# Minutos que una reserva 'pending' sin pagos retiene la cancha antes de vencer
+RESERVATION_PENDING_TTL_MINUTES = int(os.getenv('RESERVATION_PENDING_TTL_MINUTES', '30'))
+RESERVATION_LIFECYCLE_BATCH_SIZE = int(os.getenv('RESERVATION_LIFECYCLE_BATCH_SIZE', '500'))
+
+
+# =========================================================
+#  DISPONIBILIDAD EN TIEMPO REAL (SSE, requiere servidor ASGI)
+# =========================================================
+
+# 'core.events.InProcessBroker' si todo corre en un único proceso ASGI (uvicorn/daphne);
+# 'core.events.PostgresBroker' (LISTEN/NOTIFY) si hay varios procesos o workers WSGI aparte.
+AVAILABILITY_BROKER = os.getenv('AVAILABILITY_BROKER', 'core.events.InProcessBroker')
+# Comentario keep-alive para que proxies y balanceadores no corten la conexión
+AVAILABILITY_STREAM_HEARTBEAT_SECONDS = float(os.getenv('AVAILABILITY_STREAM_HEARTBEAT_SECONDS', '15'))
+
+
+# =========================================================
+#  MÉTRICAS Y LOGS (GET /metrics, ver core/metrics.py)
+# =========================================================
+
+# Si está definido, /metrics exige el header 'Authorization: Bearer <token>'.
+# Sin token (y con DEBUG=False) solo responde a las IPs de METRICS_ALLOWED_IPS.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+
+# Una línea JSON por request en 'core.requests' (método, ruta, status, latencia, BD y pasarela).
+# REQUEST_LOG_LEVEL=WARNING la apaga sin tocar las métricas.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'line': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'line'},
+    },
+    'loggers': {
+        'core.requests': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        # Pagos aplicados/a devolver (core/inbox.py) y fallas del broker de eventos (core/events.py)
+        'core.payments': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        'core.events': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        # Errores inesperados al crear reservas (core/views/ReservationViews.py)
+        'core.reservations': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+
+# =========================================================
+#  CONSULTAS N+1 Y PRESUPUESTOS (ver core/query_checks.py)
+# =========================================================
+
+# Loguea las consultas repetidas de cada request con su call site
+QUERY_INSPECTOR = os.getenv('QUERY_INSPECTOR', str(DEBUG)) == 'True'
+QUERY_INSPECTOR_RAISE = os.getenv('QUERY_INSPECTOR_RAISE', 'False') == 'True'
+# query_budget(): 'raise' hace fallar la vista (y el test), 'log' solo avisa, 'off' no mide
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'raise' if DEBUG or TESTING else 'off')
+# Veces que una misma forma de consulta puede repetirse antes de considerarse N+1
+QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', '3'))
@@ -2,10 +2,12 @@ from django.contrib import admin
 from django.urls import path, include # <--- 1. IMPORTANTE: importar include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views.MetricsViews import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')), 
+    path('metrics', metrics, name='metrics'),  # Prometheus
 ]
 
 if settings.DEBUG:
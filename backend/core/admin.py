@@ -1,15 +1,19 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
 from .models import (
     UserProfile, License, Company, BusinessHour, 
     CourtType, Court, TimeSlot, CourtTypePrice, 
     AddOn, Reservation, ReservationAddOn, Payment
 )
+from .reservations import approve_payments, void_reservations, InsufficientStock
 
 # --- 1. CONFIGURACIÓN DE USUARIOS Y EMPRESAS ---
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone', 'is_company_admin')
+    list_select_related = ('user', 'managed_company')
     search_fields = ('user__username', 'user__email', 'phone')
     
     def is_company_admin(self, obj):
@@ -23,6 +27,7 @@ class BusinessHourInline(admin.TabularInline):
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
     list_display = ('name', 'license_status', 'created_at')
+    list_select_related = ('license',)  # license_status lee obj.license en cada fila
     inlines = [BusinessHourInline] # Permite editar horarios dentro de la empresa
     
     def license_status(self, obj):
@@ -31,6 +36,7 @@ class CompanyAdmin(admin.ModelAdmin):
 @admin.register(License)
 class LicenseAdmin(admin.ModelAdmin):
     list_display = ('license_key', 'company_name', 'status', 'end_date')
+    list_select_related = ('company',)
     list_filter = ('status', 'license_type')
     
     def company_name(self, obj):
@@ -47,25 +53,54 @@ class CourtTypePriceInline(admin.TabularInline):
 class CourtTypeAdmin(admin.ModelAdmin):
     inlines = [CourtTypePriceInline] # Ver precios al editar el tipo
     list_display = ('name', 'company')
+    list_select_related = ('company',)
 
 @admin.register(TimeSlot)
 class TimeSlotAdmin(admin.ModelAdmin):
     list_display = ('name', 'company', 'start_time', 'end_time')
+    list_select_related = ('company',)
     list_filter = ('company',)
 
 @admin.register(Court)
 class CourtAdmin(admin.ModelAdmin):
     list_display = ('name', 'court_type', 'company', 'is_active')
+    list_select_related = ('court_type', 'company')
     list_filter = ('company', 'court_type')
 
 @admin.register(AddOn)
 class AddOnAdmin(admin.ModelAdmin):
     list_display = ('name', 'company', 'price', 'stock_quantity')
+    list_select_related = ('company',)
 
 # --- 3. GESTIÓN DE RESERVAS Y PAGOS ---
 
+class ReservationAddOnForm(forms.ModelForm):
+    class Meta:
+        model = ReservationAddOn
+        fields = '__all__'
+
+    def clean(self):
+        # Mismo cálculo que ReservationAddOn.save(), para mostrar el error en la fila
+        # en vez de un 500 (el UPDATE condicional del save sigue siendo la garantía)
+        cleaned_data = super().clean()
+        # En el inline, 'reservation' es la reserva del formulario principal
+        addon, quantity = cleaned_data.get('addon'), cleaned_data.get('quantity')
+        reservation = cleaned_data.get('reservation')
+        if None in (addon, quantity, reservation) or reservation.status not in Reservation.ACTIVE_STATUSES:
+            return cleaned_data
+
+        needed = quantity
+        if self.instance.pk and self.instance.addon_id == addon.id:
+            needed -= self.instance.quantity
+        if needed > addon.stock_quantity:
+            raise forms.ValidationError(
+                {'quantity': f"Stock insuficiente de {addon.name}: quedan {addon.stock_quantity}."}
+            )
+        return cleaned_data
+
 class ReservationAddOnInline(admin.TabularInline):
     model = ReservationAddOn
+    form = ReservationAddOnForm
     extra = 0
     readonly_fields = ('price_snapshot',) # Para que nadie altere el precio histórico
 
@@ -76,10 +111,27 @@ class PaymentInline(admin.TabularInline):
 @admin.register(Reservation)
 class ReservationAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'court', 'start_time', 'total_price', 'amount_pending', 'status_colored')
+    list_select_related = ('user', 'court__court_type')  # Court.__str__ incluye el tipo
     list_filter = ('status', 'start_time', 'court__company')
     search_fields = ('user__username', 'user__email', 'id')
     inlines = [ReservationAddOnInline, PaymentInline]
-    readonly_fields = ('total_price', 'subtotal_court', 'subtotal_addons', 'amount_pending')
+    # El estado cambia solo con las acciones (anular devuelve el stock, etc.):
+    # editarlo a mano no movería el stock ni volvería a chequear solapamientos
+    readonly_fields = ('status', 'total_price', 'subtotal_court', 'subtotal_addons', 'amount_pending')
+    actions = ['void_selected']
+
+    def changeform_view(self, request, *args, **kwargs):
+        # Otra venta se llevó el stock entre la validación del formulario y el guardado
+        try:
+            return super().changeform_view(request, *args, **kwargs)
+        except InsufficientStock as e:
+            self.message_user(request, e.message, messages.ERROR)
+            return HttpResponseRedirect(request.get_full_path())
+
+    def void_selected(self, request, queryset):
+        voided = void_reservations(list(queryset.values_list('id', flat=True)))
+        self.message_user(request, f"{len(voided)} reserva(s) anulada(s).")
+    void_selected.short_description = "Anular reservas seleccionadas (devuelve stock)"
     
     # Colorear el estado para verlo rápido visualmente
     def status_colored(self, obj):
@@ -104,6 +156,7 @@ class PaymentAdmin(admin.ModelAdmin):
     actions = ['approve_payments']
 
     def approve_payments(self, request, queryset):
-        for payment in queryset:
-            payment.approve(request.user)
+        # Una sola transacción con UPDATEs agrupados por reserva
+        approved = approve_payments(list(queryset.values_list('id', flat=True)), request.user)
+        self.message_user(request, f"{approved} pago(s) aprobado(s).")
     approve_payments.short_description = "Aprobar pagos seleccionados"
\ No newline at end of file
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Registra los receivers de invalidación de caché
+        from core import signals  # noqa: F401
+
+        # Cuenta consultas y tiempo de BD por request (ver core/metrics.py)
+        from django.db.backends.signals import connection_created
+        from core.metrics import install_db_wrapper
+        connection_created.connect(install_db_wrapper)
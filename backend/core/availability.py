@@ -0,0 +1,168 @@
+import datetime
+from collections import defaultdict
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.models import BusinessHour, Court, Reservation
+
+# Máximo de días que se devuelven por página en la grilla de disponibilidad.
+# Si el rango pedido es mayor, la respuesta incluye el 'from' de la siguiente página.
+MAX_GRID_DAYS = 14
+
+
+def day_bounds(first_day, last_day):
+    """
+    Devuelve (inicio, fin) aware en la zona horaria local que cubren
+    desde las 00:00 de first_day hasta las 00:00 del día siguiente a last_day.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min), tz)
+    end = timezone.make_aware(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min), tz)
+    return start, end
+
+
+def daterange(first_day, last_day):
+    day = first_day
+    while day <= last_day:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+def serialize_business_hours(business_hours):
+    return {
+        "open": business_hours.open_time.strftime('%H:%M') if business_hours else None,
+        "close": business_hours.close_time.strftime('%H:%M') if business_hours else None,
+        "is_open": business_hours is not None
+    }
+
+
+def serialize_slot(start_time, end_time, status):
+    return {
+        "start": timezone.localtime(start_time).strftime('%H:%M'),
+        "end": timezone.localtime(end_time).strftime('%H:%M'),
+        "status": status
+    }
+
+
+def parse_day(value):
+    """parse_date que devuelve None también para fechas bien formadas pero inexistentes (2023-02-30)."""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def parse_grid_range(query_params):
+    """
+    Lee 'from'/'to' de la grilla por empresa. Devuelve (first_day, page_last_day, next_params):
+    next_params son los query params de la página siguiente (o None).
+    Lanza ValueError con el mensaje para el cliente si los parámetros no son válidos.
+    """
+    from_str = query_params.get('from')
+    to_str = query_params.get('to') or from_str
+
+    if not from_str:
+        raise ValueError("El parámetro 'from' (YYYY-MM-DD) es obligatorio.")
+    try:
+        first_day = parse_date(from_str)
+        last_day = parse_date(to_str)
+    except ValueError:
+        first_day = last_day = None
+    if not first_day or not last_day:
+        raise ValueError("Formato de fecha inválido.")
+    if last_day < first_day:
+        raise ValueError("'to' debe ser mayor o igual a 'from'.")
+
+    # Paginamos por días para que rangos grandes no generen respuestas gigantes
+    next_params = None
+    page_last_day = min(last_day, first_day + datetime.timedelta(days=MAX_GRID_DAYS - 1))
+    if page_last_day < last_day:
+        next_params = query_params.copy()
+        next_params['from'] = (page_last_day + datetime.timedelta(days=1)).isoformat()
+        next_params['to'] = last_day.isoformat()
+    return first_day, page_last_day, next_params
+
+
+def grid_querysets(company, first_day, last_day):
+    """Las 3 consultas de la grilla (canchas, horarios y reservas), sin evaluar."""
+    courts = (
+        Court.objects.filter(company=company, is_active=True)
+        .select_related('court_type')
+        .order_by('id')
+    )
+    business_hours = BusinessHour.objects.filter(company=company)
+
+    range_start, range_end = day_bounds(first_day, last_day)
+
+    # Una sola consulta para todas las canchas y todos los días
+    reservations = Reservation.objects.filter(
+        court__company=company,
+        court__is_active=True,
+        start_time__lt=range_end,
+        end_time__gt=range_start,
+        status__in=Reservation.ACTIVE_STATUSES
+    ).order_by('start_time').values_list('court_id', 'start_time', 'end_time', 'status')
+    return courts, business_hours, reservations
+
+
+def build_company_grid(company, first_day, last_day):
+    """
+    Arma la grilla de disponibilidad de todas las canchas activas de una empresa
+    entre first_day y last_day (inclusive).
+
+    Siempre son 3 consultas (canchas, horarios y reservas), sin importar
+    cuántas canchas o días se pidan.
+    """
+    courts, business_hours, reservations = grid_querysets(company, first_day, last_day)
+    return assemble_company_grid(company, list(courts), list(business_hours), list(reservations), first_day, last_day)
+
+
+async def abuild_company_grid(company, first_day, last_day):
+    """Versión async (ORM async de Django) de build_company_grid para las vistas ASGI."""
+    courts, business_hours, reservations = grid_querysets(company, first_day, last_day)
+    return assemble_company_grid(
+        company,
+        [court async for court in courts],
+        [bh async for bh in business_hours],
+        [row async for row in reservations],
+        first_day, last_day
+    )
+
+
+def assemble_company_grid(company, courts, business_hours, reservations, first_day, last_day):
+    hours_by_weekday = {bh.weekday: bh for bh in business_hours}
+
+    # Repartimos cada reserva en los días que ocupa (una reserva que cruza
+    # la medianoche aparece recortada en ambos días)
+    booked = defaultdict(list)
+    for court_id, start_time, end_time, res_status in reservations:
+        local_start = timezone.localtime(start_time)
+        local_end = timezone.localtime(end_time)
+        for day in daterange(max(local_start.date(), first_day), min(local_end.date(), last_day)):
+            day_start, day_end = day_bounds(day, day)
+            if local_end <= day_start:
+                continue
+            booked[(court_id, day)].append(
+                serialize_slot(max(local_start, day_start), min(local_end, day_end), res_status)
+            )
+
+    days = list(daterange(first_day, last_day))
+
+    return {
+        "company_id": company.id,
+        "from": first_day.isoformat(),
+        "to": last_day.isoformat(),
+        "business_hours": {
+            day.isoformat(): serialize_business_hours(hours_by_weekday.get(day.weekday()))
+            for day in days
+        },
+        "courts": [
+            {
+                "court_id": court.id,
+                "name": court.name,
+                "court_type": court.court_type.name,
+                "days": {day.isoformat(): booked.get((court.id, day), []) for day in days}
+            }
+            for court in courts
+        ]
+    }
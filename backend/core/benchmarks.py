@@ -0,0 +1,398 @@
+import datetime
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import (
+    BusinessHour, Company, Court, CourtDayOccupancy, CourtType, CourtTypePrice, DailyRollup, License,
+    Payment, PaymentOutbox, Reservation, ReservationAddOn, ReservationSeries, TimeSlot, WebhookEvent,
+)
+
+# =========================================================
+#  DATOS SINTÉTICOS Y SUITE DE BENCHMARKS
+# =========================================================
+# seed_bench_data genera un dataset reproducible (misma semilla = mismos datos)
+# con bulk_create por lotes, sin cargar las reservas en memoria.
+# bench_suite mide los endpoints calientes en el mismo proceso (stack completo
+# de middleware con django.test.Client): latencia y cantidad de consultas por
+# request. Todo corre dentro de una transacción que se revierte al final y con
+# la pasarela falsa (core/fakes.py), así las corridas no dejan rastro ni usan red.
+
+BENCH_PREFIX = "Bench "
+OPEN_HOUR, CLOSE_HOUR, NIGHT_HOUR = 8, 23, 18
+COURT_TYPES = ("Fútbol 7", "Pádel")
+
+
+# =========================================================
+#  GENERADOR DE DATOS
+# =========================================================
+
+def bench_companies():
+    return Company.objects.filter(name__startswith=BENCH_PREFIX)
+
+
+def flush_bench_data():
+    """Borra todo lo generado por seed(). Las reservas se borran sin cargarlas (sin signals)."""
+    company_ids = list(bench_companies().values_list('id', flat=True))
+    if not company_ids:
+        return 0
+    reservations = Reservation.objects.filter(court__company_id__in=company_ids)
+    with transaction.atomic():
+        for model in (Payment, ReservationAddOn, PaymentOutbox):
+            model.objects.filter(reservation__in=reservations).delete()
+        CourtDayOccupancy.objects.filter(court__company_id__in=company_ids).delete()
+        DailyRollup.objects.filter(court__company_id__in=company_ids).delete()
+        # Millones de filas: DELETE directo en vez del collector de Django (que dispara signals por fila)
+        reservations._raw_delete(reservations.db)
+        ReservationSeries.objects.filter(court__company_id__in=company_ids).delete()
+        license_ids = list(bench_companies().values_list('license_id', flat=True))
+        Court.objects.filter(company_id__in=company_ids).delete()
+        bench_companies().delete()
+        License.objects.filter(id__in=license_ids).delete()
+    return len(company_ids)
+
+
+def seed_catalog(rng, companies, courts_per_company):
+    """Empresas con horarios, 2 tipos de cancha, 2 franjas y tarifas. Devuelve {court_id: (día, noche)}."""
+    today = timezone.localdate()
+    licenses = License.objects.bulk_create([
+        License(start_date=today - datetime.timedelta(days=365), end_date=today + datetime.timedelta(days=3650))
+        for _ in range(companies)
+    ])
+    company_rows = Company.objects.bulk_create([
+        Company(
+            name=f"{BENCH_PREFIX}{index:04d}", license=license,
+            # Alrededor de Lima, para que /nearby tenga datos
+            latitude=Decimal(f"{-12.05 + rng.uniform(-0.3, 0.3):.6f}"),
+            longitude=Decimal(f"{-77.04 + rng.uniform(-0.3, 0.3):.6f}"),
+        )
+        for index, license in enumerate(licenses, start=1)
+    ])
+
+    BusinessHour.objects.bulk_create([
+        BusinessHour(company=company, weekday=weekday,
+                     open_time=datetime.time(OPEN_HOUR), close_time=datetime.time(CLOSE_HOUR))
+        for company in company_rows for weekday in range(7)
+    ])
+    types = CourtType.objects.bulk_create([
+        CourtType(company=company, name=name) for company in company_rows for name in COURT_TYPES
+    ])
+    slots = TimeSlot.objects.bulk_create([
+        slot for company in company_rows for slot in (
+            TimeSlot(company=company, name="Día", start_time=datetime.time(OPEN_HOUR), end_time=datetime.time(NIGHT_HOUR)),
+            TimeSlot(company=company, name="Noche", start_time=datetime.time(NIGHT_HOUR), end_time=datetime.time(CLOSE_HOUR)),
+        )
+    ])
+
+    type_prices, prices = {}, []
+    for index, company in enumerate(company_rows):
+        day_slot, night_slot = slots[index * 2], slots[index * 2 + 1]
+        for court_type in types[index * 2:index * 2 + 2]:
+            day_price = Decimal(rng.randrange(40, 90, 5))
+            night_price = day_price + Decimal(rng.randrange(20, 45, 5))
+            type_prices[court_type.id] = (day_price, night_price)
+            prices.append(CourtTypePrice(company=company, court_type=court_type, time_slot=day_slot, price=day_price))
+            prices.append(CourtTypePrice(company=company, court_type=court_type, time_slot=night_slot, price=night_price))
+    CourtTypePrice.objects.bulk_create(prices)
+
+    courts = Court.objects.bulk_create([
+        Court(company=company, court_type=types[index * 2 + number % 2], name=f"Cancha {number + 1}")
+        for index, company in enumerate(company_rows) for number in range(courts_per_company)
+    ])
+    return {court.id: type_prices[court.court_type_id] for court in courts}
+
+
+def seed_users(count):
+    User.objects.bulk_create(
+        [User(username=f"bench-user-{index:05d}") for index in range(count)], ignore_conflicts=True
+    )
+    return list(User.objects.filter(username__startswith="bench-user-").values_list('id', flat=True)[:count])
+
+
+def generate_reservations(rng, court_prices, user_ids, first_day, days, per_court_day):
+    """
+    Reservas de 1 hora sin solapamiento (horas distintas por cancha y día).
+    Días pasados: completadas/anuladas/vencidas; futuros: confirmadas o pendientes con seña.
+    """
+    tz = timezone.get_current_timezone()
+    today = timezone.localdate()
+    hours = range(OPEN_HOUR, CLOSE_HOUR)
+    per_court_day = min(per_court_day, len(hours))
+    for offset in range(days):
+        day = first_day + datetime.timedelta(days=offset)
+        midnight = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min), tz)
+        for court_id, (day_price, night_price) in court_prices.items():
+            for hour in rng.sample(hours, per_court_day):
+                price = night_price if hour >= NIGHT_HOUR else day_price
+                roll = rng.random()
+                if day < today:
+                    status = 'completed' if roll < 0.85 else 'voided' if roll < 0.95 else 'expired'
+                    paid = price if status == 'completed' else Decimal('0')
+                else:
+                    status = 'confirmed' if roll < 0.6 else 'pending'
+                    paid = price if roll < 0.3 else (price / 2 if status == 'confirmed' else Decimal('0'))
+                start = midnight + datetime.timedelta(hours=hour)
+                yield Reservation(
+                    court_id=court_id, user_id=rng.choice(user_ids),
+                    start_time=start, end_time=start + datetime.timedelta(hours=1),
+                    subtotal_court=price, total_price=price, amount_paid=paid, amount_pending=price - paid,
+                    status=status,
+                )
+
+
+def seed(companies=5, courts_per_company=8, days=60, per_court_day=6, users=500,
+         seed_value=42, batch_size=5000, derived=True, stdout=None):
+    """
+    Genera el dataset completo. Las reservas cubren 'days' días centrados en hoy
+    (mitad pasado, mitad futuro). Devuelve las cantidades generadas.
+    """
+    rng = random.Random(seed_value)
+    started = time.perf_counter()
+    with transaction.atomic():
+        court_prices = seed_catalog(rng, companies, courts_per_company)
+        user_ids = seed_users(users)
+
+    first_day = timezone.localdate() - datetime.timedelta(days=days // 2)
+    rows = generate_reservations(rng, court_prices, user_ids, first_day, days, per_court_day)
+    total = 0
+    while True:
+        # bulk_create no llama a save() ni dispara signals: los totales ya vienen calculados
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        Reservation.objects.bulk_create(batch)
+        total += len(batch)
+        if stdout and total % (batch_size * 20) == 0:
+            stdout.write(f"  {total} reservas ({time.perf_counter() - started:.0f}s)")
+
+    counts = {"companies": companies, "courts": len(court_prices), "users": len(user_ids), "reservations": total}
+    if derived:
+        # Índices derivados que los signals mantendrían (ver core/occupancy.py y core/rollups.py)
+        from core.occupancy import rebuild
+        from core.rollups import backfill
+
+        last_day = first_day + datetime.timedelta(days=days - 1)
+        counts["occupancy_rows"] = rebuild(list(court_prices), first_day, last_day)
+        counts["rollup_rows"] = backfill(list(court_prices), first_day, last_day)
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+# =========================================================
+#  ESCENARIOS
+# =========================================================
+# (nombre, preparación opcional fuera del cronómetro, request medido)
+
+def _post_json(client, path, payload, **headers):
+    return client.post(path, json.dumps(payload), content_type='application/json', **headers)
+
+
+def _free_slot(ctx, index):
+    """Turno libre y distinto por iteración, lejos de los datos sembrados."""
+    day = ctx['far_day'] + datetime.timedelta(days=index // (CLOSE_HOUR - OPEN_HOUR - 1))
+    hour = OPEN_HOUR + index % (CLOSE_HOUR - OPEN_HOUR - 1)
+    start = timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour)))
+    return start, start + datetime.timedelta(minutes=90)
+
+
+def run_court_availability(client, ctx, index, _):
+    return client.get(f"/api/courts/{ctx['court'].id}/availability/", {'date': ctx['day'].isoformat()})
+
+
+def run_company_availability(client, ctx, index, _):
+    return client.get(f"/api/companies/{ctx['court'].company_id}/availability/", {
+        'from': ctx['day'].isoformat(), 'to': (ctx['day'] + datetime.timedelta(days=6)).isoformat()
+    })
+
+
+def run_quote(client, ctx, index, _):
+    start = timezone.make_aware(datetime.datetime.combine(ctx['day'], datetime.time(17)))
+    return _post_json(client, "/api/reservations/quote/", {
+        "court_id": ctx['court'].id, "start_time": start.isoformat(),
+        "end_time": (start + datetime.timedelta(minutes=90 + 30 * (index % 3))).isoformat(),
+    })
+
+
+def run_create(client, ctx, index, _):
+    start, end = _free_slot(ctx, index)
+    return _post_json(client, "/api/reservations/", {
+        "court": ctx['court'].id, "start_time": start.isoformat(), "end_time": end.isoformat()
+    })
+
+
+def setup_webhook(ctx, index):
+    """Reserva pendiente + pago registrado en la pasarela falsa."""
+    from core import fakes
+
+    start, end = _free_slot(ctx, 10_000 + index)
+    reservation = Reservation.objects.create(
+        court=ctx['court'], user_id=ctx['user_id'], start_time=start, end_time=end, subtotal_court=Decimal('100.00')
+    )
+    payment_id = f"bench-{uuid.uuid4().hex[:12]}"
+    fakes.register_payment(payment_id, reservation.id, 50)
+    return payment_id
+
+
+def run_webhook(client, ctx, index, payment_id):
+    """Recepción del webhook + procesamiento del evento por el worker del inbox."""
+    from core.inbox import process_event
+
+    headers = {}
+    secret = os.getenv("MP_WEBHOOK_SECRET")
+    if secret:
+        import hashlib
+        import hmac
+
+        request_id, ts = uuid.uuid4().hex, str(int(time.time()))
+        manifest = f"id:{payment_id};request-id:{request_id};ts:{ts};"
+        digest = hmac.new(secret.encode(), msg=manifest.encode(), digestmod=hashlib.sha256).hexdigest()
+        headers = {'HTTP_X_SIGNATURE': f"ts={ts},v1={digest}", 'HTTP_X_REQUEST_ID': request_id}
+
+    response = _post_json(
+        client, f"/api/webhooks/mercadopago/?data.id={payment_id}",
+        {'type': 'payment', 'data': {'id': payment_id}}, **headers
+    )
+    event = WebhookEvent.objects.get(topic='payment', data_id=payment_id)
+    WebhookEvent.objects.filter(pk=event.pk).update(status='processing', attempts=1)
+    process_event(event.pk)
+    return response
+
+
+SCENARIOS = [
+    ('court_availability', None, run_court_availability),
+    ('company_availability', None, run_company_availability),
+    ('quote', None, run_quote),
+    ('create', None, run_create),
+    ('webhook', setup_webhook, run_webhook),
+]
+
+
+# =========================================================
+#  EJECUCIÓN Y COMPARACIÓN
+# =========================================================
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+
+
+def summarize(latencies, query_counts, errors):
+    ordered = sorted(latencies)
+    return {
+        "iterations": len(latencies),
+        "errors": errors,
+        "p50_ms": round(_percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(ordered, 0.95) * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+        "min_ms": round(ordered[0] * 1000, 3) if ordered else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        "queries": int(statistics.median(query_counts)) if query_counts else 0,
+        "queries_max": max(query_counts, default=0),
+    }
+
+
+def build_context(court=None):
+    """Cancha medida (por defecto la primera activa de una empresa de benchmark) y días de referencia."""
+    courts = Court.objects.filter(is_active=True).select_related('company').order_by('id')
+    if court is None:
+        court = courts.filter(company__name__startswith=BENCH_PREFIX).first() or courts.first()
+    if court is None:
+        return None
+    user = User.objects.filter(username__startswith="bench-user-").first() or User.objects.order_by('id').first()
+    if user is None:
+        user = User.objects.create_user(username='bench-user-00000')
+    today = timezone.localdate()
+    return {
+        'court': court,
+        'user_id': user.id,
+        'day': today + datetime.timedelta(days=1),
+        # Dos años adelante: ninguna reserva sembrada choca con las creadas por la suite
+        'far_day': today + datetime.timedelta(days=730),
+    }
+
+
+def run_suite(ctx, iterations=50, warmup=5, names=None):
+    """
+    Ejecuta los escenarios y devuelve el resultado serializable. Todo lo que
+    escriben (reservas, pagos, eventos) se revierte al terminar.
+    """
+    from core import fakes
+
+    selected = [scenario for scenario in SCENARIOS if not names or scenario[0] in names]
+    client = Client()
+    results = {}
+    with override_settings(PAYMENT_GATEWAY='fake', PAYMENT_OUTBOX_INLINE_DISPATCH=False):
+        fakes.reset()
+        with transaction.atomic():
+            for name, setup, run in selected:
+                latencies, query_counts, errors = [], [], 0
+                for index in range(warmup + iterations):
+                    args = setup(ctx, index) if setup else None
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = run(client, ctx, index, args)
+                        elapsed = time.perf_counter() - started
+                    if index < warmup:
+                        continue
+                    latencies.append(elapsed)
+                    query_counts.append(len(queries))
+                    if response.status_code >= 400:
+                        errors += 1
+                results[name] = summarize(latencies, query_counts, errors)
+            transaction.set_rollback(True)
+        fakes.reset()
+
+    return {
+        "meta": {
+            "timestamp": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "court": ctx['court'].id,
+            "company": ctx['court'].company_id,
+            "reservations": Reservation.objects.count(),
+            "iterations": iterations,
+            "warmup": warmup,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=0.2, min_delta_ms=0.5):
+    """
+    Compara contra un resultado guardado. Es regresión si el p50 empeora más que
+    'threshold' (y más que min_delta_ms, para ignorar ruido) o si suben las consultas.
+    Devuelve una fila por escenario presente en ambos.
+    """
+    rows = []
+    for name, result in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = result['p50_ms'] / base['p50_ms'] if base['p50_ms'] else None
+        slower = (
+            ratio is not None and ratio > 1 + threshold
+            and result['p50_ms'] - base['p50_ms'] > min_delta_ms
+        )
+        rows.append({
+            "scenario": name,
+            "p50_ms": result['p50_ms'],
+            "baseline_p50_ms": base['p50_ms'],
+            "ratio": round(ratio, 3) if ratio is not None else None,
+            "queries": result['queries'],
+            "baseline_queries": base['queries'],
+            "regression": slower or result['queries'] > base['queries'],
+        })
+    return rows
@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from core.models import Court, CourtType, CourtTypePrice
+from core.serializers import CourtSerializer
+from core.versioning import get_version
+
+# =========================================================
+#  CATÁLOGO DE CANCHAS CACHEADO POR EMPRESA
+# =========================================================
+# La clave incluye la versión 'catalog' de la empresa; los signals la
+# incrementan al cambiar Court, CourtType, CourtTypePrice o TimeSlot,
+# así las entradas viejas simplemente dejan de leerse y expiran.
+
+CATALOG_TIMEOUT = 60 * 60
+
+
+def price_prefetch(lookup):
+    """Tarifas con su franja en 'prefetched_prices' (lo que lee CourtTypeSerializer.get_prices)."""
+    return Prefetch(
+        lookup,
+        queryset=CourtTypePrice.objects.select_related('time_slot').order_by('time_slot__start_time'),
+        to_attr='prefetched_prices',
+    )
+
+
+def court_queryset():
+    """Canchas activas con todo lo que necesita CourtSerializer (consultas constantes)."""
+    return (
+        Court.objects.filter(is_active=True)
+        .select_related('court_type', 'company')
+        .prefetch_related(price_prefetch('court_type__courttypeprice_set'))
+        .order_by('id')
+    )
+
+
+def court_type_queryset():
+    """Tipos de cancha listos para CourtTypeSerializer(many=True): 2 consultas para toda la lista."""
+    return CourtType.objects.prefetch_related(price_prefetch('courttypeprice_set')).order_by('id')
+
+
+def get_court_catalog(company_id):
+    """Lista serializada de canchas activas de la empresa (desde caché si está vigente)."""
+    version = get_version('catalog', company_id)
+    key = f"catalog:courts:{company_id}:{version}"
+    data = cache.get(key)
+    if data is None:
+        data = CourtSerializer(court_queryset().filter(company_id=company_id), many=True).data
+        data = [dict(item) for item in data]
+        cache.set(key, data, CATALOG_TIMEOUT)
+    return data
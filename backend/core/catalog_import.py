@@ -0,0 +1,334 @@
+import csv
+import io
+from datetime import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.dateparse import parse_time
+
+from core.models import BusinessHour, Court, CourtType, CourtTypePrice, TimeSlot
+from core.pricing import slot_intervals
+from core.versioning import bump_version, bump_company_version
+
+# =========================================================
+#  IMPORTACIÓN MASIVA DEL CATÁLOGO
+# =========================================================
+# Alta de una empresa en un solo paso: horarios de atención, tipos de cancha,
+# canchas, franjas horarias y tarifas desde un JSON o un CSV.
+# 1. Se valida todo en memoria (3 consultas para leer lo que ya existe).
+# 2. Si hay errores no se escribe nada: se devuelven todos, uno por fila.
+# 3. Si no, bulk_create por tabla dentro de una sola transacción.
+#
+# JSON:
+#   {"business_hours": [{"weekday": 0, "open_time": "08:00", "close_time": "23:00"}],
+#    "court_types":    [{"name": "Fútbol 7"}],
+#    "time_slots":     [{"name": "Día", "start_time": "08:00", "end_time": "18:00"}],
+#    "courts":         [{"name": "Cancha 1", "court_type": "Fútbol 7", "is_active": true}],
+#    "prices":         [{"court_type": "Fútbol 7", "time_slot": "Día", "price": "60.00"}]}
+# CSV: una fila por elemento, la columna 'kind' indica la sección
+#   (business_hour, court_type, time_slot, court, price) y el resto de las
+#   columnas usa los mismos nombres que el JSON.
+#
+# Horarios y franjas pueden cruzar la medianoche (22:00 - 02:00) o cerrar a las
+# 00:00, igual que en pricing.slot_intervals y rollups._open_intervals.
+#
+# Tipos de cancha y franjas con un nombre ya existente se reutilizan; horarios
+# de atención (por día) y tarifas (por tipo + franja) se actualizan si existen.
+
+SECTIONS = ('business_hours', 'court_types', 'time_slots', 'courts', 'prices')
+CSV_KINDS = {
+    'business_hour': 'business_hours',
+    'court_type': 'court_types',
+    'time_slot': 'time_slots',
+    'court': 'courts',
+    'price': 'prices',
+}
+MAX_ROWS = 5000
+MAX_PRICE = Decimal('999999.99')
+TRUE_VALUES = ('1', 'true', 'si', 'sí', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+class CatalogImportError(ValidationError):
+    """La especificación tiene errores; 'errors' trae uno por fila."""
+
+    def __init__(self, errors):
+        super().__init__("El catálogo tiene errores; no se importó nada.")
+        self.errors = errors
+
+
+def row_error(section, row, message):
+    return {"section": section, "row": row, "error": message}
+
+
+def parse_json_spec(spec):
+    """Normaliza el JSON a {sección: [(n° de fila, dict)]}; las filas se numeran desde 1 por sección."""
+    if not isinstance(spec, dict):
+        raise CatalogImportError([row_error(None, None, "Se esperaba un objeto JSON con las secciones.")])
+    unknown = set(spec) - set(SECTIONS)
+    if unknown:
+        raise CatalogImportError([row_error(None, None, f"Secciones desconocidas: {', '.join(sorted(unknown))}.")])
+
+    rows, errors = {}, []
+    for section in SECTIONS:
+        items = spec.get(section) or []
+        if not isinstance(items, list):
+            errors.append(row_error(section, None, "Se esperaba una lista."))
+            items = []
+        rows[section] = []
+        for number, item in enumerate(items, start=1):
+            if isinstance(item, dict):
+                rows[section].append((number, item))
+            else:
+                errors.append(row_error(section, number, "Se esperaba un objeto."))
+    if errors:
+        raise CatalogImportError(errors)
+    return rows
+
+
+def parse_csv_spec(text):
+    """Normaliza el CSV a {sección: [(n° de línea, dict)]}; las celdas vacías se ignoran."""
+    rows = {section: [] for section in SECTIONS}
+    errors = []
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or 'kind' not in reader.fieldnames:
+        raise CatalogImportError([row_error(None, 1, "Falta la columna 'kind'.")])
+
+    for line, record in enumerate(reader, start=2):
+        kind = (record.pop('kind') or '').strip()
+        section = CSV_KINDS.get(kind)
+        if section is None:
+            errors.append(row_error(None, line, f"Tipo de fila desconocido: '{kind}'."))
+            continue
+        rows[section].append((line, {
+            key.strip(): value.strip()
+            for key, value in record.items()
+            if key and isinstance(value, str) and value.strip()
+        }))
+    if errors:
+        raise CatalogImportError(errors)
+    return rows
+
+
+def _text(item, field, max_length):
+    value = str(item.get(field) or '').strip()
+    if not value:
+        raise ValueError(f"'{field}' es obligatorio.")
+    if len(value) > max_length:
+        raise ValueError(f"'{field}' supera {max_length} caracteres.")
+    return value
+
+
+def _time(item, field):
+    value = item.get(field)
+    try:
+        parsed = parse_time(str(value)) if value not in (None, '') else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"'{field}' debe ser una hora HH:MM.")
+    return parsed
+
+
+def _bool(item, field, default):
+    value = item.get(field, default)
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"'{field}' debe ser verdadero o falso.")
+
+
+def validate_catalog(company, rows):
+    """
+    Valida la especificación normalizada contra el catálogo actual de la empresa.
+    Devuelve el plan de escritura o lanza CatalogImportError con todos los errores.
+    """
+    total = sum(len(items) for items in rows.values())
+    if total > MAX_ROWS:
+        raise CatalogImportError([row_error(None, None, f"Máximo {MAX_ROWS} filas por importación.")])
+
+    existing_types = dict(CourtType.objects.filter(company=company).values_list('name', 'id'))
+    existing_slots = {
+        name: (slot_id, start, end)
+        for name, slot_id, start, end in TimeSlot.objects.filter(company=company)
+        .values_list('name', 'id', 'start_time', 'end_time')
+    }
+    existing_courts = set(Court.objects.filter(company=company).values_list('name', flat=True))
+
+    errors = []
+    plan = {section: [] for section in SECTIONS}
+
+    # --- Horarios de atención ---
+    weekdays = set()
+    for row, item in rows['business_hours']:
+        try:
+            weekday = int(item.get('weekday'))
+            if not 0 <= weekday <= 6:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append(row_error('business_hours', row, "'weekday' debe ser un número de 0 (lunes) a 6 (domingo)."))
+            continue
+        try:
+            open_time, close_time = _time(item, 'open_time'), _time(item, 'close_time')
+            if open_time == close_time and close_time != time(0):
+                raise ValueError("'open_time' y 'close_time' no pueden ser iguales.")
+            if weekday in weekdays:
+                raise ValueError(f"El día {weekday} está repetido.")
+        except ValueError as e:
+            errors.append(row_error('business_hours', row, str(e)))
+            continue
+        weekdays.add(weekday)
+        plan['business_hours'].append(
+            BusinessHour(company=company, weekday=weekday, open_time=open_time, close_time=close_time)
+        )
+
+    # --- Tipos de cancha ---
+    type_names = set(existing_types)
+    for row, item in rows['court_types']:
+        try:
+            name = _text(item, 'name', 100)
+        except ValueError as e:
+            errors.append(row_error('court_types', row, str(e)))
+            continue
+        if name in type_names:
+            if name not in existing_types:
+                errors.append(row_error('court_types', row, f"El tipo '{name}' está repetido."))
+            continue  # Ya existe en la empresa: se reutiliza
+        type_names.add(name)
+        plan['court_types'].append(CourtType(company=company, name=name))
+
+    # --- Franjas horarias ---
+    slots = {name: (start, end) for name, (_, start, end) in existing_slots.items()}
+    for row, item in rows['time_slots']:
+        try:
+            name = _text(item, 'name', 100)
+            start_time, end_time = _time(item, 'start_time'), _time(item, 'end_time')
+            if start_time == end_time:
+                raise ValueError("'start_time' y 'end_time' no pueden ser iguales.")
+        except ValueError as e:
+            errors.append(row_error('time_slots', row, str(e)))
+            continue
+        if name in slots:
+            if name in existing_slots and slots[name] == (start_time, end_time):
+                continue  # Ya existe con el mismo horario: se reutiliza
+            errors.append(row_error('time_slots', row, f"La franja '{name}' ya existe con otro horario o está repetida."))
+            continue
+        # Comparamos en minutos del día: las franjas nocturnas se parten en dos
+        intervals = slot_intervals(start_time, end_time)
+        overlap = next((
+            other for other, (start, end) in slots.items()
+            if any(a < d and c < b for a, b in intervals for c, d in slot_intervals(start, end))
+        ), None)
+        if overlap:
+            errors.append(row_error('time_slots', row, f"La franja '{name}' se superpone con '{overlap}'."))
+            continue
+        slots[name] = (start_time, end_time)
+        plan['time_slots'].append(TimeSlot(company=company, name=name, start_time=start_time, end_time=end_time))
+
+    # --- Canchas ---
+    court_names = set(existing_courts)
+    for row, item in rows['courts']:
+        try:
+            name = _text(item, 'name', 150)
+            court_type = _text(item, 'court_type', 100)
+            is_active = _bool(item, 'is_active', True)
+            if court_type not in type_names:
+                raise ValueError(f"El tipo de cancha '{court_type}' no existe.")
+            if name in court_names:
+                raise ValueError(f"La cancha '{name}' ya existe o está repetida.")
+        except ValueError as e:
+            errors.append(row_error('courts', row, str(e)))
+            continue
+        court_names.add(name)
+        plan['courts'].append((Court(company=company, name=name, is_active=is_active), court_type))
+
+    # --- Tarifas ---
+    price_keys = set()
+    for row, item in rows['prices']:
+        try:
+            court_type = _text(item, 'court_type', 100)
+            time_slot = _text(item, 'time_slot', 100)
+            if court_type not in type_names:
+                raise ValueError(f"El tipo de cancha '{court_type}' no existe.")
+            if time_slot not in slots:
+                raise ValueError(f"La franja '{time_slot}' no existe.")
+            if (court_type, time_slot) in price_keys:
+                raise ValueError(f"La tarifa '{court_type}' / '{time_slot}' está repetida.")
+            try:
+                price = Decimal(str(item.get('price'))).quantize(Decimal('0.01'))
+            except (InvalidOperation, ValueError):
+                raise ValueError("'price' debe ser un número.")
+            if not 0 <= price <= MAX_PRICE:
+                raise ValueError(f"'price' debe estar entre 0 y {MAX_PRICE}.")
+        except ValueError as e:
+            errors.append(row_error('prices', row, str(e)))
+            continue
+        price_keys.add((court_type, time_slot))
+        plan['prices'].append((CourtTypePrice(company=company, price=price), court_type, time_slot))
+
+    if errors:
+        raise CatalogImportError(errors)
+
+    plan['existing_types'] = existing_types
+    plan['existing_slots'] = {name: slot_id for name, (slot_id, _, _) in existing_slots.items()}
+    return plan
+
+
+def write_catalog(company, plan):
+    """Escribe el plan validado con un bulk_create por tabla. Devuelve las cantidades escritas."""
+    with transaction.atomic():
+        type_ids = dict(plan['existing_types'])
+        for court_type in CourtType.objects.bulk_create(plan['court_types']):
+            type_ids[court_type.name] = court_type.id
+        slot_ids = dict(plan['existing_slots'])
+        for time_slot in TimeSlot.objects.bulk_create(plan['time_slots']):
+            slot_ids[time_slot.name] = time_slot.id
+
+        courts = []
+        for court, court_type in plan['courts']:
+            court.court_type_id = type_ids[court_type]
+            courts.append(court)
+        Court.objects.bulk_create(courts)
+
+        prices = []
+        for price, court_type, time_slot in plan['prices']:
+            price.court_type_id = type_ids[court_type]
+            price.time_slot_id = slot_ids[time_slot]
+            prices.append(price)
+        # Upserts: re-importar la misma planilla actualiza tarifas y horarios
+        CourtTypePrice.objects.bulk_create(
+            prices, update_conflicts=True, unique_fields=['court_type', 'time_slot'], update_fields=['price']
+        )
+        BusinessHour.objects.bulk_create(
+            plan['business_hours'], update_conflicts=True,
+            unique_fields=['company', 'weekday'], update_fields=['open_time', 'close_time']
+        )
+
+        # bulk_create no dispara signals: invalidamos a mano (ver core/signals.py)
+        if plan['time_slots'] or prices:
+            bump_version('pricing', company.id)
+        if plan['court_types'] or courts or plan['time_slots'] or prices:
+            bump_company_version('catalog', company.id)
+        if plan['business_hours']:
+            bump_company_version('company', company.id)
+
+    return {
+        'business_hours': len(plan['business_hours']),
+        'court_types': len(plan['court_types']),
+        'time_slots': len(plan['time_slots']),
+        'courts': len(courts),
+        'prices': len(prices),
+    }
+
+
+def import_catalog(company, rows, dry_run=False):
+    """Valida y (salvo dry_run) escribe. Lanza CatalogImportError si hay errores."""
+    plan = validate_catalog(company, rows)
+    if dry_run:
+        return {section: len(plan[section]) for section in SECTIONS}
+    return write_catalog(company, plan)
@@ -0,0 +1,58 @@
+import hashlib
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from core.versioning import aget_versions, get_versions
+
+# =========================================================
+#  GET CONDICIONAL (ETag)
+# =========================================================
+# El ETag se arma con la URL completa y las versiones de los scopes de los
+# que depende la respuesta. Si el cliente (o un caché HTTP intermedio) manda
+# If-None-Match vigente, respondemos 304 sin tocar el ORM: cuesta una sola
+# lectura del caché de versiones.
+#
+# No mandamos Last-Modified: HTTP lo expresa en segundos y las versiones son
+# de microsegundos, así que dos cambios dentro del mismo segundo darían la misma
+# fecha y un If-Modified-Since recibiría 304 con datos viejos.
+
+
+# Obliga a revalidar siempre, pero permite guardar la respuesta en cachés compartidos
+CONDITIONAL_CACHE_CONTROL = 'public, no-cache'
+
+
+def conditional_etag(request, versions):
+    """ETag fuerte para la URL y las versiones dadas."""
+    raw = request.get_full_path() + '|' + '|'.join(
+        f"{scope}:{key}={versions[(scope, key)]}" for scope, key in sorted(versions, key=str)
+    )
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+def patch_conditional_headers(response, etag, cache_control=CONDITIONAL_CACHE_CONTROL):
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        patch_vary_headers(response, ('Accept',))
+    return response
+
+
+class ConditionalGetMixin:
+    conditional_cache_control = CONDITIONAL_CACHE_CONTROL
+
+    def conditional_response(self, request, stamps, build_response):
+        """
+        stamps: lista de (scope, key) de los que depende la respuesta.
+        build_response: callable que arma la Response si hubo cambios.
+        """
+        etag = conditional_etag(request, get_versions(stamps))
+        not_modified = get_conditional_response(request, etag=etag)
+        response = not_modified if not_modified is not None else build_response()
+        return patch_conditional_headers(response, etag, self.conditional_cache_control)
+
+
+async def aconditional_response(request, stamps, build_response):
+    """Igual que ConditionalGetMixin.conditional_response, para vistas async (build_response es una corrutina)."""
+    etag = conditional_etag(request, await aget_versions(stamps))
+    not_modified = get_conditional_response(request, etag=etag)
+    response = not_modified if not_modified is not None else await build_response()
+    return patch_conditional_headers(response, etag)
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.occupancy import local_days
+
+logger = logging.getLogger('core.events')
+
+# =========================================================
+#  EVENTOS DE DISPONIBILIDAD EN TIEMPO REAL (pub/sub)
+# =========================================================
+# Canal = empresa + día local ("<company_id>:<YYYY-MM-DD>").
+# Las escrituras de reservas publican deltas al confirmar la transacción;
+# el endpoint SSE (core/views/StreamViews.py) los reenvía a los navegadores.
+#
+# Hub: reparte mensajes a los suscriptores de ESTE proceso (colas asyncio).
+# Broker (AVAILABILITY_BROKER): cómo llegan los mensajes al Hub.
+#   - InProcessBroker: directo, sirve si todo corre en un único proceso ASGI.
+#   - PostgresBroker: NOTIFY/LISTEN, entrega a todos los procesos y servidores.
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+def channel_key(company_id, day):
+    return f"{company_id}:{day.isoformat()}"
+
+
+class Subscription:
+    """Cola de mensajes de un cliente conectado. Se crea dentro del event loop."""
+
+    def __init__(self, hub, key, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.hub = hub
+        self.key = key
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        # Si el cliente no consume a tiempo descartamos mensajes y le pedimos resincronizar
+        self.overflowed = False
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.overflowed = False
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, key):
+        subscription = Subscription(self, key)
+        with self._lock:
+            self._subscriptions[key].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.key)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.key]
+
+    def dispatch(self, key, message):
+        """Thread-safe: puede llamarse desde un thread de request o del listener."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(key, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # El loop del cliente ya cerró
+                self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class InProcessBroker:
+    """Entrega directa al Hub del mismo proceso."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, key, message):
+        self.hub.dispatch(key, message)
+
+
+class PostgresBroker:
+    """
+    Publica con pg_notify() y escucha con LISTEN en un thread por proceso,
+    así un cambio hecho por cualquier worker (WSGI, comandos, webhooks) llega
+    a los clientes conectados a cualquier proceso ASGI. Sin dependencias extra.
+    """
+    CHANNEL = 'availability_events'
+    RECONNECT_SECONDS = 3
+
+    def __init__(self, hub):
+        self.hub = hub
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._listen_forever, name='availability-listener', daemon=True)
+            self._thread.start()
+
+    def publish(self, key, message):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.CHANNEL, json.dumps({"key": key, "message": message})])
+
+    def _listen_forever(self):
+        import psycopg2
+
+        while True:
+            try:
+                params = connection.get_connection_params()
+                listener = psycopg2.connect(**params)
+                listener.set_session(autocommit=True)
+                with listener.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.CHANNEL}")
+                while True:
+                    if select.select([listener], [], [], 30) == ([], [], []):
+                        continue
+                    listener.poll()
+                    while listener.notifies:
+                        notify = listener.notifies.pop(0)
+                        data = json.loads(notify.payload)
+                        self.hub.dispatch(data["key"], data["message"])
+            except Exception as e:
+                logger.exception(f"Listener de PostgreSQL caído, reconectando: {e}")
+                time.sleep(self.RECONNECT_SECONDS)
+
+
+# =========================================================
+#  INSTANCIA POR PROCESO
+# =========================================================
+
+_hub = Hub()
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_hub():
+    return _hub
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker = import_string(settings.AVAILABILITY_BROKER)(_hub)
+                broker.start()
+                _broker = broker
+    return _broker
+
+
+def subscribe(company_id, day):
+    get_broker()  # Arranca el listener del broker la primera vez
+    return _hub.subscribe(channel_key(company_id, day))
+
+
+def publish_reservation_event(event, reservation_id, court_id, company_id, start_time, end_time, status):
+    """
+    Publica un delta en los canales de cada día que toca la reserva.
+    Se envía al confirmar la transacción: nunca se anuncia algo que luego se revierte.
+    """
+    message = {
+        "type": f"reservation.{event}",
+        "reservation_id": reservation_id,
+        "court_id": court_id,
+        "start": timezone.localtime(start_time).isoformat(),
+        "end": timezone.localtime(end_time).isoformat(),
+        "status": status,
+    }
+    keys = [channel_key(company_id, day) for day in local_days(start_time, end_time)]
+
+    def send():
+        broker = get_broker()
+        for key in keys:
+            try:
+                broker.publish(key, message)
+            except Exception as e:
+                # Los clientes se resincronizan al reconectar; la escritura ya se confirmó
+                logger.warning(f"No se pudo publicar {message['type']} en {key}: {e}")
+
+    transaction.on_commit(send)
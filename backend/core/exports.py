@@ -0,0 +1,179 @@
+import csv
+import datetime
+import json
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.availability import day_bounds
+from core.models import Reservation, Payment
+
+# =========================================================
+#  EXPORTACIÓN STREAMING (CSV / JSON LINES)
+# =========================================================
+# Contabilidad exporta meses completos de reservas y pagos por empresa.
+# Nada se materializa en memoria: values_list().iterator(chunk_size) lee por
+# lotes (cursor del lado del servidor en PostgreSQL) y cada lote se escribe
+# al socket apenas se lee. La cabecera sale antes de ejecutar la consulta,
+# así el primer byte no espera al primer lote.
+
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+
+# (columna exportada, campo de values_list)
+RESERVATION_COLUMNS = [
+    ('id', 'id'),
+    ('company_id', 'court__company_id'),
+    ('court_id', 'court_id'),
+    ('court', 'court__name'),
+    ('user', 'user__username'),
+    ('start_time', 'start_time'),
+    ('end_time', 'end_time'),
+    ('status', 'status'),
+    ('subtotal_court', 'subtotal_court'),
+    ('subtotal_addons', 'subtotal_addons'),
+    ('total_price', 'total_price'),
+    ('amount_paid', 'amount_paid'),
+    ('amount_pending', 'amount_pending'),
+    ('series_id', 'series_id'),
+    ('created_at', 'created_at'),
+]
+
+PAYMENT_COLUMNS = [
+    ('id', 'id'),
+    ('reservation_id', 'reservation_id'),
+    ('company_id', 'reservation__court__company_id'),
+    ('court_id', 'reservation__court_id'),
+    ('amount', 'amount'),
+    ('payment_method', 'payment_method'),
+    ('status', 'status'),
+    ('transaction_id', 'transaction_id'),
+    ('created_at', 'created_at'),
+    ('approved_at', 'approved_at'),
+    ('approved_by', 'approved_by__username'),
+]
+
+
+class Echo:
+    """Pseudo-buffer para csv.writer: write() devuelve la línea en vez de guardarla."""
+
+    def write(self, value):
+        return value
+
+
+def parse_export_filters(query_params):
+    """
+    Lee ?company=&from=&to=&output= (todos opcionales; from/to en YYYY-MM-DD).
+    Usa 'output' y no 'format' porque DRF reserva ?format= para elegir el renderer.
+    Lanza ValueError si algún parámetro es inválido.
+    """
+    output = query_params.get('output', 'csv')
+    if output not in FORMATS:
+        raise ValueError(f"Formato no soportado: {output} (usar {', '.join(FORMATS)}).")
+
+    company_id = query_params.get('company') or None
+    if company_id is not None and not company_id.isdigit():
+        raise ValueError("Parámetro 'company' inválido.")
+
+    first_day = last_day = None
+    if query_params.get('from'):
+        first_day = parse_date(query_params['from'])
+        if not first_day:
+            raise ValueError("Parámetro 'from' (YYYY-MM-DD) inválido.")
+    if query_params.get('to'):
+        last_day = parse_date(query_params['to'])
+        if not last_day:
+            raise ValueError("Parámetro 'to' (YYYY-MM-DD) inválido.")
+    if first_day and last_day and last_day < first_day:
+        raise ValueError("'to' no puede ser anterior a 'from'.")
+
+    return {'company_id': company_id, 'first_day': first_day, 'last_day': last_day, 'output': output}
+
+
+def _filter_range(queryset, field, first_day, last_day):
+    if first_day:
+        queryset = queryset.filter(**{f'{field}__gte': day_bounds(first_day, first_day)[0]})
+    if last_day:
+        queryset = queryset.filter(**{f'{field}__lt': day_bounds(last_day, last_day)[1]})
+    return queryset
+
+
+def reservation_rows(company_id=None, first_day=None, last_day=None):
+    """Tuplas de reservas por fecha de inicio (orden estable por (start_time, id))."""
+    queryset = Reservation.objects.order_by('start_time', 'id')
+    if company_id:
+        queryset = queryset.filter(court__company_id=company_id)
+    queryset = _filter_range(queryset, 'start_time', first_day, last_day)
+    return queryset.values_list(*[field for _, field in RESERVATION_COLUMNS]).iterator(chunk_size=CHUNK_SIZE)
+
+
+def payment_rows(company_id=None, first_day=None, last_day=None):
+    """Tuplas de pagos por fecha de registro (orden estable por (created_at, id))."""
+    queryset = Payment.objects.order_by('created_at', 'id')
+    if company_id:
+        queryset = queryset.filter(reservation__court__company_id=company_id)
+    queryset = _filter_range(queryset, 'created_at', first_day, last_day)
+    return queryset.values_list(*[field for _, field in PAYMENT_COLUMNS]).iterator(chunk_size=CHUNK_SIZE)
+
+
+def _plain(value):
+    """Valor listo para CSV/JSON: fechas en hora local ISO 8601, decimales como texto."""
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in columns])
+    buffer = []
+    for row in rows:
+        buffer.append(writer.writerow([_plain(value) for value in row]))
+        # Un write al socket por lote, no por fila
+        if len(buffer) >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_jsonl(columns, rows):
+    names = [name for name, _ in columns]
+    # Primer chunk vacío: fuerza el envío de las cabeceras HTTP antes de consultar
+    yield ''
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(dict(zip(names, map(_plain, row))), ensure_ascii=False) + '\n')
+        if len(buffer) >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_response(name, columns, rows, filters):
+    """StreamingHttpResponse descargable; rows es un iterador perezoso (la consulta corre al consumirlo)."""
+    output = filters['output']
+    if output == 'csv':
+        content, content_type = stream_csv(columns, rows), 'text/csv; charset=utf-8'
+    else:
+        content, content_type = stream_jsonl(columns, rows), 'application/x-ndjson; charset=utf-8'
+
+    parts = [name]
+    if filters['company_id']:
+        parts.append(f"company-{filters['company_id']}")
+    if filters['first_day']:
+        parts.append(filters['first_day'].isoformat())
+    if filters['last_day']:
+        parts.append(filters['last_day'].isoformat())
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{"_".join(parts)}.{output}"'
+    # Evita que un proxy (nginx) acumule la respuesta completa antes de enviarla
+    response['X-Accel-Buffering'] = 'no'
+    response['Cache-Control'] = 'no-store'
+    return response
@@ -0,0 +1,103 @@
+import itertools
+import random
+import threading
+import time
+import uuid
+
+from core.gateway import PaymentGateway, reset_gateways
+
+# =========================================================
+#  PASARELA FALSA (desarrollo, tests y benchmarks offline)
+# =========================================================
+# Imita las respuestas de Mercado Pago en memoria.
+# Activar con PAYMENT_GATEWAY=fake en el .env.
+# configure() permite inyectar latencia y fallas para probar timeouts,
+# reintentos y el circuit breaker sin red.
+
+
+class _FakeState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.preferences = {}
+        self.payments = {}
+        self.counter = itertools.count(1)
+        self.latency = 0.0        # Segundos por llamada
+        self.failure_rate = 0.0   # Probabilidad de responder 503
+        self.fail_next = 0        # Cantidad de llamadas siguientes que fallan con excepción
+        self.calls = 0
+
+
+_state = _FakeState()
+
+
+def configure(latency=None, failure_rate=None, fail_next=None):
+    with _state.lock:
+        if latency is not None:
+            _state.latency = latency
+        if failure_rate is not None:
+            _state.failure_rate = failure_rate
+        if fail_next is not None:
+            _state.fail_next = fail_next
+
+
+def register_payment(payment_id, external_reference, amount, status='approved'):
+    """Registra un pago para que get_payment() lo encuentre (útil en tests/replays)."""
+    with _state.lock:
+        _state.payments[str(payment_id)] = {
+            "id": payment_id,
+            "external_reference": str(external_reference),
+            "status": status,
+            "transaction_amount": float(amount),
+        }
+
+
+def reset():
+    global _state
+    _state = _FakeState()
+    reset_gateways()
+
+
+def call_count():
+    return _state.calls
+
+
+def _simulate_network():
+    """Aplica la latencia y las fallas configuradas. Devuelve un status de error o None."""
+    with _state.lock:
+        _state.calls += 1
+        latency = _state.latency
+        if _state.fail_next:
+            _state.fail_next -= 1
+            raise ConnectionError("Fake: conexión rechazada")
+        failed = _state.failure_rate and random.random() < _state.failure_rate
+    if latency:
+        time.sleep(latency)
+    return 503 if failed else None
+
+
+class FakeGateway(PaymentGateway):
+    def _create_preference(self, preference_data):
+        error_status = _simulate_network()
+        if error_status:
+            return {"status": error_status, "response": {"message": "Service Unavailable"}}
+
+        preference_id = f"fake-{next(_state.counter)}-{uuid.uuid4().hex[:8]}"
+        with _state.lock:
+            _state.preferences[preference_id] = preference_data
+        return {"status": 201, "response": {
+            "id": preference_id,
+            "init_point": f"https://fake.mercadopago.test/checkout?pref_id={preference_id}",
+            "sandbox_init_point": f"https://sandbox.fake.mercadopago.test/checkout?pref_id={preference_id}",
+            "external_reference": preference_data.get("external_reference"),
+        }}
+
+    def _get_payment(self, payment_id):
+        error_status = _simulate_network()
+        if error_status:
+            return {"status": error_status, "response": {"message": "Service Unavailable"}}
+
+        with _state.lock:
+            payment = _state.payments.get(str(payment_id))
+        if payment is None:
+            return {"status": 404, "response": {"message": "Payment not found"}}
+        return {"status": 200, "response": dict(payment)}
@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+
+import mercadopago
+import requests
+from django.conf import settings
+from mercadopago.config.request_options import RequestOptions
+from mercadopago.http.http_client import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from core.metrics import observe_gateway
+
+# =========================================================
+#  PASARELA DE PAGO
+# =========================================================
+# Un cliente por proceso (get_gateway()) con sesión HTTP keep-alive,
+# timeouts explícitos, reintentos acotados y circuit breaker.
+# PAYMENT_GATEWAY='fake' usa la pasarela en memoria de core/fakes.py.
+
+# Códigos que cuentan como falla de la pasarela (y se reintentan)
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class GatewayError(Exception):
+    """La pasarela no respondió o respondió con un error del servidor."""
+
+
+class GatewayUnavailable(GatewayError):
+    """El circuit breaker está abierto: no se llama a la pasarela."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Pasarela de pago no disponible, reintentar en {retry_after:.0f}s.")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Tras 'failure_threshold' fallas seguidas se abre y rechaza llamadas durante
+    'reset_timeout' segundos. Luego deja pasar una llamada de prueba (half-open):
+    si sale bien se cierra, si falla se vuelve a abrir.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self):
+        """Lanza GatewayUnavailable si el circuito no permite la llamada."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            retry_after = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        raise GatewayUnavailable(retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class PooledHttpClient(HttpClient):
+    """
+    HttpClient del SDK con una sola requests.Session por proceso (keep-alive y
+    pool de conexiones), timeouts (conexión, lectura) y reintentos acotados.
+    """
+
+    def __init__(self, timeout, max_retries, pool_size):
+        self.timeout = timeout
+        retry = Retry(
+            total=max_retries,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=None,  # También POST: crear una preferencia duplicada no cobra nada
+            backoff_factor=0.2,
+            raise_on_status=False,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry))
+
+    def request(self, method, url, maxretries=None, retry_on=None, backoff_factor=None, **kwargs):
+        # El timeout y los reintentos los define la sesión, no el SDK
+        kwargs['timeout'] = self.timeout
+        api_result = self.session.request(method, url, **kwargs)
+        response = {"status": api_result.status_code, "response": None}
+        if api_result.status_code != 204 and api_result.content:
+            try:
+                response["response"] = api_result.json()
+            except ValueError:
+                response["response"] = {"message": api_result.text[:500]}
+        return response
+
+
+class PaymentGateway:
+    """Interfaz común. Las subclases implementan _create_preference y _get_payment."""
+
+    def __init__(self, breaker=None):
+        self.breaker = breaker or CircuitBreaker()
+
+    def _call(self, func, *args):
+        self.breaker.before_call()
+        operation = func.__name__.lstrip('_')
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as e:
+            self.breaker.record_failure()
+            observe_gateway(operation, 'error', time.perf_counter() - started)
+            raise GatewayError(str(e)) from e
+        observe_gateway(operation, str(result.get("status")), time.perf_counter() - started)
+        if result.get("status") in RETRY_STATUS:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return result
+
+    def create_preference(self, preference_data):
+        """Devuelve {"status": <http>, "response": <preferencia>}."""
+        return self._call(self._create_preference, preference_data)
+
+    def get_payment(self, payment_id):
+        """Devuelve {"status": <http>, "response": <pago>}."""
+        return self._call(self._get_payment, payment_id)
+
+    def _create_preference(self, preference_data):
+        raise NotImplementedError
+
+    def _get_payment(self, payment_id):
+        raise NotImplementedError
+
+
+class MercadoPagoGateway(PaymentGateway):
+    def __init__(self, access_token, timeout, max_retries, pool_size, breaker=None):
+        super().__init__(breaker)
+        self.sdk = mercadopago.SDK(
+            access_token,
+            http_client=PooledHttpClient(timeout, max_retries, pool_size),
+            request_options=RequestOptions(access_token=access_token, max_retries=0),
+        )
+
+    def _create_preference(self, preference_data):
+        return self.sdk.preference().create(preference_data)
+
+    def _get_payment(self, payment_id):
+        return self.sdk.payment().get(payment_id)
+
+
+# =========================================================
+#  INSTANCIA POR PROCESO
+# =========================================================
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def build_gateway(name):
+    breaker = CircuitBreaker(
+        failure_threshold=settings.PAYMENT_GATEWAY_BREAKER_THRESHOLD,
+        reset_timeout=settings.PAYMENT_GATEWAY_BREAKER_RESET_SECONDS,
+    )
+    if name == 'fake':
+        from core.fakes import FakeGateway
+        return FakeGateway(breaker)
+    return MercadoPagoGateway(
+        os.getenv("MP_ACCESS_TOKEN"),
+        timeout=(settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT, settings.PAYMENT_GATEWAY_READ_TIMEOUT),
+        max_retries=settings.PAYMENT_GATEWAY_MAX_RETRIES,
+        pool_size=settings.PAYMENT_GATEWAY_POOL_SIZE,
+        breaker=breaker,
+    )
+
+
+def get_gateway():
+    """Pasarela configurada en PAYMENT_GATEWAY ('mercadopago' o 'fake'), una por proceso."""
+    name = settings.PAYMENT_GATEWAY
+    gateway = _gateways.get(name)
+    if gateway is None:
+        with _gateways_lock:
+            gateway = _gateways.get(name)
+            if gateway is None:
+                gateway = _gateways[name] = build_gateway(name)
+    return gateway
+
+
+def reset_gateways():
+    """Descarta las instancias (y el estado de sus breakers). Usado por tests y benchmarks."""
+    with _gateways_lock:
+        _gateways.clear()
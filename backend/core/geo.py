@@ -0,0 +1,79 @@
+import math
+from django.db.models import Q
+
+from core.models import Company
+
+# =========================================================
+#  BÚSQUEDA POR CERCANÍA (sin PostGIS)
+# =========================================================
+# 1. Un rectángulo (bounding box) que contiene el círculo del radio pedido
+#    se resuelve con el índice (latitude, longitude) de Company.
+# 2. Sobre esos candidatos (solo id, lat, lng) calculamos la distancia
+#    exacta con haversine, descartamos las esquinas y ordenamos.
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_RADIUS_KM = 200
+MAX_RESULTS = 100
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Devuelve (lat_min, lat_max, [(lng_min, lng_max), ...]).
+    Puede haber dos rangos de longitud si la caja cruza el antimeridiano (±180°).
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    lat_min = lat - math.degrees(angular)
+    lat_max = lat + math.degrees(angular)
+
+    # Si la caja toca un polo, cualquier longitud puede estar dentro del radio
+    if lat_min <= -90 or lat_max >= 90:
+        return max(lat_min, -90), min(lat_max, 90), [(-180, 180)]
+
+    delta_lng = math.degrees(math.asin(math.sin(angular) / math.cos(math.radians(lat))))
+    lng_min, lng_max = lng - delta_lng, lng + delta_lng
+    if lng_min < -180:
+        return lat_min, lat_max, [(lng_min + 360, 180), (-180, lng_max)]
+    if lng_max > 180:
+        return lat_min, lat_max, [(lng_min, 180), (-180, lng_max - 360)]
+    return lat_min, lat_max, [(lng_min, lng_max)]
+
+
+def nearby_companies(lat, lng, radius_km, limit=MAX_RESULTS):
+    """
+    Empresas a menos de radius_km de (lat, lng), de la más cercana a la más lejana.
+    Cada Company trae el atributo distance_km.
+    """
+    lat_min, lat_max, lng_ranges = bounding_box(lat, lng, radius_km)
+    lng_filter = Q()
+    for lng_min, lng_max in lng_ranges:
+        lng_filter |= Q(longitude__gte=lng_min, longitude__lte=lng_max)
+
+    candidates = (
+        Company.objects.filter(latitude__gte=lat_min, latitude__lte=lat_max)
+        .filter(lng_filter)
+        .values_list('id', 'latitude', 'longitude')
+    )
+    distances = []
+    for company_id, company_lat, company_lng in candidates:
+        distance = haversine_km(lat, lng, float(company_lat), float(company_lng))
+        if distance <= radius_km:
+            distances.append((distance, company_id))
+    distances.sort()
+    distances = distances[:limit]
+
+    companies = Company.objects.in_bulk([company_id for _, company_id in distances])
+    result = []
+    for distance, company_id in distances:
+        company = companies[company_id]
+        company.distance_km = round(distance, 3)
+        result.append(company)
+    return result
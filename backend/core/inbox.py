@@ -0,0 +1,202 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Reservation, Payment, WebhookEvent
+from core.reservations import apply_payment_amounts, reactivate_expired
+from core.series import allocate_series_payment
+from core.gateway import get_gateway, GatewayError, GatewayUnavailable
+from core.workers import backoff_delay, claim_batch, run_in_pool
+
+# =========================================================
+#  INBOX DE WEBHOOKS
+# =========================================================
+# El webhook valida la firma, guarda el evento crudo (único por topic + data_id)
+# y responde 200 de inmediato. Este módulo drena la tabla en lotes con reintentos.
+
+logger = logging.getLogger('core.payments')
+
+MAX_ATTEMPTS = 8
+# Errores no transitorios (ej. reserva inexistente) se intentan menos veces
+MAX_ATTEMPTS_NON_RETRYABLE = 3
+LEASE_SECONDS = 120
+
+
+class RetryableError(Exception):
+    """Error transitorio: el evento se reintenta con backoff."""
+
+
+def record_event(topic, data_id, payload=None):
+    """
+    Guarda la notificación (INSERT ... ON CONFLICT DO NOTHING).
+    Los reenvíos de Mercado Pago con el mismo (topic, data_id) se descartan.
+    """
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(topic=topic, data_id=str(data_id), payload=payload or {})],
+        ignore_conflicts=True
+    )
+
+
+def claimable_events():
+    return WebhookEvent.objects.filter(status__in=['pending', 'processing'])
+
+
+def process_payment_notification(payment_id):
+    """Consulta el pago en Mercado Pago y lo registra contra la reserva."""
+    payment_info = get_gateway().get_payment(payment_id)
+
+    if payment_info["status"] == 404:
+        # MP a veces notifica antes de que el pago sea consultable
+        raise RetryableError(f"Pago ID {payment_id} no encontrado en MP.")
+    if payment_info["status"] != 200:
+        raise RetryableError(f"MP respondió {payment_info['status']} para el pago {payment_id}.")
+
+    payment_data = payment_info["response"]
+
+    # Extraer datos clave
+    external_ref = payment_data.get("external_reference")
+    status_mp = payment_data.get("status")
+    transaction_amount = payment_data.get("transaction_amount")
+
+    if not external_ref:
+        return
+    if str(external_ref).startswith('series-'):
+        return process_series_payment(payment_id, int(str(external_ref)[len('series-'):]), status_mp, transaction_amount)
+
+    # Actualizar la Reserva en nuestra BD (Transacción Atómica)
+    with transaction.atomic():
+        reservation = Reservation.objects.select_for_update().get(id=external_ref)
+
+        # Idempotencia: Si ya procesamos este ID, no hacemos nada
+        if Payment.objects.filter(transaction_id=str(payment_id)).exists():
+            return
+
+        # Pago aprobado después de que la reserva venció (o fue anulada): se reactiva
+        # si el turno sigue libre; si no, el pago queda marcado para devolver
+        approved = status_mp == 'approved'
+        refund = approved and reservation.status not in Reservation.ACTIVE_STATUSES and not (
+            reservation.status == 'expired' and reactivate_expired(reservation)
+        )
+
+        # Creamos el registro del pago
+        Payment.objects.create(
+            reservation=reservation,
+            amount=transaction_amount,
+            payment_method='gateway',
+            status='refund_required' if refund else ('approved' if approved else 'rejected'),
+            approved_at=timezone.now() if approved else None,
+            transaction_id=str(payment_id)
+        )
+
+        if refund:
+            logger.warning(f"Pago {payment_id} para la reserva {reservation.id} ({reservation.status}): a devolver")
+        # Si está aprobado, sumamos el saldo (UPDATE atómico) y confirmamos en SQL
+        elif approved:
+            apply_payment_amounts({reservation.id: Decimal(str(transaction_amount))})
+            logger.info(f"Pago aplicado a la reserva {reservation.id}: +{transaction_amount}")
+
+
+def process_series_payment(payment_id, series_id, status_mp, transaction_amount):
+    """
+    Un pago de serie se reparte entre sus reservas (un Payment por reserva, mismo
+    transaction_id). Lo que exceda el saldo de la serie queda como un Payment
+    aparte 'refund_required' en la última reserva: no se suma a ningún saldo.
+    Si el pago llega con las fechas ya vencidas se reactivan las que sigan libres
+    (como en una reserva suelta); si no queda ninguna, se devuelve todo.
+    """
+    amount = Decimal(str(transaction_amount))
+    with transaction.atomic():
+        occurrences = list(Reservation.objects.select_for_update().filter(series_id=series_id).order_by('start_time'))
+        if not occurrences:
+            raise ValueError(f"La serie {series_id} no tiene reservas.")
+
+        # Idempotencia: las reservas ya están bloqueadas, un reintento concurrente espera acá
+        if Payment.objects.filter(transaction_id=str(payment_id)).exists():
+            return
+
+        approved = status_mp == 'approved'
+        if approved:
+            for reservation in occurrences:
+                if reservation.status == 'expired':
+                    reactivate_expired(reservation)
+
+        allocation, surplus = allocate_series_payment(series_id, amount)
+        if not allocation and not surplus:
+            # Ninguna fecha activa ni recuperable: el pago entero queda para devolver
+            surplus = {occurrences[-1].id: amount}
+
+        payments = [
+            Payment(
+                reservation_id=reservation_id,
+                amount=share,
+                payment_method='gateway',
+                status='approved' if approved else 'rejected',
+                approved_at=timezone.now() if approved else None,
+                transaction_id=str(payment_id)
+            )
+            for reservation_id, share in allocation.items()
+        ]
+        payments.extend(
+            Payment(
+                reservation_id=reservation_id,
+                amount=share,
+                payment_method='gateway',
+                status='refund_required' if approved else 'rejected',
+                approved_at=timezone.now() if approved else None,
+                transaction_id=str(payment_id)
+            )
+            for reservation_id, share in surplus.items()
+        )
+        Payment.objects.bulk_create(payments)
+        if approved and allocation:
+            apply_payment_amounts(allocation)
+            logger.info(f"Pago aplicado a la serie {series_id}: +{transaction_amount} en {len(allocation)} reservas")
+        if approved and surplus:
+            logger.warning(f"Pago {payment_id} de la serie {series_id}: {sum(surplus.values())} excede el saldo, a devolver")
+
+
+# Procesador por topic. Los topics sin procesador se marcan como procesados.
+HANDLERS = {
+    'payment': process_payment_notification,
+}
+
+
+def process_event(event_id):
+    event = WebhookEvent.objects.get(pk=event_id)
+    handler = HANDLERS.get(event.topic)
+
+    try:
+        if handler:
+            handler(event.data_id)
+    except Exception as e:
+        if isinstance(e, GatewayUnavailable):
+            # Circuito abierto: esperamos sin gastar intentos
+            WebhookEvent.objects.filter(pk=event_id).update(
+                status='pending',
+                attempts=F('attempts') - 1,
+                available_at=timezone.now() + timedelta(seconds=e.retry_after),
+            )
+            return False
+        limit = MAX_ATTEMPTS if isinstance(e, (RetryableError, GatewayError)) else MAX_ATTEMPTS_NON_RETRYABLE
+        failed = event.attempts >= limit
+        WebhookEvent.objects.filter(pk=event_id).update(
+            status='failed' if failed else 'pending',
+            available_at=timezone.now() + timedelta(seconds=backoff_delay(event.attempts)),
+            last_error=str(e),
+        )
+        logger.warning(f"Webhook {event.topic}:{event.data_id} falló (intento {event.attempts}): {e}")
+        return False
+
+    WebhookEvent.objects.filter(pk=event_id).update(status='done', last_error='', processed_at=timezone.now())
+    return True
+
+
+def drain_inbox(batch_size=100, workers=4):
+    """Procesa un lote de eventos disponibles. Devuelve cuántos se procesaron."""
+    ids = claim_batch(claimable_events(), batch_size, LEASE_SECONDS)
+    if ids:
+        run_in_pool(process_event, ids, workers)
+    return len(ids)
@@ -0,0 +1,64 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.events import publish_reservation_event
+from core.models import Reservation
+from core.reservations import void_reservations
+from core.signals import bump_reservation_versions
+
+# =========================================================
+#  CICLO DE VIDA DE RESERVAS
+# =========================================================
+# - 'pending' sin pagos más viejas que RESERVATION_PENDING_TTL_MINUTES -> 'expired'
+#   (libera la cancha y el stock de extras).
+# - 'confirmed' cuyo end_time ya pasó -> 'completed'.
+# Cada lote es una transacción corta: se toman hasta batch_size filas con
+# SKIP LOCKED (vía los índices parciales) y se actualizan con un UPDATE.
+
+
+def expire_pending(batch_size=None, now=None):
+    """Vence un lote de reservas pendientes sin pagos. Devuelve cuántas vencieron."""
+    batch_size = batch_size or settings.RESERVATION_LIFECYCLE_BATCH_SIZE
+    cutoff = (now or timezone.now()) - timedelta(minutes=settings.RESERVATION_PENDING_TTL_MINUTES)
+
+    with transaction.atomic():
+        ids = list(
+            Reservation.objects.filter(status='pending', created_at__lt=cutoff, amount_paid=0)
+            .select_for_update(skip_locked=True)
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        # Las filas ya están bloqueadas: void_reservations no espera a nadie
+        return len(void_reservations(ids, status='expired', from_statuses=('pending',)))
+
+
+def complete_past(batch_size=None, now=None):
+    """Marca como completadas un lote de reservas confirmadas que ya terminaron."""
+    batch_size = batch_size or settings.RESERVATION_LIFECYCLE_BATCH_SIZE
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        rows = list(
+            Reservation.objects.filter(status='confirmed', end_time__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('end_time', 'id')
+            .values_list('id', 'court_id', 'court__company_id', 'start_time', 'end_time')[:batch_size]
+        )
+        if not rows:
+            return 0
+        Reservation.objects.filter(pk__in=[row[0] for row in rows]).update(status='completed')
+        # update() no dispara signals: la grilla muestra el estado de cada turno
+        for court_id, company_id in {(row[1], row[2]) for row in rows}:
+            bump_reservation_versions(court_id, company_id)
+        for reservation_id, court_id, company_id, start_time, end_time in rows:
+            publish_reservation_event('completed', reservation_id, court_id, company_id, start_time, end_time, 'completed')
+    return len(rows)
+
+
+def run_lifecycle(batch_size=None, now=None):
+    """Un lote de cada transición. Devuelve el total de reservas que cambiaron."""
+    return expire_pending(batch_size, now) + complete_past(batch_size, now)
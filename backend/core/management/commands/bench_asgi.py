@@ -0,0 +1,225 @@
+import asyncio
+import datetime
+import io
+import json
+import statistics
+import threading
+import time
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+
+from core.models import Court
+
+
+def build_requests(court, date):
+    """(nombre, ruta sync DRF, ruta async, método, cuerpo) de cada camino medido."""
+    start = timezone.make_aware(datetime.datetime.combine(date, datetime.time(18)))
+    quote_body = json.dumps({
+        "court_id": court.id,
+        "start_time": start.isoformat(),
+        "end_time": (start + datetime.timedelta(minutes=90)).isoformat(),
+    }).encode()
+    grid_query = f"from={date.isoformat()}&to={(date + datetime.timedelta(days=6)).isoformat()}"
+    return [
+        ("court availability", f"/api/courts/{court.id}/availability/", f"/api/async/courts/{court.id}/availability/",
+         f"date={date.isoformat()}", 'GET', b''),
+        ("company grid (7d)", f"/api/companies/{court.company_id}/availability/",
+         f"/api/async/companies/{court.company_id}/availability/", grid_query, 'GET', b''),
+        ("quote", "/api/reservations/quote/", "/api/async/reservations/quote/", '', 'POST', quote_body),
+    ]
+
+
+def summarize(latencies, elapsed, errors):
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000 if ordered else 0.0
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+
+# =========================================================
+#  WSGI: C clientes compartiendo T threads de worker (como gunicorn gthread)
+# =========================================================
+
+def run_wsgi(path, query, method, body, total, concurrency, threads):
+    handler = WSGIHandler()
+    worker_slots = threading.Semaphore(threads)
+    latencies, errors = [], []
+    lock = threading.Lock()
+    per_client = total // concurrency
+
+    def call():
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+            'SERVER_PROTOCOL': 'HTTP/1.1', 'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        status = []
+        result = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+        try:
+            b''.join(result)
+        finally:
+            result.close()
+        return int(status[0].split()[0])
+
+    def client():
+        for _ in range(per_client):
+            started = time.perf_counter()
+            with worker_slots:
+                code = call()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                if code >= 400:
+                    errors.append(code)
+
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return summarize(latencies, time.perf_counter() - started, len(errors))
+
+
+# =========================================================
+#  ASGI: C clientes como corrutinas sobre un solo event loop
+# =========================================================
+
+async def run_asgi(path, query, method, body, total, concurrency):
+    handler = ASGIHandler()
+    latencies, errors = [], []
+    per_client = total // concurrency
+
+    async def call():
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': [(b'host', b'localhost'), (b'content-type', b'application/json')],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        done = asyncio.Event()
+        status = []
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                done.set()
+
+        await handler(scope, receive, send)
+        done.set()
+        return status[0]
+
+    async def client():
+        for _ in range(per_client):
+            started = time.perf_counter()
+            code = await call()
+            latencies.append(time.perf_counter() - started)
+            if code >= 400:
+                errors.append(code)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started, len(errors))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara throughput y latencia de availability/quote: vistas DRF sync bajo WSGI "
+        "contra las vistas async bajo ASGI, sobre los mismos datos y en el mismo proceso."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--court', type=int, help="ID de la cancha (por defecto la primera activa)")
+        parser.add_argument('--date', help="Día consultado (YYYY-MM-DD). Por defecto, mañana")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests por camino y modo")
+        parser.add_argument('--concurrency', type=int, default=50, help="Clientes simultáneos")
+        parser.add_argument('--threads', type=int, default=8, help="Threads de worker del servidor WSGI simulado")
+        parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                            help="Latencia artificial por consulta (simula la red hasta la BD)")
+        parser.add_argument('--json', action='store_true', help="Imprime el resultado como JSON")
+
+    def handle(self, *args, **options):
+        court = Court.objects.filter(is_active=True).order_by('id')
+        court = court.filter(pk=options['court']).first() if options['court'] else court.first()
+        if not court:
+            raise CommandError("No hay canchas para medir.")
+        date = (
+            datetime.date.fromisoformat(options['date']) if options['date']
+            else timezone.localdate() + datetime.timedelta(days=1)
+        )
+        if options['concurrency'] < 1 or options['requests'] < options['concurrency']:
+            raise CommandError("--requests debe ser mayor o igual a --concurrency.")
+
+        latency = options['db_latency_ms'] / 1000
+
+        def add_latency(sender, connection, **kwargs):
+            def wrapper(execute, sql, params, many, context):
+                time.sleep(latency)
+                return execute(sql, params, many, context)
+            connection.execute_wrappers.append(wrapper)
+
+        if latency:
+            connections.close_all()
+            connection_created.connect(add_latency)
+
+        results = []
+        try:
+            for name, sync_path, async_path, query, method, body in build_requests(court, date):
+                wsgi = run_wsgi(sync_path, query, method, body, options['requests'],
+                                options['concurrency'], options['threads'])
+                asgi = asyncio.run(run_asgi(async_path, query, method, body, options['requests'],
+                                            options['concurrency']))
+                results.append({"endpoint": name, "wsgi_sync": wsgi, "asgi_async": asgi})
+        finally:
+            if latency:
+                connection_created.disconnect(add_latency)
+                connections.close_all()
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                "court": court.id, "date": date.isoformat(), "requests": options['requests'],
+                "concurrency": options['concurrency'], "threads": options['threads'],
+                "db_latency_ms": options['db_latency_ms'], "results": results,
+            }, indent=2))
+            return
+
+        self.stdout.write(
+            f"Cancha {court.id}, {date}: {options['requests']} requests, {options['concurrency']} clientes, "
+            f"{options['threads']} threads WSGI, +{options['db_latency_ms']} ms por consulta"
+        )
+        for result in results:
+            self.stdout.write(f"\n{result['endpoint']}")
+            for mode in ('wsgi_sync', 'asgi_async'):
+                r = result[mode]
+                self.stdout.write(
+                    f"  {mode:<11} {r['rps']:8.1f} req/s   p50 {r['p50_ms']:7.1f} ms   "
+                    f"p95 {r['p95_ms']:7.1f} ms   p99 {r['p99_ms']:7.1f} ms   errores {r['errors']}"
+                )
+            if result['wsgi_sync']['rps']:
+                ratio = result['asgi_async']['rps'] / result['wsgi_sync']['rps']
+                self.stdout.write(self.style.SUCCESS(f"  ASGI/WSGI: x{ratio:.2f}"))
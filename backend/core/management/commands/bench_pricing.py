@@ -0,0 +1,72 @@
+import datetime
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import Court, CourtTypePrice
+from core.pricing import quote_price, clear_price_schedules
+
+
+def legacy_calculate_price(court, start_dt, end_dt):
+    """Cálculo original de ReservationViewSet (consulta + loop por franja)."""
+    total = Decimal('0.00')
+    type_prices = CourtTypePrice.objects.filter(
+        court_type=court.court_type,
+        company=court.company
+    ).select_related('time_slot')
+
+    req_start_time = start_dt.time()
+    req_end_time = end_dt.time()
+
+    for tp in type_prices:
+        slot = tp.time_slot
+        overlap_start = max(req_start_time, slot.start_time)
+        overlap_end = min(req_end_time, slot.end_time)
+        if overlap_start < overlap_end:
+            dummy_date = datetime.date(2000, 1, 1)
+            dt1 = datetime.datetime.combine(dummy_date, overlap_start)
+            dt2 = datetime.datetime.combine(dummy_date, overlap_end)
+            duration_hours = Decimal((dt2 - dt1).total_seconds() / 3600)
+            total += duration_hours * tp.price
+    return total
+
+
+class Command(BaseCommand):
+    help = "Compara el cálculo de precios original contra el tarifario precompilado."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--court', type=int, help="ID de la cancha (por defecto la primera activa)")
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        qs = Court.objects.select_related('court_type', 'company')
+        court = qs.filter(pk=options['court']).first() if options['court'] else qs.filter(is_active=True).first()
+        if not court:
+            raise CommandError("No hay canchas para medir.")
+
+        iterations = options['iterations']
+        base = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        # Rangos variados entre las 06:00 y las 23:00
+        ranges = [
+            (base + datetime.timedelta(minutes=360 + (i * 30) % 900),
+             base + datetime.timedelta(minutes=360 + (i * 30) % 900 + 60 + (i % 3) * 30))
+            for i in range(iterations)
+        ]
+
+        started = time.perf_counter()
+        for start_dt, end_dt in ranges:
+            legacy_calculate_price(court, start_dt, end_dt)
+        legacy_elapsed = time.perf_counter() - started
+
+        clear_price_schedules()
+        started = time.perf_counter()
+        for start_dt, end_dt in ranges:
+            quote_price(court, start_dt, end_dt, with_breakdown=False)
+        compiled_elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"Cancha: {court} ({iterations} cotizaciones)")
+        self.stdout.write(f"  Loop original:        {legacy_elapsed * 1000:.1f} ms ({legacy_elapsed / iterations * 1e6:.1f} µs/cotización)")
+        self.stdout.write(f"  Tarifario compilado:  {compiled_elapsed * 1000:.1f} ms ({compiled_elapsed / iterations * 1e6:.1f} µs/cotización)")
+        if compiled_elapsed:
+            self.stdout.write(self.style.SUCCESS(f"  Speedup: x{legacy_elapsed / compiled_elapsed:.1f}"))
@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import SCENARIOS, build_context, compare, run_suite
+from core.models import Court
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia y consultas de availability, quote, create y el webhook (offline, "
+        "pasarela falsa, sin dejar datos). Guarda el resultado en JSON y lo compara con una línea base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--court', type=int, help="ID de la cancha (por defecto la primera de benchmark)")
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--scenarios', help=f"Lista separada por comas ({', '.join(s[0] for s in SCENARIOS)})")
+        parser.add_argument('--output', help="Guarda el resultado en este archivo JSON")
+        parser.add_argument('--baseline', help="Resultado JSON anterior para comparar")
+        parser.add_argument('--threshold', type=float, default=0.2, help="Empeoramiento tolerado del p50 (0.2 = 20%%)")
+        parser.add_argument('--fail-on-regression', action='store_true', help="Termina con error si hay regresiones")
+        parser.add_argument('--json', action='store_true', help="Imprime el resultado como JSON")
+
+    def handle(self, *args, **options):
+        court = None
+        if options['court']:
+            court = Court.objects.select_related('company').filter(pk=options['court']).first()
+            if not court:
+                raise CommandError(f"La cancha {options['court']} no existe.")
+        ctx = build_context(court)
+        if ctx is None:
+            raise CommandError("No hay canchas para medir. Generá datos con 'manage.py seed_bench_data'.")
+
+        names = None
+        if options['scenarios']:
+            names = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+            unknown = set(names) - {scenario[0] for scenario in SCENARIOS}
+            if unknown:
+                raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+        if options['iterations'] < 1:
+            raise CommandError("--iterations debe ser mayor que cero.")
+
+        result = run_suite(ctx, options['iterations'], options['warmup'], names)
+        comparison = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as handle:
+                comparison = compare(result, json.load(handle), options['threshold'])
+            result['comparison'] = comparison
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(result, handle, indent=2)
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2))
+        else:
+            meta = result['meta']
+            self.stdout.write(
+                f"{meta['database']}, cancha {meta['court']}, {meta['reservations']} reservas, "
+                f"{meta['iterations']} iteraciones (+{meta['warmup']} de calentamiento)"
+            )
+            for name, r in result['results'].items():
+                self.stdout.write(
+                    f"  {name:<22} p50 {r['p50_ms']:8.2f} ms   p95 {r['p95_ms']:8.2f} ms   "
+                    f"consultas {r['queries']:3d} (máx {r['queries_max']})   errores {r['errors']}"
+                )
+            for row in comparison or []:
+                line = (
+                    f"  {row['scenario']:<22} p50 x{row['ratio'] or 0:.2f} vs línea base, "
+                    f"consultas {row['baseline_queries']} -> {row['queries']}"
+                )
+                self.stdout.write(self.style.ERROR(f"❌{line}") if row['regression'] else line)
+
+        regressions = [row['scenario'] for row in comparison or [] if row['regression']]
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"Regresiones en: {', '.join(regressions)}")
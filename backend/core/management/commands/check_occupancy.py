@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.occupancy import add_scope_arguments, find_mismatches, mask_to_hex, refresh_court_days, resolve_scope
+
+
+class Command(BaseCommand):
+    help = "Compara los mapas de ocupación con las reservas y reporta (o corrige) diferencias."
+
+    def add_arguments(self, parser):
+        add_scope_arguments(parser)
+        parser.add_argument('--fix', action='store_true', help="Recalcula los días con diferencias")
+
+    def handle(self, *args, **options):
+        court_ids, first_day, last_day = resolve_scope(options)
+        mismatches = find_mismatches(court_ids, first_day, last_day)
+
+        for court_id, day, stored, expected in mismatches:
+            self.stdout.write(f"❌ Cancha {court_id} {day}: guardado {mask_to_hex(stored)} esperado {mask_to_hex(expected)}")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f"✅ Ocupación consistente ({first_day} a {last_day})."))
+            return
+        if options['fix']:
+            refresh_court_days([(court_id, day) for court_id, day, _, _ in mismatches])
+            self.stdout.write(self.style.SUCCESS(f"✅ {len(mismatches)} días corregidos."))
+            return
+        raise CommandError(f"{len(mismatches)} días no coinciden con las reservas (usar --fix).")
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.catalog_import import CatalogImportError, import_catalog, parse_csv_spec, parse_json_spec
+from core.models import Company
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa horarios, tipos de cancha, canchas, franjas y tarifas de una empresa "
+        "desde un archivo JSON o CSV (ver core/catalog_import.py). Todo o nada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('company_id', type=int)
+        parser.add_argument('path', help="Archivo .json o .csv")
+        parser.add_argument('--format', choices=['json', 'csv'], help="Por defecto se deduce de la extensión")
+        parser.add_argument('--dry-run', action='store_true', help="Solo valida, no escribe")
+
+    def handle(self, *args, **options):
+        try:
+            company = Company.objects.get(pk=options['company_id'])
+        except Company.DoesNotExist:
+            raise CommandError(f"La empresa {options['company_id']} no existe.")
+
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'json')
+        with open(path, encoding='utf-8-sig') as handle:
+            content = handle.read()
+
+        try:
+            if file_format == 'csv':
+                rows = parse_csv_spec(content)
+            else:
+                try:
+                    rows = parse_json_spec(json.loads(content))
+                except json.JSONDecodeError as e:
+                    raise CommandError(f"JSON inválido: {e}")
+            counts = import_catalog(company, rows, dry_run=options['dry_run'])
+        except CatalogImportError as e:
+            for error in e.errors:
+                where = ' '.join(str(part) for part in (error['section'], error['row']) if part is not None)
+                self.stderr.write(f"❌ {where}: {error['error']}" if where else f"❌ {error['error']}")
+            raise CommandError(f"{e.message} ({len(e.errors)} errores)")
+
+        summary = ', '.join(f"{section}={count}" for section, count in counts.items())
+        prefix = "Validación OK (sin escribir)" if options['dry_run'] else f"✅ Catálogo de {company.name} importado"
+        self.stdout.write(self.style.SUCCESS(f"{prefix}: {summary}"))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.inbox import drain_inbox
+from core.workers import run_loop
+
+
+class Command(BaseCommand):
+    help = "Worker que procesa las notificaciones de Mercado Pago guardadas en el inbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Threads que procesan eventos en paralelo")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1.0, help="Segundos de espera cuando no hay trabajo")
+        parser.add_argument('--once', action='store_true', help="Procesa un solo lote y termina")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Inbox de webhooks: {options['workers']} workers, lotes de {options['batch_size']}")
+        run_loop(
+            lambda: drain_inbox(options['batch_size'], options['workers']),
+            options['interval'],
+            once=options['once'],
+            stdout=self.stdout,
+        )
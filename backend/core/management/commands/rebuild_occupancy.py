@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.occupancy import add_scope_arguments, rebuild, resolve_scope
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los mapas de ocupación por cancha y día a partir de las reservas."
+
+    def add_arguments(self, parser):
+        add_scope_arguments(parser)
+        parser.add_argument('--chunk-days', type=int, default=31, help="Días por transacción")
+
+    def handle(self, *args, **options):
+        court_ids, first_day, last_day = resolve_scope(options)
+        written = rebuild(court_ids, first_day, last_day, options['chunk_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(court_ids)} canchas, {first_day} a {last_day}: {written} días con ocupación."
+        ))
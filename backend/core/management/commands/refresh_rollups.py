@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core.occupancy import add_scope_arguments, resolve_scope
+from core.rollups import DEFAULT_BATCH_SIZE, backfill, refresh_dirty
+from core.workers import run_loop
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los resúmenes diarios marcados por reservas y pagos. "
+        "Con --backfill recalcula todo un rango (datos históricos)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=10.0, help="Segundos de espera cuando no hay trabajo")
+        parser.add_argument('--once', action='store_true', help="Procesa un solo lote y termina")
+        parser.add_argument('--backfill', action='store_true', help="Recalcula el rango de --from/--to y termina")
+        add_scope_arguments(parser)
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            court_ids, first_day, last_day = resolve_scope(options)
+            written = backfill(court_ids, first_day, last_day)
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {len(court_ids)} canchas, {first_day} a {last_day}: {written} resúmenes."
+            ))
+            return
+
+        self.stdout.write(f"Resúmenes diarios: lotes de {options['batch_size']}")
+        run_loop(
+            lambda: refresh_dirty(options['batch_size']),
+            options['interval'],
+            once=options['once'],
+            stdout=self.stdout,
+        )
@@ -0,0 +1,106 @@
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from core import fakes
+from core.inbox import drain_inbox
+from core.models import Reservation, WebhookEvent
+
+
+class Command(BaseCommand):
+    help = (
+        "Reproduce notificaciones de Mercado Pago contra el webhook y drena el inbox "
+        "midiendo el throughput. Usa la pasarela falsa: no hay llamadas de red."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help="Archivo JSON-lines con eventos grabados")
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help="Genera N eventos de pago aprobados contra reservas existentes")
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def load_events(self, options):
+        """
+        Cada línea del archivo: {"topic": "payment", "data_id": "123", "payload": {...},
+        "payment": {"external_reference": "45", "status": "approved", "transaction_amount": 50.0}}
+        'payment' es opcional y se registra en la pasarela falsa para que el worker lo encuentre.
+        """
+        events = []
+        if options['file']:
+            with open(options['file']) as fh:
+                events.extend(json.loads(line) for line in fh if line.strip())
+
+        if options['synthetic']:
+            reservations = list(Reservation.objects.values_list('id', 'total_price')[:options['synthetic']])
+            if not reservations:
+                raise CommandError("No hay reservas para generar eventos sintéticos.")
+            for i in range(options['synthetic']):
+                reservation_id, total = reservations[i % len(reservations)]
+                data_id = f"replay-{uuid.uuid4().hex[:12]}"
+                events.append({
+                    "topic": "payment",
+                    "data_id": data_id,
+                    "payload": {"type": "payment", "data": {"id": data_id}},
+                    "payment": {"external_reference": reservation_id, "status": "approved",
+                                "transaction_amount": float(total) / 2},
+                })
+        if not events:
+            raise CommandError("Indica un archivo de eventos o --synthetic N.")
+        return events
+
+    def signed_headers(self, data_id):
+        secret_key = os.getenv("MP_WEBHOOK_SECRET")
+        if not secret_key:
+            return {}
+        request_id = uuid.uuid4().hex
+        ts = str(int(time.time()))
+        manifest = f"id:{data_id};request-id:{request_id};ts:{ts};"
+        digest = hmac.new(secret_key.encode(), msg=manifest.encode(), digestmod=hashlib.sha256).hexdigest()
+        return {"HTTP_X_SIGNATURE": f"ts={ts},v1={digest}", "HTTP_X_REQUEST_ID": request_id}
+
+    def handle(self, *args, **options):
+        events = self.load_events(options)
+        fakes.reset()
+        for event in events:
+            if event.get("payment"):
+                p = event["payment"]
+                fakes.register_payment(event["data_id"], p["external_reference"], p["transaction_amount"], p.get("status", "approved"))
+
+        client = Client()
+        with override_settings(PAYMENT_GATEWAY="fake"):
+            # 1. Ingesta: POST al webhook (valida firma y guarda en el inbox)
+            started = time.perf_counter()
+            for event in events:
+                data_id = event["data_id"]
+                response = client.post(
+                    f"/api/webhooks/mercadopago/?data.id={data_id}&type={event['topic']}",
+                    data=json.dumps(event.get("payload") or {"type": event["topic"], "data": {"id": data_id}}),
+                    content_type="application/json",
+                    **self.signed_headers(data_id)
+                )
+                if response.status_code != 200:
+                    raise CommandError(f"El webhook respondió {response.status_code}")
+            ingest_elapsed = time.perf_counter() - started
+
+            # 2. Procesamiento: drenamos el inbox con el pool de workers
+            started = time.perf_counter()
+            processed = 0
+            while True:
+                batch = drain_inbox(options['batch_size'], options['workers'])
+                if not batch:
+                    break
+                processed += batch
+            process_elapsed = time.perf_counter() - started
+
+        failed = WebhookEvent.objects.filter(status='failed').count()
+        self.stdout.write(f"Eventos reproducidos: {len(events)}")
+        self.stdout.write(f"  Ingesta:       {ingest_elapsed:.2f} s ({len(events) / ingest_elapsed:.0f} eventos/s)")
+        if process_elapsed:
+            self.stdout.write(f"  Procesamiento: {process_elapsed:.2f} s ({processed / process_elapsed:.0f} eventos/s, {options['workers']} workers)")
+        self.stdout.write(f"  Fallidos: {failed}")
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.lifecycle import run_lifecycle
+from core.workers import run_loop
+
+
+class Command(BaseCommand):
+    help = "Vence reservas pendientes sin pago y completa las confirmadas que ya terminaron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.RESERVATION_LIFECYCLE_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=30.0, help="Segundos de espera cuando no hay trabajo")
+        parser.add_argument('--once', action='store_true', help="Procesa un solo lote de cada tipo y termina")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Ciclo de vida de reservas: TTL {settings.RESERVATION_PENDING_TTL_MINUTES} min, "
+            f"lotes de {options['batch_size']}"
+        )
+        run_loop(
+            lambda: run_lifecycle(options['batch_size']),
+            options['interval'],
+            once=options['once'],
+            stdout=self.stdout,
+        )
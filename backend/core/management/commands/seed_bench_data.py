@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import flush_bench_data, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un dataset sintético reproducible para benchmarks: empresas, canchas, "
+        "franjas, tarifas y reservas (hasta millones, insertadas por lotes)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--companies', type=int, default=5)
+        parser.add_argument('--courts', type=int, default=8, help="Canchas por empresa")
+        parser.add_argument('--days', type=int, default=60, help="Días con reservas (mitad pasado, mitad futuro)")
+        parser.add_argument('--per-court-day', type=int, default=6, help="Reservas por cancha y día (máximo 15)")
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42, help="Semilla: misma semilla, mismos datos")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--flush', action='store_true', help="Borra antes los datos de benchmark existentes")
+        parser.add_argument('--skip-derived', action='store_true',
+                            help="No reconstruye mapas de ocupación ni resúmenes diarios")
+
+    def handle(self, *args, **options):
+        if min(options['companies'], options['courts'], options['days'], options['per_court_day'],
+               options['users'], options['batch_size']) < 1:
+            raise CommandError("Todos los tamaños deben ser mayores que cero.")
+
+        if options['flush']:
+            removed = flush_bench_data()
+            self.stdout.write(f"Eliminadas {removed} empresas de benchmark anteriores.")
+
+        expected = options['companies'] * options['courts'] * options['days'] * min(options['per_court_day'], 15)
+        self.stdout.write(f"Generando ~{expected} reservas (semilla {options['seed']})...")
+        counts = seed(
+            companies=options['companies'],
+            courts_per_company=options['courts'],
+            days=options['days'],
+            per_court_day=options['per_court_day'],
+            users=options['users'],
+            seed_value=options['seed'],
+            batch_size=options['batch_size'],
+            derived=not options['skip_derived'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "✅ " + ", ".join(f"{key}={value}" for key, value in counts.items())
+        ))
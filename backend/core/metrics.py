@@ -0,0 +1,239 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+# =========================================================
+#  MÉTRICAS POR ENDPOINT (formato de texto de Prometheus)
+# =========================================================
+# MetricsMiddleware mide cada request: latencia, cantidad y tiempo de consultas
+# a la BD y tiempo en la pasarela de pago. Los valores se acumulan en memoria
+# (histogramas por ruta, método y status) y se exponen en GET /metrics; además
+# cada request deja una línea JSON en el logger 'core.requests'.
+#
+# Costo: un perf_counter por consulta y un lock corto por request. Los registros
+# son por proceso: con varios workers de gunicorn, Prometheus debe scrapear
+# cada uno (o sumar por instancia).
+#
+# Las consultas se cuentan con un execute_wrapper instalado en cada conexión
+# (connection_created, ver CoreConfig.ready) que suma en el RequestStats del
+# contexto actual; asgiref copia el contexto a los threads de sync_to_async,
+# así también se cuentan las consultas de las vistas async.
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+GATEWAY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+logger = logging.getLogger('core.requests')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in items)
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labels -> [conteo por bucket (no acumulado) + desborde, suma, cantidad]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REQUEST_LABELS = ('method', 'route', 'status')
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', "Latencia de la request (hasta devolver la respuesta).",
+    REQUEST_LABELS, REQUEST_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', "Consultas a la BD por request.", REQUEST_LABELS, QUERY_BUCKETS
+)
+REQUEST_DB_SECONDS = Counter(
+    'http_request_db_seconds_total', "Tiempo total en consultas a la BD.", REQUEST_LABELS
+)
+REQUEST_GATEWAY_SECONDS = Counter(
+    'http_request_gateway_seconds_total', "Tiempo total en llamadas a la pasarela de pago dentro de requests.",
+    REQUEST_LABELS
+)
+GATEWAY_DURATION = Histogram(
+    'payment_gateway_request_duration_seconds', "Latencia de las llamadas a la pasarela de pago (web y workers).",
+    ('operation', 'outcome'), GATEWAY_BUCKETS
+)
+
+REGISTRY = [REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_SECONDS, REQUEST_GATEWAY_SECONDS, GATEWAY_DURATION]
+
+
+def render_metrics():
+    """Todas las métricas en formato de texto de Prometheus (versión 0.0.4)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# =========================================================
+#  CONTADORES POR REQUEST
+# =========================================================
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'gateway_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.gateway_seconds = 0.0
+
+
+_current = ContextVar('request_stats', default=None)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def install_db_wrapper(sender, connection, **kwargs):
+    """Receiver de connection_created: instala el wrapper una vez por conexión."""
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+def observe_gateway(operation, outcome, seconds):
+    """Lo llama core/gateway.py después de cada llamada a la pasarela."""
+    GATEWAY_DURATION.observe((operation, outcome), seconds)
+    stats = _current.get()
+    if stats is not None:
+        stats.gateway_seconds += seconds
+
+
+def route_label(request):
+    """Nombre de la ruta resuelta (baja cardinalidad: 'court-availability', no la URL con IDs)."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route or 'unnamed'
+
+
+class MetricsMiddleware:
+    """Debe ir primero en MIDDLEWARE para medir también al resto de los middlewares."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def record(self, request, response, elapsed, stats):
+        # En respuestas streaming (SSE, exportaciones) se mide hasta las cabeceras
+        labels = (request.method, route_label(request), str(response.status_code))
+        REQUEST_DURATION.observe(labels, elapsed)
+        REQUEST_QUERIES.observe(labels, stats.queries)
+        if stats.db_seconds:
+            REQUEST_DB_SECONDS.inc(labels, stats.db_seconds)
+        if stats.gateway_seconds:
+            REQUEST_GATEWAY_SECONDS.inc(labels, stats.gateway_seconds)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "method": labels[0],
+                "route": labels[1],
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(elapsed * 1000, 2),
+                "db_queries": stats.queries,
+                "db_ms": round(stats.db_seconds * 1000, 2),
+                "gateway_ms": round(stats.gateway_seconds * 1000, 2),
+            }))
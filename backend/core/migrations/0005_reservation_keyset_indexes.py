@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:18
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción;
+    # así no bloqueamos escrituras en la tabla de reservas mientras se crean.
+    atomic = False
+
+    dependencies = [
+        ('core', '0004_webhook_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='reservation',
+            index=models.Index(fields=['-start_time', '-id'], name='reservation_start_id'),
+        ),
+        AddIndexConcurrently(
+            model_name='reservation',
+            index=models.Index(fields=['court', '-start_time', '-id'], name='reservation_court_start_id'),
+        ),
+        AddIndexConcurrently(
+            model_name='reservation',
+            index=models.Index(fields=['status', '-start_time', '-id'], name='reservation_status_start_id'),
+        ),
+    ]
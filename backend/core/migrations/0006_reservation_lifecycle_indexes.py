@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:22
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Igual que 0005: índices creados sin bloquear escrituras
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_reservation_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservation',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendiente de Pago'), ('confirmed', 'Confirmada'), ('completed', 'Completada'), ('expired', 'Vencida sin Pago'), ('voided', 'Anulada por Admin')], db_index=True, default='pending', max_length=20),
+        ),
+        AddIndexConcurrently(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['created_at', 'id'], name='reservation_pending_created'),
+        ),
+        AddIndexConcurrently(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('status', 'confirmed')), fields=['end_time', 'id'], name='reservation_confirmed_end'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:31
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_reservation_lifecycle_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='company',
+            index=models.Index(fields=['latitude', 'longitude'], name='company_lat_lng'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_company_location_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourtDayOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('mask', models.BinaryField(default=b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', max_length=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='core.court')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('court', 'day'), name='occupancy_court_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_reservation_series'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('open_minutes', models.PositiveIntegerField(default=0)),
+                ('booked_minutes', models.PositiveIntegerField(default=0)),
+                ('reservations', models.PositiveIntegerField(default=0)),
+                ('booked_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('collected_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('slots', models.JSONField(default=dict)),
+                ('dirty', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='core.court')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('dirty', True)), fields=['day', 'id'], name='rollup_dirty')],
+                'constraints': [models.UniqueConstraint(fields=('court', 'day'), name='rollup_court_day')],
+            },
+        ),
+    ]
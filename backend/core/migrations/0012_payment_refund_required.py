@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_shared_cache_table'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendiente revisión'), ('approved', 'Aprobado'), ('rejected', 'Rechazado'), ('refund_required', 'Aprobado, a devolver')], default='pending', max_length=20),
+        ),
+    ]
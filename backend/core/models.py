@@ -1,5 +1,9 @@
 from decimal import Decimal
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Func, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeBoundary, RangeOperators
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -66,6 +70,12 @@ class Company(models.Model):
     longitude = models.DecimalField(max_digits=18, decimal_places=15, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Búsqueda por cercanía (core/geo.py): rango de latitud + longitud dentro del índice
+            models.Index(fields=['latitude', 'longitude'], name='company_lat_lng'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -128,13 +138,33 @@ class AddOn(models.Model):
 # 3. TRANSACCIONAL (Flujo Simplificado)
 # ==========================================
 
+class TsTzRange(Func):
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+class ReservationSeries(models.Model):
+    """Reservas recurrentes (ej. todos los martes de la temporada) con un único pago."""
+    court = models.ForeignKey(Court, on_delete=models.PROTECT, related_name='series')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservation_series')
+    interval_weeks = models.PositiveSmallIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Serie {self.id} - {self.court.name}"
+
+# Estados que ocupan la cancha (bloquean disponibilidad). A nivel de módulo
+# porque Reservation.Meta no ve los atributos de la clase.
+ACTIVE_RESERVATION_STATUSES = ('pending', 'confirmed', 'completed')
+
 class Reservation(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pendiente de Pago'),
         ('confirmed', 'Confirmada'),
         ('completed', 'Completada'),
+        ('expired', 'Vencida sin Pago'), # La seña no llegó dentro de RESERVATION_PENDING_TTL_MINUTES
         ('voided', 'Anulada por Admin'), # Mantenemos solo para anulación manual administrativa, sin lógica de reembolso
     ]
+    ACTIVE_STATUSES = ACTIVE_RESERVATION_STATUSES
 
     court = models.ForeignKey(Court, on_delete=models.PROTECT, related_name='reservations')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations')
@@ -151,27 +181,114 @@ class Reservation(models.Model):
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    series = models.ForeignKey(
+        ReservationSeries, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservations'
+    )
     
     class Meta:
         ordering = ['-start_time']
+        indexes = [
+            # Listado paginado por cursor (start_time, id) con filtros por cancha o estado
+            models.Index(fields=['-start_time', '-id'], name='reservation_start_id'),
+            models.Index(fields=['court', '-start_time', '-id'], name='reservation_court_start_id'),
+            models.Index(fields=['status', '-start_time', '-id'], name='reservation_status_start_id'),
+            # Índices parciales del scheduler de ciclo de vida (core/lifecycle.py):
+            # solo cubren las filas que todavía pueden cambiar de estado.
+            models.Index(fields=['created_at', 'id'], condition=Q(status='pending'), name='reservation_pending_created'),
+            models.Index(fields=['end_time', 'id'], condition=Q(status='confirmed'), name='reservation_confirmed_end'),
+        ]
+        constraints = [
+            # PostgreSQL impide dos reservas activas solapadas en la misma cancha.
+            # Rango semiabierto [inicio, fin): una reserva puede empezar justo cuando termina otra.
+            ExclusionConstraint(
+                name='reservation_no_overlap',
+                expressions=[
+                    ('court', RangeOperators.EQUAL),
+                    (TsTzRange('start_time', 'end_time', RangeBoundary()), RangeOperators.OVERLAPS),
+                ],
+                condition=Q(status__in=list(ACTIVE_RESERVATION_STATUSES)),
+            ),
+        ]
+
+    # Campos que determinan la ocupación (ver core/occupancy.py)
+    OCCUPANCY_FIELDS = ('court_id', 'start_time', 'end_time', 'status')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Foto de lo leído: al guardar solo se recalcula la ocupación si cambió
+        if all(name in field_names for name in cls.OCCUPANCY_FIELDS):
+            instance._occupancy_snapshot = instance.occupancy_snapshot()
+        return instance
+
+    def occupancy_snapshot(self):
+        return tuple(getattr(self, name) for name in self.OCCUPANCY_FIELDS)
 
     def clean(self):
         if self.start_time >= self.end_time:
             raise ValidationError("Hora fin debe ser mayor a inicio.")
 
     def save(self, *args, **kwargs):
+        if not self._state.adding and not hasattr(self, '_occupancy_snapshot'):
+            # Sin foto de from_db (instancia armada a mano o leída con campos diferidos):
+            # la leemos antes de guardar para saber qué días de ocupación recalcular
+            self._occupancy_snapshot = (
+                Reservation.objects.filter(pk=self.pk).values_list(*self.OCCUPANCY_FIELDS).first()
+            )
         self.total_price = self.subtotal_court + self.subtotal_addons
         self.amount_pending = self.total_price - self.amount_paid
         
         # Lógica automática de confirmación
         if self.status == 'pending':
-            required_advance = (self.total_price * self.court.company.advance_payment_percentage) / 100
+            required_advance = (self.total_price * self.advance_payment_percentage()) / 100
             # Confirmamos si cubre la seña y el precio no es cero
             if self.amount_paid >= required_advance and self.total_price > 0:
                 self.status = 'confirmed'
                 
         super().save(*args, **kwargs)
 
+    def advance_payment_percentage(self):
+        """
+        Porcentaje de seña de la empresa. Usa la cancha y la empresa si ya están en
+        memoria; si no, una sola consulta en vez de cargar cancha y luego empresa.
+        """
+        if Reservation.court.is_cached(self) and Court.company.is_cached(self.court):
+            return self.court.company.advance_payment_percentage
+        return Court.objects.filter(pk=self.court_id).values_list(
+            'company__advance_payment_percentage', flat=True
+        ).get()
+
+    def refresh_addon_totals(self):
+        """
+        Recalcula subtotal_addons, total_price y amount_pending con un solo UPDATE
+        (SUM en la BD), sin pasar por save() ni releer los ítems en Python.
+        """
+        addons_sum = Coalesce(
+            Subquery(
+                ReservationAddOn.objects.filter(reservation=OuterRef('pk'))
+                .values('reservation')
+                .annotate(total=Sum(F('quantity') * F('price_snapshot')))
+                .values('total')[:1],
+                output_field=models.DecimalField(max_digits=10, decimal_places=2)
+            ),
+            Value(Decimal('0.00')),
+        )
+        Reservation.objects.filter(pk=self.pk).update(
+            subtotal_addons=addons_sum,
+            total_price=F('subtotal_court') + addons_sum,
+            amount_pending=F('subtotal_court') + addons_sum - F('amount_paid'),
+        )
+        # El UPDATE no pasa por save(): si el nuevo total deja cubierta la seña
+        # (ej. se quitó un extra) aplicamos la misma regla de confirmación
+        if self.status == 'pending':
+            from core.reservations import promote_paid_reservations
+            promote_paid_reservations([self.pk])
+        self.refresh_from_db(fields=['subtotal_addons', 'total_price', 'amount_pending', 'status'])
+
+        # El total entra en los ingresos reservados del día
+        from core.rollups import mark_reservations_dirty
+        mark_reservations_dirty([(self.court_id, self.start_time, self.end_time)])
+
     @property
     def duration_hours(self):
         diff = self.end_time - self.start_time
@@ -184,15 +301,40 @@ class ReservationAddOn(models.Model):
     price_snapshot = models.DecimalField(max_digits=10, decimal_places=2)
     
     def save(self, *args, **kwargs):
+        from core.reservations import reserve_addon_stock, return_addon_stock
+
         if not self.price_snapshot:
             self.price_snapshot = self.addon.price
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Ítem nuevo o editado (ej. desde el admin): solo se mueve la diferencia
+            # de stock, de forma atómica (InsufficientStock revierte todo)
+            if self.reservation.status in Reservation.ACTIVE_STATUSES:
+                delta = self.stock_delta()
+                reserve_addon_stock({addon_id: qty for addon_id, qty in delta.items() if qty > 0})
+                return_addon_stock({addon_id: -qty for addon_id, qty in delta.items() if qty < 0})
+            super().save(*args, **kwargs)
+        self.update_reservation_totals()
+
+    def stock_delta(self):
+        """{addon_id: cantidad} a descontar (positiva) o devolver (negativa) al guardar este ítem."""
+        delta = {self.addon_id: self.quantity}
+        if not self._state.adding:
+            previous = (
+                ReservationAddOn.objects.select_for_update()
+                .filter(pk=self.pk).values_list('addon_id', 'quantity').first()
+            )
+            if previous:
+                delta[previous[0]] = delta.get(previous[0], 0) - previous[1]
+        return delta
+
+    def delete(self, *args, **kwargs):
+        # El stock lo devuelve el receiver pre_delete (también en borrados en cascada)
+        result = super().delete(*args, **kwargs)
         self.update_reservation_totals()
+        return result
 
     def update_reservation_totals(self):
-        total_addons = sum(item.quantity * item.price_snapshot for item in self.reservation.addon_items.all())
-        self.reservation.subtotal_addons = total_addons
-        self.reservation.save()
+        self.reservation.refresh_addon_totals()
 
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = [
@@ -204,6 +346,7 @@ class Payment(models.Model):
         ('pending', 'Pendiente revisión'),
         ('approved', 'Aprobado'),
         ('rejected', 'Rechazado'),
+        ('refund_required', 'Aprobado, a devolver'), # Cobrado por MP pero no aplicado (ej. reserva vencida y turno ocupado)
     ]
 
     reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name='payments')
@@ -219,19 +362,132 @@ class Payment(models.Model):
     approved_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
 
     def approve(self, user):
-        """Aprueba pago e impacta en la reserva."""
-        self.status = 'approved'
-        self.approved_by = user
-        self.approved_at = timezone.now()
-        self.save()
-        
-        self.reservation.amount_paid += self.amount
-        self.reservation.save()
+        """Aprueba pago e impacta en la reserva (UPDATE atómico, ver core/reservations.py)."""
+        from core.reservations import approve_payments
+        approve_payments([self.pk], user)
+        self.refresh_from_db(fields=['status', 'approved_by', 'approved_at'])
 
 # --- MODELO Refund ELIMINADO ---
 
+class CourtDayOccupancy(models.Model):
+    """
+    Índice de ocupación: un bit por cada bloque de 15 minutos del día local
+    (96 bits = 12 bytes). Bit 0 = 00:00-00:15. Un bloque está ocupado si alguna
+    reserva activa lo toca. Se mantiene desde core/occupancy.py.
+    """
+    court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='occupancy')
+    day = models.DateField()
+    mask = models.BinaryField(max_length=12, default=bytes(12))
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['court', 'day'], name='occupancy_court_day'),
+        ]
+
+class DailyRollup(models.Model):
+    """
+    Resumen diario por cancha para reportes (ver core/rollups.py).
+    'slots' detalla por franja horaria: {"Noche": {"open_minutes", "booked_minutes", "revenue"}}.
+    'dirty' marca filas a recalcular por el job 'manage.py refresh_rollups'.
+    """
+    court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='rollups')
+    day = models.DateField()
+    open_minutes = models.PositiveIntegerField(default=0)
+    booked_minutes = models.PositiveIntegerField(default=0)
+    reservations = models.PositiveIntegerField(default=0)
+    booked_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    collected_revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    slots = models.JSONField(default=dict)
+    dirty = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['court', 'day'], name='rollup_court_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'id'], condition=Q(dirty=True), name='rollup_dirty'),
+        ]
+
+# ==========================================
+# 4. COLAS DE INTEGRACIÓN (Outbox / Inbox)
+# ==========================================
+
+class PaymentOutbox(models.Model):
+    """
+    Pedido pendiente de crear la preferencia de Mercado Pago.
+    Se guarda en la misma transacción que la reserva y lo procesa un worker,
+    así la llamada HTTP a la pasarela no ocurre dentro de la transacción.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('processing', 'Procesando'),
+        ('done', 'Lista'),
+        ('failed', 'Fallida'),
+    ]
+
+    reservation = models.OneToOneField(Reservation, on_delete=models.CASCADE, related_name='payment_outbox')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+
+    preference_id = models.CharField(max_length=100, blank=True)
+    payment_url = models.URLField(max_length=500, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # El worker solo recorre filas pendientes/en proceso ordenadas por disponibilidad
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=Q(status__in=['pending', 'processing']),
+                name='paymentoutbox_claimable',
+            ),
+        ]
+
+class WebhookEvent(models.Model):
+    """
+    Notificación recibida de Mercado Pago. El webhook solo la guarda y responde 200;
+    un worker la procesa después (manage.py process_webhook_inbox).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('processing', 'Procesando'),
+        ('done', 'Procesada'),
+        ('failed', 'Fallida'),
+    ]
+
+    topic = models.CharField(max_length=50)
+    data_id = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # MP reenvía la misma notificación varias veces: solo guardamos una
+            models.UniqueConstraint(fields=['topic', 'data_id'], name='webhookevent_unique_topic_data_id'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=Q(status__in=['pending', 'processing']),
+                name='webhookevent_claimable',
+            ),
+        ]
+
 @receiver(post_save, sender=User)
 def manage_user_profile(sender, instance, created, **kwargs):
     if created:
         UserProfile.objects.create(user=instance)
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
@@ -0,0 +1,211 @@
+import datetime
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+
+from core.availability import day_bounds, daterange
+from core.models import CourtDayOccupancy, Reservation
+
+# =========================================================
+#  MAPAS DE OCUPACIÓN POR CANCHA Y DÍA
+# =========================================================
+# Un entero de 96 bits por (cancha, día local): bit i = bloque de 15 minutos i.
+# Las reservas que no caen justo en bloques marcan el bloque entero, así que
+# "libre en el mapa" implica libre de verdad; "ocupado" puede ser parcial.
+# La fuente de verdad sigue siendo Reservation (y su constraint de exclusión).
+#
+# Mantenimiento: al crear/editar/borrar/anular reservas se recalculan solo
+# los días afectados, bloqueando su fila (SELECT ... FOR UPDATE) para que dos
+# transacciones concurrentes no pisen el resultado de la otra.
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+MASK_BYTES = SLOTS_PER_DAY // 8
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+
+def to_bytes(mask):
+    return mask.to_bytes(MASK_BYTES, 'little')
+
+
+def from_bytes(data):
+    return int.from_bytes(bytes(data), 'little')
+
+
+def local_days(start_time, end_time):
+    """Días locales que toca el rango [start_time, end_time)."""
+    last = end_time - datetime.timedelta(microseconds=1)
+    return list(daterange(timezone.localtime(start_time).date(), timezone.localtime(last).date()))
+
+
+def range_mask(start_time, end_time, day):
+    """Bits de 'day' que toca [start_time, end_time). 0 si no se cruzan."""
+    day_start, day_end = day_bounds(day, day)
+    start, end = max(start_time, day_start), min(end_time, day_end)
+    if start >= end:
+        return 0
+    first = int((start - day_start).total_seconds() // (SLOT_MINUTES * 60))
+    last = -int(-(end - day_start).total_seconds() // (SLOT_MINUTES * 60))
+    return ((1 << (last - first)) - 1) << first
+
+
+def compute_masks(court_ids, first_day, last_day):
+    """Calcula desde Reservation los mapas de esas canchas y días (una consulta)."""
+    range_start, range_end = day_bounds(first_day, last_day)
+    masks = defaultdict(int)
+    reservations = Reservation.objects.filter(
+        court_id__in=court_ids,
+        start_time__lt=range_end,
+        end_time__gt=range_start,
+        status__in=Reservation.ACTIVE_STATUSES
+    ).values_list('court_id', 'start_time', 'end_time')
+    for court_id, start_time, end_time in reservations:
+        for day in local_days(start_time, end_time):
+            if first_day <= day <= last_day:
+                masks[(court_id, day)] |= range_mask(start_time, end_time, day)
+    return masks
+
+
+def refresh_court_days(pairs):
+    """Recalcula y guarda los mapas de los (court_id, day) indicados."""
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return
+    court_ids = {court_id for court_id, _ in pairs}
+    days = [day for _, day in pairs]
+
+    with transaction.atomic():
+        CourtDayOccupancy.objects.bulk_create(
+            [CourtDayOccupancy(court_id=court_id, day=day) for court_id, day in pairs],
+            ignore_conflicts=True
+        )
+        # Orden fijo de bloqueo para evitar deadlocks entre reservas de varios días
+        rows = {
+            (row.court_id, row.day): row
+            for row in CourtDayOccupancy.objects.select_for_update()
+            .filter(court_id__in=court_ids, day__in=days)
+            .order_by('court_id', 'day')
+        }
+        masks = compute_masks(court_ids, min(days), max(days))
+        now = timezone.now()
+        changed = []
+        for pair in pairs:
+            row = rows[pair]
+            data = to_bytes(masks.get(pair, 0))
+            if bytes(row.mask) != data:
+                row.mask, row.updated_at = data, now
+                changed.append(row)
+        if changed:
+            CourtDayOccupancy.objects.bulk_update(changed, ['mask', 'updated_at'])
+
+
+def reservation_days(court_id, start_time, end_time):
+    return [(court_id, day) for day in local_days(start_time, end_time)]
+
+
+def get_masks(court_ids, first_day, last_day):
+    """Mapas guardados {(court_id, day): int}. Los días sin fila están libres."""
+    rows = CourtDayOccupancy.objects.filter(
+        court_id__in=court_ids, day__gte=first_day, day__lte=last_day
+    ).values_list('court_id', 'day', 'mask')
+    return defaultdict(int, {(court_id, day): from_bytes(mask) for court_id, day, mask in rows})
+
+
+def free_courts(court_ids, start_time, end_time):
+    """Canchas de court_ids sin bloques ocupados en [start_time, end_time) (una consulta)."""
+    days = local_days(start_time, end_time)
+    masks = get_masks(court_ids, days[0], days[-1])
+    return [
+        court_id for court_id in court_ids
+        if not any(masks[(court_id, day)] & range_mask(start_time, end_time, day) for day in days)
+    ]
+
+
+def mask_intervals(mask, day):
+    """Bloques ocupados de un mapa como intervalos (inicio, fin) aware, unidos si son contiguos."""
+    day_start = day_bounds(day, day)[0]
+    slot = datetime.timedelta(minutes=SLOT_MINUTES)
+    intervals = []
+    position = 0
+    while mask:
+        # Saltamos los bloques libres y tomamos la racha de ocupados que sigue
+        free = (mask & -mask).bit_length() - 1
+        mask >>= free
+        position += free
+        busy = (~mask & (mask + 1)).bit_length() - 1
+        intervals.append((day_start + position * slot, day_start + (position + busy) * slot))
+        mask >>= busy
+        position += busy
+    return intervals
+
+
+def mask_to_hex(mask):
+    """Representación compacta para la API: 24 dígitos hex, bit 0 = 00:00."""
+    return to_bytes(mask).hex()
+
+
+# =========================================================
+#  RECONSTRUCCIÓN Y VERIFICACIÓN
+# =========================================================
+
+
+def rebuild(court_ids, first_day, last_day, chunk_days=31):
+    """Reescribe los mapas del rango desde Reservation. Devuelve cuántas filas escribió."""
+    written = 0
+    chunk_start = first_day
+    while chunk_start <= last_day:
+        chunk_end = min(last_day, chunk_start + datetime.timedelta(days=chunk_days - 1))
+        masks = compute_masks(court_ids, chunk_start, chunk_end)
+        with transaction.atomic():
+            CourtDayOccupancy.objects.filter(
+                court_id__in=court_ids, day__gte=chunk_start, day__lte=chunk_end
+            ).delete()
+            CourtDayOccupancy.objects.bulk_create([
+                CourtDayOccupancy(court_id=court_id, day=day, mask=to_bytes(mask))
+                for (court_id, day), mask in masks.items() if mask
+            ], batch_size=1000)
+        written += sum(1 for mask in masks.values() if mask)
+        chunk_start = chunk_end + datetime.timedelta(days=1)
+    return written
+
+
+def find_mismatches(court_ids, first_day, last_day):
+    """Lista de (court_id, day, guardado, esperado) que no coinciden con Reservation."""
+    expected = compute_masks(court_ids, first_day, last_day)
+    stored = get_masks(court_ids, first_day, last_day)
+    return [
+        (court_id, day, stored[(court_id, day)], expected.get((court_id, day), 0))
+        for court_id, day in sorted(set(expected) | set(stored))
+        if stored[(court_id, day)] != expected.get((court_id, day), 0)
+    ]
+
+
+def add_scope_arguments(parser):
+    """Argumentos comunes de rebuild_occupancy y check_occupancy."""
+    parser.add_argument('--from', dest='first_day', help="Primer día (YYYY-MM-DD). Por defecto, hace 30 días")
+    parser.add_argument('--to', dest='last_day', help="Último día (YYYY-MM-DD). Por defecto, dentro de 90 días")
+    parser.add_argument('--company', type=int, help="Solo las canchas de esta empresa")
+    parser.add_argument('--court', type=int, action='append', help="Solo esta cancha (repetible)")
+
+
+def resolve_scope(options):
+    """Devuelve (court_ids, first_day, last_day) a partir de las opciones del comando."""
+    from django.core.management.base import CommandError
+    from django.utils.dateparse import parse_date
+    from core.models import Court
+
+    today = timezone.localdate()
+    try:
+        first_day = parse_date(options['first_day']) if options['first_day'] else today - datetime.timedelta(days=30)
+        last_day = parse_date(options['last_day']) if options['last_day'] else today + datetime.timedelta(days=90)
+    except ValueError:
+        first_day = last_day = None
+    if not first_day or not last_day or last_day < first_day:
+        raise CommandError("Rango de fechas inválido.")
+
+    courts = Court.objects.all()
+    if options['company']:
+        courts = courts.filter(company_id=options['company'])
+    if options['court']:
+        courts = courts.filter(pk__in=options['court'])
+    return list(courts.order_by('id').values_list('id', flat=True)), first_day, last_day
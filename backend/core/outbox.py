@@ -0,0 +1,116 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.gateway import GatewayUnavailable
+from core.models import PaymentOutbox
+from core.services import create_payment_preference
+from core.workers import backoff_delay, claim_batch, run_in_pool
+
+logger = logging.getLogger('core.payments')
+
+# =========================================================
+#  OUTBOX DE PREFERENCIAS DE PAGO
+# =========================================================
+# 1. La vista crea Reservation + PaymentOutbox en la misma transacción (milisegundos).
+# 2. Al confirmar, se despacha la fila a un thread del proceso (opcional) y/o
+#    la toma el worker 'manage.py process_payment_outbox'.
+# 3. El cliente consulta GET /api/reservations/{id}/payment/ hasta tener payment_url.
+
+MAX_ATTEMPTS = 6
+LEASE_SECONDS = 60
+
+_inline_pool = None
+
+
+def _get_inline_pool():
+    global _inline_pool
+    if _inline_pool is None:
+        _inline_pool = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PAYMENT_OUTBOX_INLINE_WORKERS', 4),
+            thread_name_prefix='payment-outbox'
+        )
+    return _inline_pool
+
+
+def claimable_entries():
+    return PaymentOutbox.objects.filter(status__in=['pending', 'processing'])
+
+
+def enqueue_payment_preference(reservation):
+    """Crea la fila de outbox. Debe llamarse dentro de la transacción de la reserva."""
+    entry = PaymentOutbox.objects.create(reservation=reservation)
+    if getattr(settings, 'PAYMENT_OUTBOX_INLINE_DISPATCH', False):
+        transaction.on_commit(lambda: _get_inline_pool().submit(_process_inline, entry.id))
+    return entry
+
+
+def _process_inline(entry_id):
+    try:
+        ids = claim_batch(claimable_entries().filter(id=entry_id), 1, LEASE_SECONDS)
+        if ids:
+            process_entry(entry_id)
+    except Exception as e:
+        # El worker lo reintentará cuando venza el lease
+        logger.exception(f"Outbox: despacho inmediato falló ({entry_id}): {e}")
+    finally:
+        connection.close()
+
+
+def process_entry(entry_id):
+    """
+    Crea la preferencia para una fila ya reclamada. La llamada a la pasarela
+    ocurre fuera de cualquier transacción; solo el resultado se guarda.
+    """
+    entry = PaymentOutbox.objects.select_related('reservation__court', 'reservation__user').get(pk=entry_id)
+
+    error = None
+    try:
+        result = create_payment_preference(entry.reservation)
+        if not result or not result.get("id"):
+            error = "La pasarela no devolvió una preferencia."
+    except GatewayUnavailable as e:
+        # Circuito abierto: la reserva queda en cola sin gastar un intento
+        PaymentOutbox.objects.filter(pk=entry_id).update(
+            status='pending',
+            attempts=F('attempts') - 1,
+            available_at=timezone.now() + timedelta(seconds=e.retry_after),
+            last_error=str(e),
+            updated_at=timezone.now(),
+        )
+        return False
+    except Exception as e:
+        result = None
+        error = str(e)
+
+    if error is None:
+        PaymentOutbox.objects.filter(pk=entry_id).update(
+            status='done',
+            preference_id=result.get("id"),
+            payment_url=result.get("sandbox_init_point") or result.get("init_point") or '',
+            last_error='',
+            updated_at=timezone.now(),
+        )
+        return True
+
+    failed = entry.attempts >= MAX_ATTEMPTS
+    PaymentOutbox.objects.filter(pk=entry_id).update(
+        status='failed' if failed else 'pending',
+        available_at=timezone.now() + timedelta(seconds=backoff_delay(entry.attempts)),
+        last_error=error,
+        updated_at=timezone.now(),
+    )
+    logger.warning(f"Outbox: preferencia de reserva {entry.reservation_id} falló (intento {entry.attempts}): {error}")
+    return False
+
+
+def drain_outbox(batch_size=50, workers=4):
+    """Procesa un lote de filas disponibles. Devuelve cuántas se procesaron."""
+    ids = claim_batch(claimable_entries(), batch_size, LEASE_SECONDS)
+    if ids:
+        run_in_pool(process_entry, ids, workers)
+    return len(ids)
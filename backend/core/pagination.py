@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ReservationCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre (start_time, id): no hace COUNT(*) ni
+    OFFSET sobre toda la tabla, así la página 1000 cuesta lo mismo que la primera.
+    'id' desempata reservas que empiezan a la misma hora.
+    """
+    ordering = ('-start_time', '-id')
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,215 @@
+import threading
+from bisect import bisect_right
+from decimal import Decimal, ROUND_HALF_UP
+from django.utils import timezone
+
+from core.models import CourtTypePrice
+from core.versioning import aget_version, get_versions
+
+MINUTES_PER_DAY = 24 * 60
+CENTS = Decimal('0.01')
+
+
+def to_minutes(value):
+    """Convierte un datetime.time a minutos desde la medianoche."""
+    return value.hour * 60 + value.minute
+
+
+def slot_intervals(start_time, end_time):
+    """
+    Intervalos (en minutos del día) que cubre una franja horaria.
+    Si la franja cruza la medianoche (ej. 22:00 - 02:00) se parte en dos.
+    """
+    start = to_minutes(start_time)
+    end = to_minutes(end_time)
+    if end > start:
+        return [(start, end)]
+    intervals = [(start, MINUTES_PER_DAY)]
+    if end > 0:
+        intervals.append((0, end))
+    return intervals
+
+
+class PriceSchedule:
+    """
+    Tarifario precompilado de un (empresa, tipo de cancha).
+
+    Guarda los bordes de las franjas ordenados y el costo acumulado
+    (en precio-hora x minutos) en cada borde, así cotizar un rango es
+    una búsqueda binaria y una resta. Todo en Decimal exacto por minuto.
+    """
+
+    def __init__(self, slots):
+        # slots: lista de (nombre, precio_por_hora, [(inicio_min, fin_min), ...])
+        self.slots = slots
+
+        # Tarifa (suma de precios por hora) vigente en cada minuto del día
+        changes = {0: Decimal('0'), MINUTES_PER_DAY: Decimal('0')}
+        for _, price, intervals in slots:
+            for start, end in intervals:
+                changes[start] = changes.get(start, Decimal('0')) + price
+                changes[end] = changes.get(end, Decimal('0')) - price
+
+        self.boundaries = sorted(changes)
+        self.rates = []
+        self.cumulative = []
+        rate = Decimal('0')
+        acc = Decimal('0')
+        previous = 0
+        for boundary in self.boundaries:
+            acc += rate * (boundary - previous)
+            rate += changes[boundary]
+            self.cumulative.append(acc)
+            self.rates.append(rate)
+            previous = boundary
+        self.day_total = self.cumulative[-1]
+
+    @classmethod
+    def from_rows(cls, rows):
+        """rows: iterable de (precio, nombre_franja, hora_inicio, hora_fin)."""
+        return cls([
+            (name, price, slot_intervals(start_time, end_time))
+            for price, name, start_time, end_time in rows
+        ])
+
+    def _accumulated(self, minute):
+        days, minute_of_day = divmod(minute, MINUTES_PER_DAY)
+        i = bisect_right(self.boundaries, minute_of_day) - 1
+        return (
+            days * self.day_total
+            + self.cumulative[i]
+            + self.rates[i] * (minute_of_day - self.boundaries[i])
+        )
+
+    def price(self, start_minute, end_minute):
+        """Precio total entre dos minutos contados desde la medianoche del día de inicio."""
+        raw = (self._accumulated(end_minute) - self._accumulated(start_minute)) / 60
+        return raw.quantize(CENTS, rounding=ROUND_HALF_UP)
+
+    def breakdown(self, start_minute, end_minute):
+        """Detalle por franja (mismo formato que devolvía el cálculo original)."""
+        first_day = start_minute // MINUTES_PER_DAY
+        last_day = (end_minute - 1) // MINUTES_PER_DAY
+        detail = []
+        for name, price, intervals in self.slots:
+            minutes = 0
+            for day in range(first_day, last_day + 1):
+                offset = day * MINUTES_PER_DAY
+                for start, end in intervals:
+                    overlap = min(end_minute, offset + end) - max(start_minute, offset + start)
+                    if overlap > 0:
+                        minutes += overlap
+            if minutes:
+                hours = Decimal(minutes) / 60
+                detail.append({
+                    "slot_name": name,
+                    "price_per_hour": price,
+                    "hours": round(hours, 2),
+                    "subtotal": (price * minutes / 60).quantize(CENTS, rounding=ROUND_HALF_UP)
+                })
+        return detail
+
+
+# =========================================================
+#  CACHÉ EN PROCESO
+# =========================================================
+# (company_id, court_type_id) -> (versión, PriceSchedule)
+# Se invalida con el contador de versión 'pricing' de la empresa,
+# que se incrementa al guardar/borrar CourtTypePrice o TimeSlot.
+
+_schedules = {}
+_schedules_lock = threading.Lock()
+
+
+def get_price_schedule(company_id, court_type_id):
+    return get_price_schedules([(company_id, court_type_id)])[(company_id, court_type_id)]
+
+
+def get_price_schedules(pairs):
+    """
+    Tarifarios de varios (company_id, court_type_id): una lectura de versiones
+    y, para los que no están en caché, una sola consulta. Devuelve {par: PriceSchedule}.
+    """
+    pairs = set(pairs)
+    versions = get_versions([('pricing', company_id) for company_id, _ in pairs])
+
+    schedules, missing = {}, set()
+    for key in pairs:
+        cached = _schedules.get(key)
+        if cached and cached[0] == versions[('pricing', key[0])]:
+            schedules[key] = cached[1]
+        else:
+            missing.add(key)
+    if not missing:
+        return schedules
+
+    rows = {key: [] for key in missing}
+    for company_id, court_type_id, *row in CourtTypePrice.objects.filter(
+        company_id__in={company_id for company_id, _ in missing},
+        court_type_id__in={court_type_id for _, court_type_id in missing},
+    ).values_list('company_id', 'court_type_id', 'price', 'time_slot__name',
+                  'time_slot__start_time', 'time_slot__end_time'):
+        # El filtro es el producto cruzado: descartamos los pares que no se pidieron
+        if (company_id, court_type_id) in rows:
+            rows[(company_id, court_type_id)].append(row)
+
+    with _schedules_lock:
+        for key, key_rows in rows.items():
+            schedules[key] = PriceSchedule.from_rows(key_rows)
+            _schedules[key] = (versions[('pricing', key[0])], schedules[key])
+    return schedules
+
+
+async def aget_price_schedule(company_id, court_type_id):
+    """Versión async de get_price_schedule: mismo caché en proceso."""
+    version = await aget_version('pricing', company_id)
+    key = (company_id, court_type_id)
+
+    cached = _schedules.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    rows = CourtTypePrice.objects.filter(
+        company_id=company_id,
+        court_type_id=court_type_id
+    ).values_list('price', 'time_slot__name', 'time_slot__start_time', 'time_slot__end_time')
+    schedule = PriceSchedule.from_rows([row async for row in rows])
+
+    with _schedules_lock:
+        _schedules[key] = (version, schedule)
+    return schedule
+
+
+def clear_price_schedules():
+    with _schedules_lock:
+        _schedules.clear()
+
+
+def minute_range(start_dt, end_dt):
+    """
+    Convierte un rango de datetimes a (inicio, fin) en minutos contados desde
+    la medianoche local del día de inicio. Soporta reservas que cruzan la medianoche.
+    """
+    local_start = timezone.localtime(start_dt) if timezone.is_aware(start_dt) else start_dt
+    local_end = timezone.localtime(end_dt) if timezone.is_aware(end_dt) else end_dt
+    start_minute = to_minutes(local_start)
+    end_minute = (local_end.date() - local_start.date()).days * MINUTES_PER_DAY + to_minutes(local_end)
+    return start_minute, end_minute
+
+
+def quote_price(court, start_dt, end_dt, with_breakdown=True):
+    """Devuelve (total, breakdown) para reservar 'court' entre start_dt y end_dt."""
+    schedule = get_price_schedule(court.company_id, court.court_type_id)
+    start_minute, end_minute = minute_range(start_dt, end_dt)
+    total = schedule.price(start_minute, end_minute)
+    breakdown = schedule.breakdown(start_minute, end_minute) if with_breakdown else []
+    return total, breakdown
+
+
+async def aquote_price(court, start_dt, end_dt, with_breakdown=True):
+    """Versión async de quote_price."""
+    schedule = await aget_price_schedule(court.company_id, court.court_type_id)
+    start_minute, end_minute = minute_range(start_dt, end_dt)
+    total = schedule.price(start_minute, end_minute)
+    breakdown = schedule.breakdown(start_minute, end_minute) if with_breakdown else []
+    return total, breakdown
@@ -0,0 +1,213 @@
+import functools
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from core import metrics
+
+# =========================================================
+#  DETECTOR DE N+1 Y PRESUPUESTOS DE CONSULTAS
+# =========================================================
+# QueryRecorder es un execute_wrapper que agrupa las consultas por "forma"
+# (el SQL sin valores: mismas tablas y condiciones) y anota desde qué línea
+# del proyecto se dispararon. Una misma forma repetida QUERY_REPEAT_THRESHOLD
+# veces o más en una request es casi siempre un N+1 (un acceso a FK por fila).
+#
+# - QueryInspectorMiddleware (QUERY_INSPECTOR=True, desarrollo): loguea en
+#   'core.queries' las formas repetidas con su call site y agrega X-Query-Count.
+# - query_budget(n) (context manager o decorador de vistas/tests): falla si se
+#   superan n consultas o si hay formas repetidas. QUERY_BUDGET_MODE decide
+#   qué pasa: 'raise' (tests y DEBUG), 'log' o 'off' (producción, sin costo).
+#
+# Solo se mira la conexión 'default' del thread actual (vistas sync). Las lecturas
+# de la tabla de DatabaseCache (versiones y ETags, sin CACHE_URL) no se cuentan:
+# son del caché, no de la vista, y con Redis/Memcached ni siquiera existen.
+
+logger = logging.getLogger('core.queries')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+# Control de transacciones: no son consultas de la vista (los atomic() anidados de los tests las multiplican)
+_TRANSACTION = re.compile(r"^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN|COMMIT|ROLLBACK)\b", re.I)
+
+# Wrappers de conexión del propio proyecto: nunca son el call site
+_SKIP_FILES = {os.path.abspath(__file__), os.path.abspath(metrics.__file__)}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Se superó el presupuesto de consultas o hubo consultas repetidas (N+1)."""
+
+
+def cache_tables():
+    """Tablas de los cachés configurados con DatabaseCache, entre comillas como las arma Django."""
+    return tuple(
+        connection.ops.quote_name(config['LOCATION'])
+        for config in settings.CACHES.values()
+        if config['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache'
+    )
+
+
+def query_shape(sql):
+    """SQL sin valores: 'WHERE id = 3' y 'WHERE id = 7' tienen la misma forma."""
+    shape = _STRING.sub('?', sql).replace('%s', '?')
+    shape = _NUMBER.sub('?', shape)
+    shape = _IN_LIST.sub('(?...)', shape)
+    return ' '.join(shape.split())
+
+
+def call_site():
+    """'archivo:línea en función' del primer frame del proyecto (fuera de Django y librerías)."""
+    root = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and filename not in _SKIP_FILES and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'desconocido'
+
+
+class QueryRecorder:
+    """execute_wrapper que cuenta consultas por forma y por call site."""
+
+    def __init__(self, capture_sites=True):
+        self.capture_sites = capture_sites
+        self.count = 0
+        self.shapes = Counter()
+        self.sites = defaultdict(Counter)
+        self.ignored_tables = cache_tables()
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _TRANSACTION.match(sql) and not any(table in sql for table in self.ignored_tables):
+            shape = query_shape(sql)
+            self.count += 1
+            self.shapes[shape] += 1
+            if self.capture_sites:
+                self.sites[shape][call_site()] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold=None):
+        """[(forma, veces, [(call site, veces)])] de las formas que se repiten threshold veces o más."""
+        threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+        return [
+            (shape, count, self.sites[shape].most_common(3))
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def report(self, repeated):
+        lines = []
+        for shape, count, sites in repeated:
+            lines.append(f"  {count}x {shape[:300]}")
+            lines.extend(f"      {times}x desde {site}" for site, times in sites)
+        return '\n'.join(lines)
+
+
+# =========================================================
+#  MIDDLEWARE DE DESARROLLO
+# =========================================================
+
+class QueryInspectorMiddleware:
+    """Reporta consultas repetidas por request. Se desactiva solo si QUERY_INSPECTOR=False."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_INSPECTOR', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        repeated = recorder.repeated()
+        if repeated:
+            message = (
+                f"Posible N+1 en {request.method} {request.path} "
+                f"({recorder.count} consultas):\n{recorder.report(repeated)}"
+            )
+            if getattr(settings, 'QUERY_INSPECTOR_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        response['X-Query-Count'] = str(recorder.count)
+        return response
+
+
+# =========================================================
+#  PRESUPUESTOS
+# =========================================================
+
+class query_budget:
+    """
+    Máximo de consultas (sin contar savepoints) para un bloque o una vista.
+
+        with query_budget(3):
+            client.get(...)
+
+        @action(detail=True, methods=['get'])
+        @query_budget(4)
+        def availability(self, request, pk=None): ...
+
+    repeat_threshold: cuántas veces puede repetirse una forma antes de contarse
+    como N+1 (por defecto QUERY_REPEAT_THRESHOLD; 0 desactiva la detección).
+    """
+
+    def __init__(self, max_queries, repeat_threshold=None, label=None):
+        self.max_queries = max_queries
+        self.repeat_threshold = repeat_threshold
+        self.label = label
+        self.recorder = None
+        self._wrapper = None
+
+    def __call__(self, func):
+        label = self.label or func.__qualname__
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            # Una instancia por llamada: la vista decorada puede correr en varios threads
+            with query_budget(self.max_queries, self.repeat_threshold, label):
+                return func(*args, **kwargs)
+        return inner
+
+    def __enter__(self):
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+        self.recorder = QueryRecorder(capture_sites=mode != 'off')
+        if mode == 'off':
+            return self.recorder
+        self._wrapper = connection.execute_wrapper(self.recorder)
+        self._wrapper.__enter__()
+        return self.recorder
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._wrapper is None:
+            return False
+        self._wrapper.__exit__(exc_type, exc, tb)
+        self._wrapper = None
+        if exc_type is not None:
+            return False
+
+        problems = []
+        if self.recorder.count > self.max_queries:
+            problems.append(f"{self.recorder.count} consultas (presupuesto: {self.max_queries})")
+        repeated = self.recorder.repeated(self.repeat_threshold) if self.repeat_threshold != 0 else []
+        if repeated:
+            problems.append("consultas repetidas (posible N+1)")
+        if not problems:
+            return False
+
+        message = f"{self.label or 'query_budget'}: {', '.join(problems)}"
+        details = self.recorder.report(repeated or [
+            (shape, count, self.recorder.sites[shape].most_common(3))
+            for shape, count in self.recorder.shapes.most_common()
+        ])
+        if getattr(settings, 'QUERY_BUDGET_MODE', 'off') == 'raise':
+            raise QueryBudgetExceeded(f"{message}\n{details}")
+        logger.warning(f"{message}\n{details}")
+        return False
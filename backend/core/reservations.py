@@ -0,0 +1,275 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from core.models import AddOn, Payment, Reservation, ReservationAddOn
+from core.events import publish_reservation_event
+from core.occupancy import refresh_court_days, reservation_days
+from core.rollups import mark_dirty, mark_payments_dirty
+from core.signals import bump_reservation_versions
+
+# =========================================================
+#  OPERACIONES SOBRE RESERVAS
+# =========================================================
+
+
+class InsufficientStock(ValidationError):
+    """No hay stock suficiente de uno o más extras."""
+
+    def __init__(self, addon_ids):
+        super().__init__(f"Stock insuficiente para los extras: {sorted(addon_ids)}")
+        self.addon_ids = addon_ids
+
+
+def _quantity_case(quantities):
+    return Case(
+        *[When(pk=addon_id, then=Value(quantity)) for addon_id, quantity in quantities.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def reserve_addon_stock(quantities):
+    """
+    Descuenta stock de varios extras con un solo UPDATE condicional:
+        UPDATE addon SET stock = stock - n WHERE id = X AND stock >= n (por cada extra)
+    Si algún extra no alcanza, lanza InsufficientStock; debe llamarse dentro
+    de una transacción para que se revierta lo ya descontado.
+    quantities: {addon_id: cantidad}
+    """
+    quantities = {addon_id: qty for addon_id, qty in quantities.items() if qty > 0}
+    if not quantities:
+        return
+
+    enough_stock = Q()
+    for addon_id, quantity in quantities.items():
+        enough_stock |= Q(pk=addon_id, stock_quantity__gte=quantity)
+
+    updated = AddOn.objects.filter(enough_stock).update(
+        stock_quantity=F('stock_quantity') - _quantity_case(quantities)
+    )
+    if updated != len(quantities):
+        short = [
+            addon_id for addon_id, stock in
+            AddOn.objects.filter(pk__in=quantities).values_list('id', 'stock_quantity')
+            if stock < quantities[addon_id]
+        ]
+        raise InsufficientStock(short or list(quantities))
+
+
+def return_addon_stock(quantities):
+    """Devuelve cantidades al stock de varios extras con un solo UPDATE. quantities: {addon_id: cantidad}"""
+    quantities = {addon_id: qty for addon_id, qty in quantities.items() if qty > 0}
+    if quantities:
+        AddOn.objects.filter(pk__in=quantities).update(
+            stock_quantity=F('stock_quantity') + _quantity_case(quantities)
+        )
+
+
+def release_addon_stock(reservation_ids):
+    """Devuelve al stock los extras de reservas anuladas o vencidas (un solo UPDATE)."""
+    return_addon_stock(dict(
+        ReservationAddOn.objects.filter(reservation_id__in=reservation_ids)
+        .values('addon_id')
+        .annotate(total=Sum('quantity'))
+        .values_list('addon_id', 'total')
+    ))
+
+
+def attach_addons(reservation, items):
+    """
+    Agrega varios extras a una reserva en bloque y descuenta su stock.
+    items: lista de (addon_id, cantidad).
+
+    Son 5 consultas sin importar cuántos extras: bloqueo de la reserva, lectura
+    de los AddOn, descuento de stock, un bulk_create y un UPDATE con el SUM de
+    los totales (más la regla de confirmación si la reserva sigue pendiente).
+    Solo reservas activas: el stock de una anulada o vencida no vuelve nunca.
+    """
+    if not items:
+        return []
+
+    quantities = defaultdict(int)
+    for addon_id, quantity in items:
+        quantities[addon_id] += quantity
+
+    with transaction.atomic():
+        # Bloqueamos la fila: una anulación concurrente espera a que terminemos
+        current = (
+            Reservation.objects.select_for_update()
+            .filter(pk=reservation.pk).values_list('status', flat=True).first()
+        )
+        if current not in Reservation.ACTIVE_STATUSES:
+            raise ValidationError(f"No se pueden agregar extras a una reserva en estado '{current}'.")
+
+        addons = AddOn.objects.filter(
+            pk__in=quantities,
+            company__courts=reservation.court_id,
+            is_active=True
+        ).in_bulk()
+
+        missing = set(quantities) - set(addons)
+        if missing:
+            raise ValidationError(
+                f"Extras inexistentes o no disponibles para esta cancha: {sorted(missing)}"
+            )
+
+        reserve_addon_stock(quantities)
+
+        created = ReservationAddOn.objects.bulk_create([
+            ReservationAddOn(
+                reservation=reservation,
+                addon_id=addon_id,
+                quantity=quantity,
+                price_snapshot=addons[addon_id].price,
+            )
+            for addon_id, quantity in items
+        ])
+        reservation.refresh_addon_totals()
+    return created
+
+
+def void_reservations(reservation_ids, status='voided', from_statuses=('pending', 'confirmed')):
+    """
+    Pasa reservas activas a 'voided' (o 'expired') y libera el stock de sus extras.
+    Solo cambia las que siguen en from_statuses, así el stock nunca se libera dos veces.
+    Devuelve los IDs que cambiaron.
+    """
+    with transaction.atomic():
+        rows = list(
+            Reservation.objects.select_for_update()
+            .filter(pk__in=reservation_ids, status__in=from_statuses)
+            .values_list('id', 'court_id', 'court__company_id', 'start_time', 'end_time')
+        )
+        ids = [row[0] for row in rows]
+        if ids:
+            Reservation.objects.filter(pk__in=ids).update(status=status)
+            release_addon_stock(ids)
+            # update() no dispara signals: mapas de ocupación, ETags y eventos a mano
+            pairs = [
+                pair for _, court_id, _, start_time, end_time in rows
+                for pair in reservation_days(court_id, start_time, end_time)
+            ]
+            refresh_court_days(pairs)
+            mark_dirty(pairs)
+            for court_id, company_id in {(row[1], row[2]) for row in rows}:
+                bump_reservation_versions(court_id, company_id)
+            for reservation_id, court_id, company_id, start_time, end_time in rows:
+                publish_reservation_event(status, reservation_id, court_id, company_id, start_time, end_time, status)
+    return ids
+
+
+def reactivate_expired(reservation):
+    """
+    Llegó un pago aprobado para una reserva que ya venció por falta de pago.
+    Si el turno sigue libre y alcanza el stock de sus extras, la reserva vuelve
+    a 'pending' (el pago la confirma después) y devuelve True. Si no, la deja
+    vencida y devuelve False: el pago hay que devolverlo.
+    reservation debe venir bloqueada (select_for_update).
+    """
+    taken = Reservation.objects.filter(
+        court_id=reservation.court_id,
+        status__in=Reservation.ACTIVE_STATUSES,
+        start_time__lt=reservation.end_time,
+        end_time__gt=reservation.start_time,
+    ).exclude(pk=reservation.pk).exists()
+    if taken:
+        return False
+
+    quantities = dict(
+        reservation.addon_items.values('addon_id').annotate(total=Sum('quantity')).values_list('addon_id', 'total')
+    )
+    try:
+        with transaction.atomic():
+            reserve_addon_stock(quantities)
+            reservation.status = 'pending'
+            # save() dispara los signals: ocupación, resúmenes, ETags y evento
+            reservation.save(update_fields=['status'])
+    except (InsufficientStock, IntegrityError):
+        # IntegrityError: otra reserva tomó el turno en paralelo (constraint de solapamiento)
+        reservation.status = 'expired'
+        return False
+    return True
+
+
+# =========================================================
+#  PAGOS
+# =========================================================
+
+
+def apply_payment_amounts(amounts_by_reservation):
+    """
+    Suma montos pagados a varias reservas con un solo UPDATE atómico
+    (amount_paid = amount_paid + X), sin leer y guardar desde Python,
+    así dos aprobaciones concurrentes no se pisan. Luego promueve a
+    'confirmed' en SQL las que ya cubren la seña.
+    """
+    if not amounts_by_reservation:
+        return
+    delta = Case(
+        *[When(pk=reservation_id, then=Value(amount)) for reservation_id, amount in amounts_by_reservation.items()],
+        default=Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    ids = list(amounts_by_reservation)
+    Reservation.objects.filter(pk__in=ids).update(
+        amount_paid=F('amount_paid') + delta,
+        amount_pending=F('total_price') - F('amount_paid') - delta,
+    )
+    mark_payments_dirty(ids)
+    promote_paid_reservations(ids)
+
+
+def promote_paid_reservations(reservation_ids):
+    """
+    Misma regla que Reservation.save(): pendiente -> confirmada si cubre la seña.
+    Se llama después del UPDATE de montos, con las filas ya bloqueadas.
+    """
+    rows = list(
+        Reservation.objects.filter(
+            pk__in=reservation_ids,
+            status='pending',
+            total_price__gt=0,
+            amount_paid__gte=F('total_price') * F('court__company__advance_payment_percentage') / 100,
+        ).values_list('id', 'court_id', 'court__company_id', 'start_time', 'end_time')
+    )
+    if not rows:
+        return 0
+    Reservation.objects.filter(pk__in=[row[0] for row in rows]).update(status='confirmed')
+    # La grilla muestra el estado de cada turno
+    for court_id, company_id in {(row[1], row[2]) for row in rows}:
+        bump_reservation_versions(court_id, company_id)
+    for reservation_id, court_id, company_id, start_time, end_time in rows:
+        publish_reservation_event('confirmed', reservation_id, court_id, company_id, start_time, end_time, 'confirmed')
+    return len(rows)
+
+
+def approve_payments(payment_ids, user):
+    """
+    Aprueba varios pagos en una transacción y actualiza los saldos de las
+    reservas agrupados por reserva. Solo se aprueban los pendientes: los ya
+    aprobados, rechazados o marcados para devolver se ignoran.
+    Devuelve la cantidad de pagos aprobados.
+    """
+    with transaction.atomic():
+        # Bloqueamos los pagos: si otro admin/webhook aprueba los mismos, espera y luego los ignora
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(pk__in=payment_ids, status='pending')
+            .values_list('id', 'reservation_id', 'amount')
+        )
+        if not payments:
+            return 0
+
+        Payment.objects.filter(pk__in=[payment_id for payment_id, _, _ in payments]).update(
+            status='approved', approved_by=user, approved_at=timezone.now()
+        )
+
+        amounts = defaultdict(Decimal)
+        for _, reservation_id, amount in payments:
+            amounts[reservation_id] += amount
+        apply_payment_amounts(amounts)
+    return len(payments)
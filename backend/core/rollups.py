@@ -0,0 +1,277 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+
+from core.availability import day_bounds, daterange
+from core.models import BusinessHour, Court, DailyRollup, Payment, Reservation
+from core.occupancy import local_days
+from core.pricing import CENTS, MINUTES_PER_DAY, get_price_schedule, to_minutes
+
+# =========================================================
+#  RESÚMENES DIARIOS (OCUPACIÓN E INGRESOS)
+# =========================================================
+# Una fila por (cancha, día local) con minutos abiertos/ocupados, cantidad de
+# reservas, ingresos reservados (total_price de las reservas que empiezan ese
+# día) y cobrados (pagos aprobados ese día), más el detalle por franja.
+#
+# Las escrituras solo marcan la fila como 'dirty' (un UPSERT dentro de su
+# transacción); 'manage.py refresh_rollups' recalcula las marcadas en lotes
+# y permite backfill de rangos históricos. Los reportes leen solo esta tabla.
+
+DEFAULT_BATCH_SIZE = 200
+# Si los días marcados de un lote abarcan menos que esto, se calculan juntos
+MAX_SHARED_RANGE_DAYS = 31
+
+
+def mark_dirty(pairs):
+    """Marca (court_id, day) para recalcular. Un solo INSERT ... ON CONFLICT."""
+    pairs = sorted(set(pairs))
+    if not pairs:
+        return
+    DailyRollup.objects.bulk_create(
+        [DailyRollup(court_id=court_id, day=day, dirty=True) for court_id, day in pairs],
+        update_conflicts=True,
+        unique_fields=['court', 'day'],
+        update_fields=['dirty'],
+    )
+
+
+def mark_reservations_dirty(rows):
+    """rows: iterable de (court_id, start_time, end_time)."""
+    mark_dirty(
+        (court_id, day)
+        for court_id, start_time, end_time in rows
+        for day in local_days(start_time, end_time)
+    )
+
+
+def mark_payments_dirty(reservation_ids):
+    """Los pagos cuentan el día en que se aprueban (hoy) en la cancha de la reserva."""
+    today = timezone.localdate()
+    court_ids = Reservation.objects.filter(pk__in=reservation_ids).values_list('court_id', flat=True).distinct()
+    mark_dirty((court_id, today) for court_id in court_ids)
+
+
+def _open_intervals(business_hour, previous_day_hour):
+    """
+    Minutos del día en que la empresa atiende: lo que sigue abierto del horario
+    del día anterior si cruzó la medianoche (18:00 - 02:00 abre 00:00 - 02:00)
+    más el horario del día hasta su cierre o la medianoche.
+    """
+    intervals = []
+    if previous_day_hour is not None:
+        close = to_minutes(previous_day_hour.close_time)
+        if 0 < close <= to_minutes(previous_day_hour.open_time):
+            intervals.append((0, close))
+    if business_hour is not None:
+        start = to_minutes(business_hour.open_time)
+        end = to_minutes(business_hour.close_time)
+        # Cierre a medianoche o después: el resto se cuenta en el día siguiente
+        intervals.append((start, end if end > start else MINUTES_PER_DAY))
+    return intervals
+
+
+def _overlap(a, b):
+    return max(0, min(a[1], b[1]) - max(a[0], b[0]))
+
+
+def compute_rollups(court_ids, first_day, last_day):
+    """
+    Calcula los resúmenes de esas canchas entre first_day y last_day.
+    Consultas: canchas, horarios, reservas y pagos (más el tarifario si no está en caché).
+    Devuelve {(court_id, day): dict de campos}.
+    """
+    courts = list(Court.objects.filter(pk__in=court_ids).only('id', 'company_id', 'court_type_id'))
+    hours = {
+        (bh.company_id, bh.weekday): bh
+        for bh in BusinessHour.objects.filter(company_id__in={court.company_id for court in courts})
+    }
+    range_start, range_end = day_bounds(first_day, last_day)
+
+    by_court = defaultdict(list)
+    reservations = Reservation.objects.filter(
+        court_id__in=court_ids,
+        start_time__lt=range_end,
+        end_time__gt=range_start,
+        status__in=Reservation.ACTIVE_STATUSES
+    ).values_list('court_id', 'start_time', 'end_time', 'total_price')
+    for court_id, start_time, end_time, total_price in reservations:
+        by_court[court_id].append((start_time, end_time, total_price))
+
+    collected = defaultdict(Decimal)
+    payments = Payment.objects.filter(
+        reservation__court_id__in=court_ids,
+        status='approved',
+        approved_at__gte=range_start,
+        approved_at__lt=range_end,
+    ).values_list('reservation__court_id', 'approved_at', 'amount')
+    for court_id, approved_at, amount in payments:
+        collected[(court_id, timezone.localtime(approved_at).date())] += amount
+
+    result = {}
+    for court in courts:
+        schedule = get_price_schedule(court.company_id, court.court_type_id)
+        for day in daterange(first_day, last_day):
+            day_start, day_end = day_bounds(day, day)
+            opening = _open_intervals(
+                hours.get((court.company_id, day.weekday())),
+                hours.get((court.company_id, (day.weekday() - 1) % 7)),
+            )
+            slots = {
+                name: {
+                    "open_minutes": sum(_overlap(span, interval) for span in opening for interval in intervals),
+                    "booked_minutes": 0,
+                    "revenue": Decimal('0'),
+                }
+                for name, _, intervals in schedule.slots
+            }
+            booked_minutes = 0
+            count = 0
+            booked_revenue = Decimal('0')
+            for start_time, end_time, total_price in by_court[court.id]:
+                start, end = max(start_time, day_start), min(end_time, day_end)
+                if start >= end:
+                    continue
+                if day_start <= start_time < day_end:
+                    count += 1
+                    booked_revenue += total_price
+                span = (
+                    int((start - day_start).total_seconds() // 60),
+                    int((end - day_start).total_seconds() // 60),
+                )
+                booked_minutes += span[1] - span[0]
+                for name, price, intervals in schedule.slots:
+                    minutes = sum(_overlap(span, interval) for interval in intervals)
+                    slots[name]["booked_minutes"] += minutes
+                    slots[name]["revenue"] += price * minutes / 60
+
+            result[(court.id, day)] = {
+                "open_minutes": sum(end - start for start, end in opening),
+                "booked_minutes": booked_minutes,
+                "reservations": count,
+                "booked_revenue": booked_revenue,
+                "collected_revenue": collected.get((court.id, day), Decimal('0')),
+                "slots": {
+                    name: {**values, "revenue": str(values["revenue"].quantize(CENTS))}
+                    for name, values in slots.items()
+                },
+            }
+    return result
+
+
+def _save(computed):
+    now = timezone.now()
+    DailyRollup.objects.bulk_create(
+        [
+            DailyRollup(court_id=court_id, day=day, dirty=False, updated_at=now, **values)
+            for (court_id, day), values in computed.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['court', 'day'],
+        update_fields=['open_minutes', 'booked_minutes', 'reservations', 'booked_revenue',
+                       'collected_revenue', 'slots', 'dirty', 'updated_at'],
+        batch_size=500,
+    )
+
+
+def refresh_dirty(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Recalcula un lote de filas marcadas. Las filas quedan bloqueadas hasta
+    guardar: una escritura concurrente que las vuelva a marcar espera y la
+    marca queda para el lote siguiente. Devuelve cuántas filas se recalcularon.
+    """
+    with transaction.atomic():
+        rows = list(
+            DailyRollup.objects.filter(dirty=True)
+            .select_for_update(skip_locked=True)
+            .order_by('day', 'id')
+            .values_list('court_id', 'day')[:batch_size]
+        )
+        if not rows:
+            return 0
+        first_day = min(day for _, day in rows)
+        last_day = max(day for _, day in rows)
+        if (last_day - first_day).days < MAX_SHARED_RANGE_DAYS:
+            # Caso común (días recientes): un solo cálculo para todas las canchas del lote
+            groups = [([court_id for court_id, _ in rows], first_day, last_day)]
+        else:
+            by_court = defaultdict(list)
+            for court_id, day in rows:
+                by_court[court_id].append(day)
+            groups = [([court_id], min(days), max(days)) for court_id, days in by_court.items()]
+
+        computed = {}
+        for court_ids, group_first, group_last in groups:
+            computed.update(compute_rollups(set(court_ids), group_first, group_last))
+        _save({pair: computed[pair] for pair in rows})
+    return len(rows)
+
+
+def backfill(court_ids, first_day, last_day, chunk_days=31):
+    """Calcula (o recalcula) todo el rango por tramos. Devuelve cuántas filas escribió."""
+    written = 0
+    chunk_start = first_day
+    while chunk_start <= last_day:
+        chunk_end = min(last_day, chunk_start + datetime.timedelta(days=chunk_days - 1))
+        with transaction.atomic():
+            computed = compute_rollups(court_ids, chunk_start, chunk_end)
+            _save(computed)
+        written += len(computed)
+        chunk_start = chunk_end + datetime.timedelta(days=1)
+    return written
+
+
+# =========================================================
+#  REPORTE
+# =========================================================
+
+
+def _percentage(booked, available):
+    return round(min(100.0, booked * 100 / available), 1) if available else None
+
+
+def build_report(company_id, first_day, last_day):
+    """Arma el reporte de la empresa leyendo solo DailyRollup (una consulta)."""
+    rows = DailyRollup.objects.filter(
+        court__company_id=company_id, day__gte=first_day, day__lte=last_day
+    ).select_related('court').order_by('day', 'court_id')
+
+    days = defaultdict(lambda: defaultdict(Decimal))
+    courts = {}
+    slots = defaultdict(lambda: defaultdict(Decimal))
+    pending = 0
+    for row in rows:
+        pending += row.dirty
+        court = courts.setdefault(row.court_id, {
+            "court_id": row.court_id, "name": row.court.name,
+            "open_minutes": 0, "booked_minutes": 0, "reservations": 0,
+            "booked_revenue": Decimal('0'), "collected_revenue": Decimal('0'),
+        })
+        for target in (court, days[row.day]):
+            target["open_minutes"] += row.open_minutes
+            target["booked_minutes"] += row.booked_minutes
+            target["reservations"] += row.reservations
+            target["booked_revenue"] += row.booked_revenue
+            target["collected_revenue"] += row.collected_revenue
+        for name, values in row.slots.items():
+            slots[name]["open_minutes"] += values["open_minutes"]
+            slots[name]["booked_minutes"] += values["booked_minutes"]
+            slots[name]["revenue"] += Decimal(values["revenue"])
+
+    def finish(values):
+        values = dict(values)
+        values["occupancy_pct"] = _percentage(values["booked_minutes"], values["open_minutes"])
+        return values
+
+    return {
+        "company_id": company_id,
+        "from": first_day.isoformat(),
+        "to": last_day.isoformat(),
+        # Filas marcadas que el job todavía no recalculó
+        "pending_refresh": pending,
+        "by_day": [{"day": day.isoformat(), **finish(values)} for day, values in sorted(days.items())],
+        "by_court": [finish(values) for _, values in sorted(courts.items())],
+        "by_time_slot": [{"time_slot": name, **finish(values)} for name, values in sorted(slots.items())],
+    }
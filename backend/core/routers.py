@@ -1,6 +1,6 @@
 # backend/core/routers.py
 from rest_framework.routers import DefaultRouter
-from core.views import CompanyViewSet, CourtViewSet, ReservationViewSet
+from core.views import CompanyViewSet, CourtViewSet, ReservationViewSet, PaymentViewSet
 
 # Creamos el router principal
 router = DefaultRouter()
@@ -11,9 +11,7 @@ router = DefaultRouter()
 router.register(r'companies', CompanyViewSet, basename='company')
 router.register(r'courts', CourtViewSet, basename='court')
 router.register(r'reservations', ReservationViewSet, basename='reservation')
-# A futuro agregarás aquí:
-# router.register(r'reservations', ReservationViewSet)
-# router.register(r'payments', PaymentViewSet)
+router.register(r'payments', PaymentViewSet, basename='payment')
 
 # OJO: No necesitamos exportar nada explícitamente, 
 # la variable 'router' ya es accesible al importar este archivo.
\ No newline at end of file
@@ -0,0 +1,166 @@
+import datetime
+import heapq
+from collections import defaultdict
+from itertools import islice
+from django.utils import timezone
+
+from core.availability import daterange
+from core.models import BusinessHour, Court
+from core.occupancy import get_masks, mask_intervals
+from core.pricing import get_price_schedules, minute_range
+
+# =========================================================
+#  BÚSQUEDA DEL PRÓXIMO TURNO LIBRE
+# =========================================================
+# Siempre 3 consultas (canchas, horarios de atención y mapas de ocupación del
+# rango) más una para los tarifarios que no estén en caché, sin importar cuántas
+# canchas, tipos o días entren en la ventana. Los mapas
+# (core/occupancy.py) son una fila por cancha y día, no una por reserva, y
+# "libre en el mapa" implica libre de verdad. El resto es aritmética de
+# intervalos en memoria:
+#   libre = (horario de atención ∩ ventana) - bloques ocupados
+# Cada cancha genera sus turnos en orden y heapq.merge toma los primeros N
+# de todas, así no se calculan turnos que no se van a devolver.
+
+MAX_SEARCH_DAYS = 14
+MAX_SEARCH_RESULTS = 50
+DEFAULT_STEP_MINUTES = 30
+
+
+def merge_intervals(intervals):
+    """Une intervalos (inicio, fin) solapados o contiguos. Devuelve la lista ordenada."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(intervals, busy):
+    """Resta de 'intervals' los intervalos 'busy'. Ambos ordenados y sin solapes."""
+    free = []
+    i = 0
+    for start, end in intervals:
+        while i < len(busy) and busy[i][1] <= start:
+            i += 1
+        cursor = start
+        j = i
+        while j < len(busy) and busy[j][0] < end:
+            if busy[j][0] > cursor:
+                free.append((cursor, busy[j][0]))
+            cursor = max(cursor, busy[j][1])
+            j += 1
+        if cursor < end:
+            free.append((cursor, end))
+    return free
+
+
+def opening_intervals(hours_by_weekday, window_start, window_end):
+    """Horario de atención (datetimes aware) recortado a la ventana de búsqueda."""
+    tz = timezone.get_current_timezone()
+    intervals = []
+    # Empezamos un día antes por si el horario del día anterior cruza la medianoche
+    first_day = timezone.localtime(window_start).date() - datetime.timedelta(days=1)
+    for day in daterange(first_day, timezone.localtime(window_end).date()):
+        hours = hours_by_weekday.get(day.weekday())
+        if hours is None:
+            continue
+        opens = timezone.make_aware(datetime.datetime.combine(day, hours.open_time), tz)
+        closes = timezone.make_aware(datetime.datetime.combine(day, hours.close_time), tz)
+        if hours.close_time <= hours.open_time:
+            closes += datetime.timedelta(days=1)
+        start, end = max(opens, window_start), min(closes, window_end)
+        if start < end:
+            intervals.append((start, end))
+    return merge_intervals(intervals)
+
+
+def align_up(moment, step_minutes):
+    """Redondea hacia arriba al múltiplo de step_minutes desde la medianoche local."""
+    local = timezone.localtime(moment)
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed = (local - midnight).total_seconds()
+    step = step_minutes * 60
+    return midnight + datetime.timedelta(seconds=-(-elapsed // step) * step)
+
+
+def court_slots(court, free_intervals, duration, step_minutes):
+    """Genera (inicio, court_id, cancha) de los turnos libres de una cancha, en orden."""
+    step = datetime.timedelta(minutes=step_minutes)
+    for free_start, free_end in free_intervals:
+        start = align_up(free_start, step_minutes)
+        while start + duration <= free_end:
+            yield start, court.id, court
+            start += step
+
+
+def find_free_slots(duration_minutes, window_start, window_end, court_type=None, company_ids=None,
+                    limit=10, step_minutes=DEFAULT_STEP_MINUTES):
+    """
+    Primeros 'limit' turnos libres de duration_minutes entre window_start y window_end.
+    court_type filtra por nombre (sin distinguir mayúsculas), company_ids por empresas.
+    Devuelve dicts con cancha, empresa, inicio, fin y precio (mismo cálculo que /quote/).
+    """
+    duration = datetime.timedelta(minutes=duration_minutes)
+    window_start = max(window_start, timezone.now())
+    if window_start >= window_end:
+        return []
+
+    courts = Court.objects.filter(is_active=True).select_related('court_type', 'company').order_by('id')
+    if court_type:
+        courts = courts.filter(court_type__name__iexact=court_type)
+    if company_ids is not None:
+        courts = courts.filter(company_id__in=company_ids)
+    courts = list(courts)
+    if not courts:
+        return []
+    company_ids = {court.company_id for court in courts}
+
+    hours = defaultdict(dict)
+    for business_hour in BusinessHour.objects.filter(company_id__in=company_ids):
+        hours[business_hour.company_id][business_hour.weekday] = business_hour
+
+    busy = defaultdict(list)
+    masks = get_masks(
+        [court.id for court in courts],
+        timezone.localtime(window_start).date(),
+        timezone.localtime(window_end - datetime.timedelta(microseconds=1)).date(),
+    )
+    for (court_id, day), mask in masks.items():
+        busy[court_id].extend(mask_intervals(mask, day))
+
+    opening = {
+        company_id: opening_intervals(hours[company_id], window_start, window_end)
+        for company_id in company_ids
+    }
+    generators = [
+        court_slots(
+            court,
+            subtract_intervals(opening[court.company_id], merge_intervals(busy[court.id])),
+            duration, step_minutes
+        )
+        for court in courts
+    ]
+
+    slots = list(islice(heapq.merge(*generators), limit))
+    # Todos los tarifarios de una vez (no uno por empresa y tipo de cancha)
+    schedules = get_price_schedules({(court.company_id, court.court_type_id) for _, _, court in slots})
+
+    results = []
+    for start, _, court in slots:
+        end = start + duration
+        price = schedules[(court.company_id, court.court_type_id)].price(*minute_range(start, end))
+        results.append({
+            "court_id": court.id,
+            "court_name": court.name,
+            "court_type": court.court_type.name,
+            "company_id": court.company_id,
+            "company_name": court.company.name,
+            "start": timezone.localtime(start).isoformat(),
+            "end": timezone.localtime(end).isoformat(),
+            "price": price,
+        })
+    return results
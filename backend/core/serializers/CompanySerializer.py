@@ -4,4 +4,11 @@ from core.models import Company
 class CompanySerializer(serializers.ModelSerializer):
     class Meta:
         model = Company
-        fields = ['id', 'name', 'address', 'latitude', 'longitude']
\ No newline at end of file
+        fields = ['id', 'name', 'address', 'latitude', 'longitude']
+
+
+class NearbyCompanySerializer(CompanySerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(CompanySerializer.Meta):
+        fields = CompanySerializer.Meta.fields + ['distance_km']
@@ -19,9 +19,15 @@ class CourtTypeSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'prices']
 
     def get_prices(self, obj):
-        # Nota: Aquí usamos obj.court_type_prices si configuraste related_name
-        # o el filtro directo como hicimos antes:
-        prices = CourtTypePrice.objects.filter(court_type=obj, company=obj.company)
+        # Si la vista hizo prefetch (core.catalog.court_queryset / court_type_queryset) no se consulta la BD
+        prices = getattr(obj, 'prefetched_prices', None)
+        if prices is not None:
+            prices = [p for p in prices if p.company_id == obj.company_id]
+        else:
+            # Sin prefetch: una consulta por tipo (N+1 en listas, lo reporta core/query_checks.py)
+            prices = CourtTypePrice.objects.filter(
+                court_type=obj, company_id=obj.company_id
+            ).select_related('time_slot')
         return CourtTypePriceSerializer(prices, many=True).data
 
 class CourtSerializer(serializers.ModelSerializer):
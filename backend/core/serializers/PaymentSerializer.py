@@ -0,0 +1,11 @@
+from rest_framework import serializers
+from core.models import Payment
+
+class PaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ['id', 'reservation', 'amount', 'payment_method', 'status', 'transaction_id', 'created_at', 'approved_at']
+
+class ApprovePaymentsSerializer(serializers.Serializer):
+    """IDs de pagos a aprobar en bloque: {"ids": [1, 2, 3]}"""
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.utils import timezone
 from core.models import Reservation, Court
 
 class ReservationSerializer(serializers.ModelSerializer):
@@ -19,4 +20,41 @@ class QuoteSerializer(serializers.Serializer):
     def validate(self, data):
         if data['start_time'] >= data['end_time']:
             raise serializers.ValidationError("La hora de inicio debe ser anterior a la de fin.")
-        return data
\ No newline at end of file
+        return data
+
+class AddOnItemSerializer(serializers.Serializer):
+    addon = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class AttachAddOnsSerializer(serializers.Serializer):
+    """Lista de extras a agregar en bloque: {"items": [{"addon": 1, "quantity": 2}, ...]}"""
+    items = AddOnItemSerializer(many=True, allow_empty=False)
+
+
+class SeriesBookingSerializer(serializers.Serializer):
+    """
+    Reserva recurrente: la primera fecha (start_time/end_time) se repite cada
+    interval_weeks semanas, 'count' veces o hasta 'until' (inclusive).
+    Con skip_conflicts se crean las fechas libres y se informan las ocupadas.
+    """
+    court = serializers.IntegerField()
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    interval_weeks = serializers.IntegerField(min_value=1, max_value=4, default=1)
+    count = serializers.IntegerField(min_value=1, required=False)
+    until = serializers.DateField(required=False)
+    skip_conflicts = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        from core.series import MAX_OCCURRENCES
+
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError("La hora de inicio debe ser anterior a la de fin.")
+        if 'count' not in data and 'until' not in data:
+            raise serializers.ValidationError("Indicar 'count' o 'until'.")
+        if data.get('count', 0) > MAX_OCCURRENCES:
+            raise serializers.ValidationError(f"Una serie admite hasta {MAX_OCCURRENCES} fechas.")
+        if 'until' in data and data['until'] < timezone.localtime(data['start_time']).date():
+            raise serializers.ValidationError("'until' no puede ser anterior a la primera fecha.")
+        return data
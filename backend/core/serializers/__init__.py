@@ -1,3 +1,4 @@
-from .CompanySerializer import CompanySerializer
+from .CompanySerializer import CompanySerializer, NearbyCompanySerializer
 from .CourtSerializer import CourtSerializer, CourtTypeSerializer
-from .ReservationSerializer import ReservationSerializer, QuoteSerializer
+from .ReservationSerializer import ReservationSerializer, QuoteSerializer, AttachAddOnsSerializer, SeriesBookingSerializer
+from .PaymentSerializer import PaymentSerializer, ApprovePaymentsSerializer
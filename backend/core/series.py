@@ -0,0 +1,159 @@
+import datetime
+from bisect import bisect_left
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from core.events import publish_reservation_event
+from core.models import Reservation, ReservationSeries
+from core.occupancy import refresh_court_days, reservation_days
+from core.pricing import get_price_schedule, minute_range
+from core.rollups import mark_dirty
+from core.signals import bump_reservation_versions
+
+# =========================================================
+#  RESERVAS RECURRENTES (SERIES)
+# =========================================================
+# Una liga reserva la misma cancha todos los martes de la temporada:
+# - una consulta de rango trae las reservas activas que podrían chocar,
+# - el tarifario compilado cotiza cada fecha sin consultas extra,
+# - bulk_create inserta todas las fechas libres de una vez,
+# - el outbox crea una sola preferencia de pago por el total de la serie.
+
+MAX_OCCURRENCES = 52
+
+
+class SeriesConflict(ValidationError):
+    """Alguna fecha de la serie choca con una reserva existente."""
+
+    def __init__(self, conflicts):
+        super().__init__("Hay fechas de la serie que ya están reservadas.")
+        self.conflicts = conflicts
+
+
+def occurrences(start_dt, end_dt, interval_weeks=1, count=None, until=None):
+    """
+    Fechas de la serie. Se repite la misma hora local (si cambia el horario de
+    verano, la reserva sigue siendo a las 19:00). Se corta en count o en until.
+    """
+    local_start = timezone.localtime(start_dt)
+    local_end = timezone.localtime(end_dt)
+    duration_days = (local_end.date() - local_start.date()).days
+    tz = timezone.get_current_timezone()
+
+    result = []
+    step = datetime.timedelta(weeks=interval_weeks)
+    day = local_start.date()
+    while len(result) < (count or MAX_OCCURRENCES) and (until is None or day <= until):
+        start = timezone.make_aware(datetime.datetime.combine(day, local_start.time()), tz)
+        end = timezone.make_aware(
+            datetime.datetime.combine(day + datetime.timedelta(days=duration_days), local_end.time()), tz
+        )
+        result.append((start, end))
+        day += step
+    return result
+
+
+def find_conflicts(court, dates):
+    """
+    Para cada (inicio, fin) devuelve las reservas activas que lo pisan.
+    Una sola consulta para todo el rango de la serie.
+    """
+    if not dates:
+        return {}
+    existing = list(
+        Reservation.objects.filter(
+            court=court,
+            status__in=Reservation.ACTIVE_STATUSES,
+            start_time__lt=dates[-1][1],
+            end_time__gt=dates[0][0],
+        ).order_by('start_time').values_list('id', 'start_time', 'end_time')
+    )
+    starts = [start for _, start, _ in existing]
+    conflicts = {}
+    for start, end in dates:
+        # Las reservas activas de una cancha no se solapan: ordenadas por inicio
+        # también quedan ordenadas por fin. Recorremos hacia atrás desde la última
+        # que empieza antes de 'end' mientras termine después de 'start'.
+        i = bisect_left(starts, end) - 1
+        hits = []
+        while i >= 0 and existing[i][2] > start:
+            hits.append(existing[i][0])
+            i -= 1
+        if hits:
+            conflicts[start] = sorted(hits)
+    return conflicts
+
+
+def create_series(court, user, dates, interval_weeks=1, skip_conflicts=False):
+    """
+    Crea la serie y sus reservas libres. Si hay choques y skip_conflicts es False
+    lanza SeriesConflict sin crear nada. Devuelve (serie, reservas, choques).
+    Debe llamarse dentro de una transacción (junto con el outbox del pago).
+    """
+    conflicts = find_conflicts(court, dates)
+    conflict_list = [
+        {"start": timezone.localtime(start).isoformat(), "end": timezone.localtime(end).isoformat(),
+         "reservation_ids": conflicts[start]}
+        for start, end in dates if start in conflicts
+    ]
+    if conflicts and not skip_conflicts:
+        raise SeriesConflict(conflict_list)
+
+    free = [(start, end) for start, end in dates if start not in conflicts]
+    if not free:
+        raise SeriesConflict(conflict_list)
+
+    schedule = get_price_schedule(court.company_id, court.court_type_id)
+    series = ReservationSeries.objects.create(court=court, user=user, interval_weeks=interval_weeks)
+
+    # bulk_create no llama a save(): los totales se calculan acá
+    reservations = []
+    for start, end in free:
+        price = schedule.price(*minute_range(start, end))
+        reservations.append(Reservation(
+            court=court, user=user, series=series, start_time=start, end_time=end,
+            subtotal_court=price, total_price=price, amount_pending=price,
+            status='pending', amount_paid=0
+        ))
+    reservations = Reservation.objects.bulk_create(reservations)
+
+    # bulk_create no dispara signals: ocupación, resúmenes, ETags y eventos a mano
+    pairs = [
+        pair for reservation in reservations
+        for pair in reservation_days(court.id, reservation.start_time, reservation.end_time)
+    ]
+    refresh_court_days(pairs)
+    mark_dirty(pairs)
+    bump_reservation_versions(court.id, court.company_id)
+    for reservation in reservations:
+        publish_reservation_event('created', reservation.id, court.id, court.company_id,
+                                  reservation.start_time, reservation.end_time, 'pending')
+    return series, reservations, conflict_list
+
+
+def allocate_series_payment(series_id, amount):
+    """
+    Reparte un pago de la serie entre sus reservas pendientes de saldo, en orden
+    de fecha (primero se cubren los turnos más próximos). Bloquea las filas.
+    Ninguna reserva recibe más que su saldo: devuelve ({reservation_id: monto},
+    {reservation_id: sobrante}); el sobrante, si lo hay, se anota en la última
+    reserva para devolverlo y no deja amount_pending en negativo.
+    """
+    rows = list(
+        Reservation.objects.select_for_update()
+        .filter(series_id=series_id, status__in=('pending', 'confirmed'))
+        .order_by('start_time')
+        .values_list('id', 'amount_pending')
+    )
+    allocation = {}
+    remaining = amount
+    for reservation_id, pending in rows:
+        if remaining <= 0:
+            break
+        share = min(pending, remaining)
+        if share > 0:
+            allocation[reservation_id] = share
+            remaining -= share
+    surplus = {rows[-1][0]: remaining} if remaining > 0 and rows else {}
+    return allocation, surplus
@@ -1,12 +1,34 @@
-import mercadopago
-import os
+import logging
 from django.conf import settings
+from django.db.models import Count, Sum
+from core.gateway import get_gateway
+from core.models import Reservation
+
+logger = logging.getLogger('core.payments')
+
+
+def preference_item(reservation):
+    """(título, monto, external_reference). Una serie se cobra entera en una sola preferencia."""
+    if not reservation.series_id:
+        return f"Reserva: {reservation.court.name}", reservation.total_price, str(reservation.id)
+
+    totals = Reservation.objects.filter(
+        series_id=reservation.series_id, status__in=Reservation.ACTIVE_STATUSES
+    ).aggregate(total=Sum('total_price'), count=Count('id'))
+    return (
+        f"Serie de reservas: {reservation.court.name} ({totals['count']} turnos)",
+        totals['total'],
+        f"series-{reservation.series_id}",
+    )
 
 def create_payment_preference(reservation):
     """
     Crea la preferencia de pago incluyendo las URLs de retorno.
+    Devuelve None si Mercado Pago no creó la preferencia.
+    Lanza GatewayUnavailable si el circuit breaker está abierto.
     """
-    sdk = mercadopago.SDK(os.getenv("MP_ACCESS_TOKEN"))
+    gateway = get_gateway()
+    title, amount, external_reference = preference_item(reservation)
 
     # Definimos la URL base de tu Frontend (Next.js)
     # En producción esto debería venir de os.getenv('FRONTEND_URL')
@@ -17,10 +39,10 @@ def create_payment_preference(reservation):
     preference_data = {
         "items": [
             {
-                "title": f"Reserva: {reservation.court.name}",
+                "title": title,
                 "quantity": 1,
                 "currency_id": "PEN",
-                "unit_price": float(reservation.total_price)
+                "unit_price": float(amount)
             }
         ],
         "payer": {
@@ -43,11 +65,14 @@ def create_payment_preference(reservation):
         "auto_return": "approved",
         # ----------------------------------------
 
-        "external_reference": str(reservation.id),
+        "external_reference": external_reference,
         
 
         "notification_url": f"{webhook_base_url}/api/webhooks/mercadopago/",
     }
 
-    preference_response = sdk.preference().create(preference_data)
-    return preference_response["response"]
\ No newline at end of file
+    preference_response = gateway.create_preference(preference_data)
+    if preference_response.get("status") not in (200, 201):
+        logger.warning(f"MP rechazó la preferencia: {preference_response.get('response')}")
+        return None
+    return preference_response["response"]
@@ -0,0 +1,137 @@
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from core.models import (
+    BusinessHour, Company, Court, CourtType, CourtTypePrice, Reservation, ReservationAddOn, TimeSlot
+)
+from core.events import publish_reservation_event
+from core.occupancy import refresh_court_days, reservation_days
+from core.rollups import mark_dirty
+from core.versioning import bump_version, bump_company_version
+
+# =========================================================
+#  INVALIDACIÓN DE CACHÉS
+# =========================================================
+# Scopes de versión (ver core/versioning.py):
+#   pricing      -> tarifario compilado (core/pricing.py)
+#   catalog      -> catálogo de canchas y ETags de /api/courts/
+#   company      -> datos de la empresa y horarios de atención
+#   reservations -> ETags de disponibilidad (por empresa y por cancha)
+
+@receiver([post_save, post_delete], sender=CourtTypePrice)
+@receiver([post_save, post_delete], sender=TimeSlot)
+def invalidate_price_schedule(sender, instance, **kwargs):
+    bump_version('pricing', instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=Court)
+@receiver([post_save, post_delete], sender=CourtType)
+@receiver([post_save, post_delete], sender=CourtTypePrice)
+@receiver([post_save, post_delete], sender=TimeSlot)
+def invalidate_court_catalog(sender, instance, **kwargs):
+    bump_company_version('catalog', instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=Company)
+def invalidate_company(sender, instance, **kwargs):
+    bump_company_version('company', instance.id)
+    # El catálogo incluye el nombre de la empresa
+    bump_company_version('catalog', instance.id)
+
+
+@receiver([post_save, post_delete], sender=BusinessHour)
+def invalidate_business_hours(sender, instance, **kwargs):
+    bump_company_version('company', instance.company_id)
+
+
+def company_id_for_court(court_id):
+    """company_id de una cancha sin tocar la BD en el caso común (cacheado)."""
+    key = f"court-company:{court_id}"
+    company_id = cache.get(key)
+    if company_id is None:
+        company_id = Court.objects.filter(pk=court_id).values_list('company_id', flat=True).first()
+        cache.set(key, company_id, 60 * 60)
+    return company_id
+
+
+def bump_reservation_versions(court_id, company_id=None):
+    """Invalida los ETags de disponibilidad de la cancha y de su empresa."""
+    bump_version('reservations', f"court:{court_id}")
+    bump_company_version('reservations', company_id or company_id_for_court(court_id))
+
+
+@receiver([post_save, post_delete], sender=Reservation)
+def invalidate_reservations(sender, instance, **kwargs):
+    company_id = instance.court.company_id if Reservation.court.is_cached(instance) else None
+    bump_reservation_versions(instance.court_id, company_id)
+
+
+
+# =========================================================
+#  MAPAS DE OCUPACIÓN Y EVENTOS EN TIEMPO REAL
+# =========================================================
+# core/occupancy.py (bitmaps por cancha y día), core/rollups.py (resúmenes
+# para reportes) y core/events.py (deltas SSE).
+
+@receiver(post_save, sender=Reservation)
+def reservation_changed(sender, instance, created, **kwargs):
+    current = instance.occupancy_snapshot()
+    previous = getattr(instance, '_occupancy_snapshot', None)
+    # Guardar pagos o montos no cambia la ocupación: no tocamos el índice
+    if not created and previous == current:
+        return
+    pairs = reservation_days(instance.court_id, instance.start_time, instance.end_time)
+    if previous:
+        pairs += reservation_days(previous[0], previous[1], previous[2])
+    refresh_court_days(pairs)
+    mark_dirty(pairs)
+    instance._occupancy_snapshot = current
+
+    company_id = company_id_for_court(instance.court_id)
+    if created:
+        event = 'created'
+    elif previous is None:
+        # Instancia sin foto (creada a mano o leída con campos diferidos): no sabemos
+        # qué cambió; el evento de estado hace que los clientes refresquen ese turno
+        event = instance.status
+    elif previous[:3] != current[:3]:
+        # Cambio de cancha u horario: se libera el turno anterior y se toma el nuevo
+        publish_reservation_event('voided', instance.id, previous[0], company_id_for_court(previous[0]),
+                                  previous[1], previous[2], 'voided')
+        event = 'created'
+    else:
+        event = instance.status
+    publish_reservation_event(event, instance.id, instance.court_id, company_id,
+                              instance.start_time, instance.end_time, instance.status)
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_deleted(sender, instance, **kwargs):
+    pairs = reservation_days(instance.court_id, instance.start_time, instance.end_time)
+    refresh_court_days(pairs)
+    mark_dirty(pairs)
+    publish_reservation_event('voided', instance.id, instance.court_id, company_id_for_court(instance.court_id),
+                              instance.start_time, instance.end_time, 'voided')
+
+
+# =========================================================
+#  STOCK DE EXTRAS
+# =========================================================
+
+@receiver(pre_delete, sender=ReservationAddOn)
+def release_deleted_addon_stock(sender, instance, **kwargs):
+    """
+    Devuelve al stock el ítem borrado, también cuando se borra en cascada con
+    su reserva. Las reservas anuladas o vencidas ya devolvieron su stock.
+    """
+    from core.reservations import return_addon_stock
+
+    if ReservationAddOn.reservation.is_cached(instance):
+        active = instance.reservation.status in Reservation.ACTIVE_STATUSES
+    else:
+        active = Reservation.objects.filter(
+            pk=instance.reservation_id, status__in=Reservation.ACTIVE_STATUSES
+        ).exists()
+    if active:
+        return_addon_stock({instance.addon_id: instance.quantity})
@@ -1,3 +1,1789 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import io
+import json
+import threading
+import unittest
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import (
+    License, Company, BusinessHour, CourtType, Court, TimeSlot, CourtTypePrice, Reservation
+)
+from core.pricing import quote_price
+
+# Sin red: pasarela falsa y sin despacho inmediato del outbox
+offline_payments = override_settings(PAYMENT_GATEWAY='fake', PAYMENT_OUTBOX_INLINE_DISPATCH=False)
+
+
+def create_catalog():
+    """Empresa con 2 canchas, horario de 08:00 a 23:00 y dos franjas de precio."""
+    license = License.objects.create(start_date=datetime.date(2020, 1, 1), end_date=datetime.date(2030, 1, 1))
+    company = Company.objects.create(name="Club Test", license=license)
+    for weekday in range(7):
+        BusinessHour.objects.create(
+            company=company, weekday=weekday,
+            open_time=datetime.time(8), close_time=datetime.time(23)
+        )
+    court_type = CourtType.objects.create(company=company, name="Fútbol 7")
+    courts = [Court.objects.create(company=company, court_type=court_type, name=f"Cancha {i}") for i in range(1, 3)]
+    day = TimeSlot.objects.create(company=company, name="Día", start_time=datetime.time(8), end_time=datetime.time(18))
+    night = TimeSlot.objects.create(company=company, name="Noche", start_time=datetime.time(18), end_time=datetime.time(23))
+    CourtTypePrice.objects.create(company=company, court_type=court_type, time_slot=day, price=Decimal('60.00'))
+    CourtTypePrice.objects.create(company=company, court_type=court_type, time_slot=night, price=Decimal('90.00'))
+    return company, courts
+
+
+def local_dt(days_ahead, hour, minute=0):
+    date = timezone.localdate() + datetime.timedelta(days=days_ahead)
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time(hour, minute)))
+
+
+def postgres_only(test):
+    return unittest.skipUnless(connection.vendor == 'postgresql', "Requiere PostgreSQL")(test)
+
+
+# =========================================================
+#  DOBLE RESERVA (constraint de exclusión)
+# =========================================================
+
+@postgres_only
+@offline_payments
+class ReservationOverlapTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        self.client = APIClient()
+
+    def book(self, court, start, end):
+        return self.client.post('/api/reservations/', {
+            'court': court.id, 'start_time': start.isoformat(), 'end_time': end.isoformat()
+        }, format='json')
+
+    def test_overlapping_reservation_returns_409(self):
+        self.assertEqual(self.book(self.courts[0], local_dt(1, 19), local_dt(1, 20)).status_code, 201)
+        response = self.book(self.courts[0], local_dt(1, 19, 30), local_dt(1, 20, 30))
+        self.assertEqual(response.status_code, 409)
+
+    def test_adjacent_and_other_court_are_allowed(self):
+        self.assertEqual(self.book(self.courts[0], local_dt(1, 19), local_dt(1, 20)).status_code, 201)
+        self.assertEqual(self.book(self.courts[0], local_dt(1, 20), local_dt(1, 21)).status_code, 201)
+        self.assertEqual(self.book(self.courts[1], local_dt(1, 19), local_dt(1, 20)).status_code, 201)
+
+    def test_voided_reservation_frees_the_slot(self):
+        self.assertEqual(self.book(self.courts[0], local_dt(1, 19), local_dt(1, 20)).status_code, 201)
+        Reservation.objects.update(status='voided')
+        self.assertEqual(self.book(self.courts[0], local_dt(1, 19), local_dt(1, 20)).status_code, 201)
+
+
+@postgres_only
+@offline_payments
+class ReservationConcurrencyTests(TransactionTestCase):
+    PARALLEL_REQUESTS = 8
+
+    def test_parallel_creates_on_same_slot(self):
+        company, courts = create_catalog()
+        User.objects.create_user('invitado', 'invitado@test.com')
+        start, end = local_dt(2, 19), local_dt(2, 20, 30)
+        barrier = threading.Barrier(self.PARALLEL_REQUESTS)
+        status_codes = []
+
+        def book():
+            try:
+                barrier.wait()
+                response = APIClient().post('/api/reservations/', {
+                    'court': courts[0].id, 'start_time': start.isoformat(), 'end_time': end.isoformat()
+                }, format='json')
+                status_codes.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=book) for _ in range(self.PARALLEL_REQUESTS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(status_codes.count(201), 1)
+        self.assertEqual(status_codes.count(409), self.PARALLEL_REQUESTS - 1)
+        self.assertEqual(Reservation.objects.filter(court=courts[0]).count(), 1)
+
+
+# =========================================================
+#  OUTBOX DE PREFERENCIAS DE PAGO
+# =========================================================
+
+@offline_payments
+class PaymentOutboxTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        self.client = APIClient()
+
+    def test_preference_is_created_outside_the_booking_request(self):
+        from core.outbox import drain_outbox
+
+        response = self.client.post('/api/reservations/', {
+            'court': self.courts[0].id,
+            'start_time': local_dt(1, 19).isoformat(),
+            'end_time': local_dt(1, 20).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data['payment_url'])
+
+        status_url = f"/api/reservations/{response.data['id']}/payment/"
+        self.assertEqual(self.client.get(status_url).data['payment_status'], 'pending')
+
+        self.assertEqual(drain_outbox(workers=1), 1)
+        payment = self.client.get(status_url).data
+        self.assertEqual(payment['payment_status'], 'done')
+        self.assertTrue(payment['payment_url'])
+
+
+# =========================================================
+#  INBOX DE WEBHOOKS
+# =========================================================
+
+@offline_payments
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        from core import fakes
+
+        self.company, self.courts = create_catalog()
+        user = User.objects.create_user('cliente', 'cliente@test.com')
+        self.reservation = Reservation.objects.create(
+            court=self.courts[0], user=user, start_time=local_dt(1, 19), end_time=local_dt(1, 20),
+            subtotal_court=Decimal('90.00')
+        )
+        fakes.reset()
+        fakes.register_payment('mp-1', self.reservation.id, 45)
+
+    def test_webhook_acks_and_worker_applies_payment(self):
+        from core.inbox import drain_inbox
+        from core.models import WebhookEvent
+
+        for _ in range(3):  # MP reenvía la misma notificación
+            response = self.client.post(
+                '/api/webhooks/mercadopago/',
+                {'type': 'payment', 'data': {'id': 'mp-1'}},
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertFalse(self.reservation.payments.exists())
+
+        self.assertEqual(drain_inbox(workers=1), 1)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.amount_paid, Decimal('45.00'))
+        self.assertEqual(self.reservation.status, 'confirmed')
+
+    def test_invalid_signature_is_logged_and_ignored(self):
+        import os
+        from unittest import mock
+        from core.models import WebhookEvent
+
+        with mock.patch.dict(os.environ, {'MP_WEBHOOK_SECRET': 'secreto'}):
+            with self.assertLogs('core.payments', level='WARNING') as logs:
+                response = self.client.post(
+                    '/api/webhooks/mercadopago/?data.id=mp-1', {'type': 'payment', 'data': {'id': 'mp-1'}},
+                    content_type='application/json', HTTP_X_SIGNATURE='ts=1,v1=falsa', HTTP_X_REQUEST_ID='req-1'
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('la firma no coincide', logs.output[0])
+        self.assertIn('firma inválida ignorado', logs.output[1])
+        self.assertFalse(WebhookEvent.objects.exists())
+
+
+# =========================================================
+#  PASARELA DE PAGO (circuit breaker)
+# =========================================================
+
+@offline_payments
+class PaymentGatewayTests(TestCase):
+    def setUp(self):
+        from core import fakes
+        fakes.reset()
+        self.addCleanup(fakes.reset)
+
+    @override_settings(PAYMENT_GATEWAY_BREAKER_THRESHOLD=3, PAYMENT_GATEWAY_BREAKER_RESET_SECONDS=60)
+    def test_breaker_opens_after_consecutive_failures(self):
+        from core import fakes
+        from core.gateway import get_gateway, GatewayError, GatewayUnavailable
+
+        fakes.configure(fail_next=3)
+        gateway = get_gateway()
+        for _ in range(3):
+            with self.assertRaises(GatewayError):
+                gateway.get_payment('mp-1')
+
+        calls = fakes.call_count()
+        with self.assertRaises(GatewayUnavailable):
+            gateway.get_payment('mp-1')
+        self.assertEqual(fakes.call_count(), calls)  # Falla rápido, sin llamar a la pasarela
+
+    @override_settings(PAYMENT_GATEWAY_BREAKER_THRESHOLD=1, PAYMENT_GATEWAY_BREAKER_RESET_SECONDS=60)
+    def test_outbox_keeps_booking_queued_while_gateway_is_down(self):
+        from core import fakes
+        from core.models import PaymentOutbox
+        from core.outbox import drain_outbox
+
+        company, courts = create_catalog()
+        user = User.objects.create_user('cliente', 'cliente@test.com')
+        for hour in (18, 19):
+            reservation = Reservation.objects.create(
+                court=courts[0], user=user, start_time=local_dt(1, hour), end_time=local_dt(1, hour + 1),
+                subtotal_court=Decimal('90.00')
+            )
+            PaymentOutbox.objects.create(reservation=reservation)
+
+        fakes.configure(fail_next=1)
+        with self.assertLogs('core.payments', level='WARNING') as logs:
+            drain_outbox(workers=1)
+        self.assertIn('Outbox: preferencia de reserva', logs.output[0])
+
+        self.assertEqual(fakes.call_count(), 1)
+        for entry in PaymentOutbox.objects.all():
+            self.assertEqual(entry.status, 'pending')
+        self.assertEqual(
+            sorted(PaymentOutbox.objects.values_list('attempts', flat=True)), [0, 1]
+        )
+
+
+# =========================================================
+#  CATÁLOGO DE CANCHAS (N+1 y caché)
+# =========================================================
+
+class CourtCatalogTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+
+    def test_court_list_query_count_does_not_grow_with_courts(self):
+        # COUNT de paginación + canchas + precios prefetcheados
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get('/api/courts/').status_code, 200)
+
+        court_type = self.courts[0].court_type
+        for i in range(6):
+            Court.objects.create(company=self.company, court_type=court_type, name=f"Extra {i}")
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/courts/')
+        self.assertEqual(len(response.data['results'][0]['court_type']['prices']), 2)
+
+    def test_company_catalog_is_cached_and_invalidated(self):
+        url = f'/api/courts/?company={self.company.id}'
+        first = self.client.get(url).data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data, first)
+
+        night_price = CourtTypePrice.objects.get(time_slot__name="Noche")
+        night_price.price = Decimal('120.00')
+        night_price.save()
+
+        prices = self.client.get(url).data['results'][0]['court_type']['prices']
+        self.assertIn('120.00', [p['price'] for p in prices])
+
+
+# =========================================================
+#  TARIFARIO PRECOMPILADO
+# =========================================================
+
+class PriceScheduleTests(TestCase):
+    ROWS = [
+        (Decimal('60.00'), "Día", datetime.time(8), datetime.time(18)),
+        (Decimal('90.00'), "Noche", datetime.time(18), datetime.time(22)),
+        (Decimal('120.00'), "Trasnoche", datetime.time(22), datetime.time(2)),
+    ]
+
+    def setUp(self):
+        from core.pricing import PriceSchedule
+        self.schedule = PriceSchedule.from_rows(self.ROWS)
+
+    def price(self, start, end, days=0):
+        """Precio de start a end (horas HH:MM), 'days' días después del inicio."""
+        from core.pricing import MINUTES_PER_DAY, to_minutes
+        return self.schedule.price(to_minutes(start), days * MINUTES_PER_DAY + to_minutes(end))
+
+    def test_overnight_slot_and_booking_across_midnight(self):
+        # 21:00 - 01:00: 1h de Noche + 3h de Trasnoche (la franja sigue después de medianoche)
+        self.assertEqual(self.price(datetime.time(21), datetime.time(1), days=1), Decimal('450.00'))
+        # La parte de la franja nocturna que cae a la madrugada se cobra igual
+        self.assertEqual(self.price(datetime.time(1), datetime.time(3)), Decimal('120.00'))
+        # Sin franja de 02:00 a 08:00: esas horas no suman
+        self.assertEqual(self.price(datetime.time(2), datetime.time(8)), Decimal('0.00'))
+
+    def test_slot_edges_and_exact_minutes(self):
+        self.assertEqual(self.price(datetime.time(17), datetime.time(18)), Decimal('60.00'))
+        self.assertEqual(self.price(datetime.time(18), datetime.time(19)), Decimal('90.00'))
+        self.assertEqual(self.price(datetime.time(17, 30), datetime.time(18, 30)), Decimal('75.00'))
+        self.assertEqual(self.price(datetime.time(7, 59), datetime.time(8, 1)), Decimal('1.00'))
+        # 7 minutos a 55 por hora = 6.41666... (redondeo a centavos al final, no por minuto)
+        from core.pricing import PriceSchedule
+        schedule = PriceSchedule.from_rows([(Decimal('55.00'), "Día", datetime.time(8), datetime.time(18))])
+        self.assertEqual(schedule.price(8 * 60, 8 * 60 + 7), Decimal('6.42'))
+
+    def test_matches_the_previous_per_slot_loop(self):
+        # El cálculo anterior (ReservationViews.calculate_complex_price) recorría las
+        # franjas y sumaba solapamiento x precio. No entendía franjas nocturnas, así
+        # que comparamos con las dos diurnas y rangos que terminan antes de las 22:00
+        def previous_loop(start, end):
+            total = Decimal('0.00')
+            for price, _, slot_start, slot_end in self.ROWS[:2]:
+                overlap_start, overlap_end = max(start, slot_start), min(end, slot_end)
+                if overlap_start < overlap_end:
+                    dt1 = datetime.datetime.combine(datetime.date(2000, 1, 1), overlap_start)
+                    dt2 = datetime.datetime.combine(datetime.date(2000, 1, 1), overlap_end)
+                    total += Decimal((dt2 - dt1).total_seconds() / 3600) * price
+            return round(total, 2)
+
+        for start, end in [(8, 9), (9, 12), (16, 20), (17, 21), (8, 21), (6, 10)]:
+            for minute in (0, 15, 45):
+                begin, finish = datetime.time(start, minute), datetime.time(end, minute)
+                self.assertEqual(self.price(begin, finish), previous_loop(begin, finish), (begin, finish))
+
+
+# =========================================================
+#  CACHÉ COMPARTIDO ENTRE WORKERS
+# =========================================================
+
+class SharedCacheTests(TestCase):
+    def test_configured_cache_is_not_per_process(self):
+        from django.conf import settings
+        self.assertNotIn(settings.SHARED_CACHE['BACKEND'], {
+            'django.core.cache.backends.locmem.LocMemCache',
+            'django.core.cache.backends.dummy.DummyCache',
+        })
+
+    def test_version_bump_is_seen_by_another_worker(self):
+        from django.conf import settings
+        from django.core.cache import caches
+        from django.core.management import call_command
+        from core.versioning import bump_version, get_version
+
+        with override_settings(CACHES={'default': settings.SHARED_CACHE}):
+            call_command('createcachetable', verbosity=0)
+            before = get_version('pricing', 42)
+            # Otra instancia del backend, como la de otro proceso
+            other_worker = caches.create_connection('default')
+            self.assertEqual(other_worker.get('version:pricing:42'), before)
+
+            after = bump_version('pricing', 42)
+            self.assertGreater(after, before)
+            self.assertEqual(other_worker.get('version:pricing:42'), after)
+
+
+# =========================================================
+#  GET CONDICIONAL (ETag)
+# =========================================================
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        self.url = f'/api/companies/{self.company.id}/availability/?from={local_dt(1, 0).date()}'
+
+    def test_unchanged_availability_returns_304_without_queries(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_reservation_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        Reservation.objects.create(
+            court=self.courts[0], user=User.objects.create_user('cliente'),
+            start_time=local_dt(1, 19), end_time=local_dt(1, 20), subtotal_court=Decimal('90.00')
+        )
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_validation_relies_on_the_etag_only(self):
+        # Last-Modified tendría resolución de segundos: dos cambios en el mismo segundo no se distinguirían
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+
+# =========================================================
+#  GRILLA DE DISPONIBILIDAD POR EMPRESA
+# =========================================================
+
+class CompanyAvailabilityGridTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        self.user = User.objects.create_user('cliente')
+        self.day = local_dt(1, 0).date()
+        self.url = f'/api/companies/{self.company.id}/availability/'
+
+    def test_grid_lists_bookings_per_court_and_day(self):
+        from core.reservations import void_reservations
+
+        first, second = self.day.isoformat(), (self.day + datetime.timedelta(days=1)).isoformat()
+        # Cerrado el día siguiente
+        BusinessHour.objects.filter(company=self.company, weekday=(self.day + datetime.timedelta(days=1)).weekday()).delete()
+        Reservation.objects.create(court=self.courts[0], user=self.user, start_time=local_dt(1, 19), end_time=local_dt(1, 20, 30))
+        Reservation.objects.create(court=self.courts[1], user=self.user, start_time=local_dt(1, 23), end_time=local_dt(2, 1))
+        voided = Reservation.objects.create(court=self.courts[0], user=self.user, start_time=local_dt(1, 9), end_time=local_dt(1, 10))
+        void_reservations([voided.id])
+        Court.objects.create(company=self.company, court_type=self.courts[0].court_type, name="Cerrada", is_active=False)
+
+        with self.assertNumQueries(4):  # empresa, canchas, horarios y reservas
+            response = self.client.get(self.url, {'from': first, 'to': second})
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual((data['from'], data['to'], data['next']), (first, second, None))
+        self.assertEqual(data['business_hours'][first], {'open': '08:00', 'close': '23:00', 'is_open': True})
+        self.assertEqual(data['business_hours'][second], {'open': None, 'close': None, 'is_open': False})
+
+        courts = {court['court_id']: court for court in data['courts']}
+        self.assertEqual(list(courts), [court.id for court in self.courts])  # sin la cancha inactiva
+        self.assertEqual(courts[self.courts[0].id]['court_type'], "Fútbol 7")
+        self.assertEqual(courts[self.courts[0].id]['days'], {
+            first: [{'start': '19:00', 'end': '20:30', 'status': 'pending'}], second: []
+        })
+        # La reserva que cruza la medianoche aparece recortada en los dos días
+        self.assertEqual(courts[self.courts[1].id]['days'], {
+            first: [{'start': '23:00', 'end': '00:00', 'status': 'pending'}],
+            second: [{'start': '00:00', 'end': '01:00', 'status': 'pending'}],
+        })
+
+    def test_long_ranges_are_paged_by_days(self):
+        from core.availability import MAX_GRID_DAYS
+
+        last_day = self.day + datetime.timedelta(days=MAX_GRID_DAYS + 2)
+        response = self.client.get(self.url, {'from': self.day.isoformat(), 'to': last_day.isoformat()})
+        self.assertEqual(len(response.data['business_hours']), MAX_GRID_DAYS)
+        self.assertEqual(len(response.data['courts'][0]['days']), MAX_GRID_DAYS)
+
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual(next_page.data['from'], (self.day + datetime.timedelta(days=MAX_GRID_DAYS)).isoformat())
+        self.assertEqual((next_page.data['to'], next_page.data['next']), (last_day.isoformat(), None))
+
+    def test_invalid_ranges_return_400(self):
+        for params in [{}, {'from': 'mañana'}, {'from': '2023-02-30'},
+                       {'from': '2023-11-10', 'to': '2023-11-09'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.data)
+
+
+# =========================================================
+#  LISTADO DE RESERVAS (cursor y filtros)
+# =========================================================
+
+class ReservationListTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        other_company, self.other_courts = create_catalog()
+        user = User.objects.create_user('cliente')
+        self.reservations = []
+        for days_ahead, court, hour in [(1, self.courts[0], 9), (1, self.courts[1], 10), (2, self.courts[0], 11),
+                                        (3, self.courts[1], 12), (3, self.other_courts[0], 13)]:
+            self.reservations.append(Reservation.objects.create(
+                court=court, user=user, start_time=local_dt(days_ahead, hour),
+                end_time=local_dt(days_ahead, hour + 1), subtotal_court=Decimal('60.00')
+            ))
+        Reservation.objects.filter(pk=self.reservations[1].pk).update(status='voided')
+
+    def ids(self, query=''):
+        response = self.client.get('/api/reservations/' + query)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_each_filter(self):
+        r = self.reservations
+        day1, day3 = local_dt(1, 0).date(), local_dt(3, 0).date()
+        self.assertEqual(self.ids(f'?court={self.courts[0].id}'), [r[2].id, r[0].id])
+        self.assertEqual(self.ids(f'?company={self.company.id}'), [r[3].id, r[2].id, r[1].id, r[0].id])
+        self.assertEqual(self.ids('?status=voided'), [r[1].id])
+        self.assertEqual(self.ids('?status=pending,voided'), [r[4].id, r[3].id, r[2].id, r[1].id, r[0].id])
+        self.assertEqual(self.ids(f'?from={day3}'), [r[4].id, r[3].id])
+        self.assertEqual(self.ids(f'?to={day1}'), [r[1].id, r[0].id])
+        self.assertEqual(self.ids(f'?from={day1}&to={day1}&status=pending'), [r[0].id])
+
+    def test_invalid_filters_return_400(self):
+        for query in ['?from=2023-02-30', '?to=2023-13-01', '?from=ayer', '?court=abc', '?company=1;2',
+                      '?status=borrada', '?from=2023-11-02&to=2023-11-01']:
+            response = self.client.get('/api/reservations/' + query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('error', response.data)
+
+    def test_cursor_pages_cover_everything_without_count(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        seen = []
+        url = '/api/reservations/?page_size=2'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                data = self.client.get(url).data
+                self.assertLessEqual(len(data['results']), 2)
+                seen.extend(item['id'] for item in data['results'])
+                url = data['next']
+        self.assertEqual(seen, [r.id for r in sorted(self.reservations, key=lambda r: r.start_time, reverse=True)])
+        self.assertFalse([q['sql'] for q in queries.captured_queries if 'COUNT(' in q['sql'].upper()])
+
+
+# =========================================================
+#  EXTRAS EN BLOQUE
+# =========================================================
+
+class AttachAddOnsTests(TestCase):
+    def setUp(self):
+        from core.models import AddOn
+
+        self.company, self.courts = create_catalog()
+        self.reservation = Reservation.objects.create(
+            court=self.courts[0], user=User.objects.create_user('cliente'),
+            start_time=local_dt(1, 19), end_time=local_dt(1, 20),
+            subtotal_court=Decimal('90.00'), amount_paid=Decimal('20.00')
+        )
+        self.addons = [
+            AddOn.objects.create(company=self.company, name=f"Extra {i}", price=Decimal('5.50'), stock_quantity=50)
+            for i in range(5)
+        ]
+
+    def test_attach_addons_uses_constant_queries(self):
+        url = f'/api/reservations/{self.reservation.id}/addons/'
+        items = [{'addon': addon.id, 'quantity': 2} for addon in self.addons]
+
+        # reserva + bloqueo + extras + stock + bulk_create + UPDATE de totales
+        # + promoción + relectura + marca del resumen diario (con savepoints)
+        with self.assertNumQueries(11):
+            response = self.client.post(url, {'items': items}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.subtotal_addons, Decimal('55.00'))
+        self.assertEqual(self.reservation.total_price, Decimal('145.00'))
+        self.assertEqual(self.reservation.amount_pending, Decimal('125.00'))
+        for addon in self.addons:
+            addon.refresh_from_db()
+            self.assertEqual(addon.stock_quantity, 48)
+
+    def test_removing_an_addon_can_confirm_the_reservation(self):
+        from core.reservations import apply_payment_amounts, attach_addons
+
+        reservation = Reservation.objects.create(
+            court=self.courts[1], user=self.reservation.user,
+            start_time=local_dt(1, 19), end_time=local_dt(1, 20), subtotal_court=Decimal('90.00')
+        )
+        items = attach_addons(reservation, [(addon.id, 2) for addon in self.addons])
+        apply_payment_amounts({reservation.id: Decimal('50.00')})
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'pending')  # 50 < 50% de 145
+
+        for item in items:
+            item.delete()
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.total_price, Decimal('90.00'))
+        self.assertEqual(reservation.status, 'confirmed')
+
+    def test_inactive_reservations_take_no_stock(self):
+        from core.reservations import void_reservations
+
+        void_reservations([self.reservation.id])
+        response = self.client.post(
+            f'/api/reservations/{self.reservation.id}/addons/',
+            {'items': [{'addon': self.addons[0].id, 'quantity': 2}]}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.addons[0].refresh_from_db()
+        self.assertEqual(self.addons[0].stock_quantity, 50)
+        self.assertFalse(self.reservation.addon_items.exists())
+
+    def test_unknown_addon_is_rejected(self):
+        response = self.client.post(
+            f'/api/reservations/{self.reservation.id}/addons/',
+            {'items': [{'addon': 9999}]}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.reservation.addon_items.exists())
+
+
+# =========================================================
+#  APROBACIÓN DE PAGOS EN BLOQUE
+# =========================================================
+
+def create_reservation_with_payments(court, amounts, hour=19):
+    from core.models import Payment
+
+    reservation = Reservation.objects.create(
+        court=court, user=User.objects.create_user(f'cliente-{court.id}-{hour}'),
+        start_time=local_dt(1, hour), end_time=local_dt(1, hour + 1), subtotal_court=Decimal('100.00')
+    )
+    payments = [
+        Payment.objects.create(reservation=reservation, amount=amount, payment_method='transfer')
+        for amount in amounts
+    ]
+    return reservation, payments
+
+
+class ApprovePaymentsTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        self.admin = User.objects.create_superuser('admin', 'admin@test.com', 'admin')
+
+    def test_bulk_approval_updates_balances_and_status(self):
+        first, first_payments = create_reservation_with_payments(self.courts[0], [Decimal('30.00'), Decimal('25.00')])
+        second, second_payments = create_reservation_with_payments(self.courts[1], [Decimal('10.00')])
+
+        self.client.force_login(self.admin)
+        ids = [p.id for p in first_payments + second_payments]
+        response = self.client.post('/api/payments/approve/', {'ids': ids}, content_type='application/json')
+        self.assertEqual(response.json(), {'approved': 3})
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.amount_paid, first.amount_pending, first.status), (Decimal('55.00'), Decimal('45.00'), 'confirmed'))
+        self.assertEqual((second.amount_paid, second.amount_pending, second.status), (Decimal('10.00'), Decimal('90.00'), 'pending'))
+
+        # Reaprobar no vuelve a sumar
+        self.client.post('/api/payments/approve/', {'ids': ids}, content_type='application/json')
+        first.refresh_from_db()
+        self.assertEqual(first.amount_paid, Decimal('55.00'))
+
+    def test_rejected_and_refund_payments_are_skipped(self):
+        from core.models import Payment
+        from core.reservations import approve_payments
+
+        reservation, payments = create_reservation_with_payments(
+            self.courts[0], [Decimal('30.00'), Decimal('40.00'), Decimal('10.00')]
+        )
+        payments[0].status = 'rejected'
+        payments[0].save()
+        payments[1].status = 'refund_required'
+        payments[1].save()
+
+        self.assertEqual(approve_payments([p.id for p in payments], self.admin), 1)
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.amount_paid, Decimal('10.00'))
+        self.assertEqual(
+            [p.status for p in Payment.objects.filter(reservation=reservation).order_by('id')],
+            ['rejected', 'refund_required', 'approved']
+        )
+
+    def test_only_admins_can_approve(self):
+        _, payments = create_reservation_with_payments(self.courts[0], [Decimal('30.00')])
+        response = self.client.post('/api/payments/approve/', {'ids': [payments[0].id]}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+@postgres_only
+class ApprovePaymentsConcurrencyTests(TransactionTestCase):
+    PARALLEL_APPROVALS = 8
+
+    def test_parallel_approvals_on_one_reservation_do_not_lose_updates(self):
+        from core.reservations import approve_payments
+
+        company, courts = create_catalog()
+        admin = User.objects.create_superuser('admin', 'admin@test.com', 'admin')
+        reservation, payments = create_reservation_with_payments(
+            courts[0], [Decimal('5.00')] * self.PARALLEL_APPROVALS
+        )
+        barrier = threading.Barrier(self.PARALLEL_APPROVALS * 2)
+
+        def approve(payment_id):
+            try:
+                barrier.wait()
+                approve_payments([payment_id], admin)
+            finally:
+                connections.close_all()
+
+        # Cada pago se aprueba dos veces en paralelo: solo debe sumarse una vez
+        threads = [threading.Thread(target=approve, args=(p.id,)) for p in payments for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.amount_paid, Decimal('5.00') * self.PARALLEL_APPROVALS)
+        self.assertEqual(reservation.amount_pending, Decimal('100.00') - reservation.amount_paid)
+        self.assertEqual(reservation.status, 'pending')  # 40 < 50% de seña
+
+
+# =========================================================
+#  STOCK DE EXTRAS
+# =========================================================
+
+class AddOnStockTests(TestCase):
+    def setUp(self):
+        from core.models import AddOn
+
+        self.company, self.courts = create_catalog()
+        self.reservation = Reservation.objects.create(
+            court=self.courts[0], user=User.objects.create_user('cliente'),
+            start_time=local_dt(1, 19), end_time=local_dt(1, 20), subtotal_court=Decimal('90.00')
+        )
+        self.balls = AddOn.objects.create(company=self.company, name="Pelota", price=Decimal('10.00'), stock_quantity=5)
+        self.drinks = AddOn.objects.create(company=self.company, name="Agua", price=Decimal('3.00'), stock_quantity=1)
+
+    def test_insufficient_stock_rolls_back_every_addon(self):
+        response = self.client.post(
+            f'/api/reservations/{self.reservation.id}/addons/',
+            {'items': [{'addon': self.balls.id, 'quantity': 2}, {'addon': self.drinks.id, 'quantity': 2}]},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['addons'], [self.drinks.id])
+
+        self.balls.refresh_from_db()
+        self.assertEqual(self.balls.stock_quantity, 5)
+        self.assertFalse(self.reservation.addon_items.exists())
+
+    def test_voiding_releases_stock_once(self):
+        from core.reservations import attach_addons, void_reservations
+
+        attach_addons(self.reservation, [(self.balls.id, 3), (self.drinks.id, 1)])
+        self.balls.refresh_from_db()
+        self.assertEqual(self.balls.stock_quantity, 2)
+
+        self.assertEqual(void_reservations([self.reservation.id]), [self.reservation.id])
+        self.assertEqual(void_reservations([self.reservation.id]), [])
+        self.balls.refresh_from_db()
+        self.drinks.refresh_from_db()
+        self.assertEqual((self.balls.stock_quantity, self.drinks.stock_quantity), (5, 1))
+
+    def stock(self):
+        self.balls.refresh_from_db()
+        self.drinks.refresh_from_db()
+        return self.balls.stock_quantity, self.drinks.stock_quantity
+
+    def test_editing_an_item_moves_only_the_difference(self):
+        from core.models import ReservationAddOn
+        from core.reservations import InsufficientStock
+
+        item = ReservationAddOn.objects.create(reservation=self.reservation, addon=self.balls, quantity=2)
+        self.assertEqual(self.stock(), (3, 1))
+
+        item.quantity = 4
+        item.save()
+        self.assertEqual(self.stock(), (1, 1))
+        item.quantity = 1
+        item.save()
+        self.assertEqual(self.stock(), (4, 1))
+
+        item.addon, item.quantity = self.drinks, 1
+        item.save()
+        self.assertEqual(self.stock(), (5, 0))
+
+        item.quantity = 2
+        with self.assertRaises(InsufficientStock):
+            item.save()
+        self.assertEqual(self.stock(), (5, 0))
+        self.assertEqual(ReservationAddOn.objects.get(pk=item.pk).quantity, 1)
+
+    def test_deleting_items_or_the_reservation_returns_stock(self):
+        from core.models import ReservationAddOn
+        from core.reservations import attach_addons
+
+        item = ReservationAddOn.objects.create(reservation=self.reservation, addon=self.drinks, quantity=1)
+        item.delete()
+        self.assertEqual(self.stock(), (5, 1))
+
+        attach_addons(self.reservation, [(self.balls.id, 3), (self.drinks.id, 1)])
+        self.assertEqual(self.stock(), (2, 0))
+        self.reservation.delete()  # Cascada sobre los ítems
+        self.assertEqual(self.stock(), (5, 1))
+
+    def test_admin_inline_reports_insufficient_stock_on_the_row(self):
+        from core.admin import ReservationAddOnForm
+
+        form = ReservationAddOnForm(data={
+            'reservation': self.reservation.id, 'addon': self.drinks.id, 'quantity': 2, 'price_snapshot': '3.00'
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('quantity', form.errors)
+
+        form = ReservationAddOnForm(data={
+            'reservation': self.reservation.id, 'addon': self.drinks.id, 'quantity': 1, 'price_snapshot': '3.00'
+        })
+        self.assertTrue(form.is_valid())
+
+    def test_admin_status_changes_only_through_actions(self):
+        from django.contrib import admin
+
+        # Cambiarlo a mano no movería el stock: se anula con la acción void_selected
+        model_admin = admin.site._registry[Reservation]
+        self.assertIn('status', model_admin.get_readonly_fields(None, self.reservation))
+        self.assertIn('void_selected', model_admin.actions)
+
+
+@postgres_only
+class AddOnStockConcurrencyTests(TransactionTestCase):
+    BUYERS = 8
+    STOCK = 3
+
+    def test_concurrent_buyers_never_oversell(self):
+        from core.models import AddOn
+        from core.reservations import attach_addons, InsufficientStock
+
+        company, courts = create_catalog()
+        addon = AddOn.objects.create(company=company, name="Pelota", price=Decimal('10.00'), stock_quantity=self.STOCK)
+        user = User.objects.create_user('cliente')
+        reservations = [
+            Reservation.objects.create(
+                court=courts[i % 2], user=user, start_time=local_dt(1, 8 + i // 2), end_time=local_dt(1, 9 + i // 2),
+                subtotal_court=Decimal('60.00')
+            )
+            for i in range(self.BUYERS)
+        ]
+        barrier = threading.Barrier(self.BUYERS)
+        results = []
+
+        def buy(reservation):
+            try:
+                barrier.wait()
+                attach_addons(reservation, [(addon.id, 1)])
+                results.append('ok')
+            except InsufficientStock:
+                results.append('sin stock')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=buy, args=(r,)) for r in reservations]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        addon.refresh_from_db()
+        self.assertEqual(results.count('ok'), self.STOCK)
+        self.assertEqual(results.count('sin stock'), self.BUYERS - self.STOCK)
+        self.assertEqual(addon.stock_quantity, 0)
+
+
+# =========================================================
+#  CICLO DE VIDA (vencimiento y completado)
+# =========================================================
+
+@override_settings(RESERVATION_PENDING_TTL_MINUTES=30)
+class ReservationLifecycleTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        self.user = User.objects.create_user('cliente')
+
+    def create(self, court, days_ahead, hour, status='pending', age_minutes=0, amount_paid=0):
+        reservation = Reservation.objects.create(
+            court=court, user=self.user, start_time=local_dt(days_ahead, hour),
+            end_time=local_dt(days_ahead, hour + 1), subtotal_court=Decimal('90.00')
+        )
+        Reservation.objects.filter(pk=reservation.pk).update(
+            status=status, amount_paid=amount_paid,
+            created_at=timezone.now() - datetime.timedelta(minutes=age_minutes)
+        )
+        return reservation
+
+    def test_expires_stale_unpaid_holds_and_releases_stock(self):
+        from core.lifecycle import expire_pending
+        from core.models import AddOn
+        from core.reservations import attach_addons
+
+        addon = AddOn.objects.create(company=self.company, name="Pelota", price=Decimal('10.00'), stock_quantity=5)
+        stale = self.create(self.courts[0], 1, 19, age_minutes=45)
+        attach_addons(stale, [(addon.id, 2)])
+        fresh = self.create(self.courts[0], 1, 20, age_minutes=5)
+        partially_paid = self.create(self.courts[1], 1, 19, age_minutes=45, amount_paid=10)
+
+        self.assertEqual(expire_pending(batch_size=10), 1)
+        self.assertEqual(expire_pending(batch_size=10), 0)
+
+        statuses = dict(Reservation.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[stale.id], 'expired')
+        self.assertEqual(statuses[fresh.id], 'pending')
+        self.assertEqual(statuses[partially_paid.id], 'pending')
+        addon.refresh_from_db()
+        self.assertEqual(addon.stock_quantity, 5)
+
+    @offline_payments
+    def test_late_approval_reactivates_the_hold_or_flags_a_refund(self):
+        from core import fakes
+        from core.inbox import process_payment_notification
+        from core.lifecycle import expire_pending
+        from core.models import Payment
+
+        fakes.reset()
+        self.addCleanup(fakes.reset)
+        still_free = self.create(self.courts[0], 1, 19, age_minutes=45)
+        retaken = self.create(self.courts[1], 1, 19, age_minutes=45)
+        self.assertEqual(expire_pending(batch_size=10), 2)
+        self.create(self.courts[1], 1, 19)  # Otro cliente tomó el turno liberado
+
+        fakes.register_payment('mp-late-1', still_free.id, 45)
+        fakes.register_payment('mp-late-2', retaken.id, 45)
+        process_payment_notification('mp-late-1')
+        process_payment_notification('mp-late-2')
+
+        still_free.refresh_from_db()
+        retaken.refresh_from_db()
+        self.assertEqual((still_free.status, still_free.amount_paid), ('confirmed', Decimal('45.00')))
+        self.assertEqual((retaken.status, retaken.amount_paid), ('expired', Decimal('0.00')))
+        self.assertEqual(Payment.objects.get(transaction_id='mp-late-1').status, 'approved')
+        self.assertEqual(Payment.objects.get(transaction_id='mp-late-2').status, 'refund_required')
+
+    def test_completes_past_confirmed_in_batches(self):
+        from unittest import mock
+        from core.lifecycle import complete_past
+
+        past = [self.create(self.courts[i % 2], -1, 10 + i, status='confirmed') for i in range(3)]
+        upcoming = self.create(self.courts[0], 1, 19, status='confirmed')
+
+        with mock.patch('core.lifecycle.publish_reservation_event') as publish:
+            self.assertEqual(complete_past(batch_size=2), 2)
+            self.assertEqual(complete_past(batch_size=2), 1)
+            self.assertEqual(complete_past(batch_size=2), 0)
+        # Los clientes de la grilla en vivo ven cada turno pasar a 'completed'
+        self.assertEqual(
+            sorted((call.args[0], call.args[1], call.args[-1]) for call in publish.call_args_list),
+            sorted(('completed', r.id, 'completed') for r in past)
+        )
+
+        self.assertEqual(
+            set(Reservation.objects.filter(status='completed').values_list('id', flat=True)),
+            {r.id for r in past}
+        )
+        upcoming.refresh_from_db()
+        self.assertEqual(upcoming.status, 'confirmed')
+
+
+# =========================================================
+#  EMPRESAS CERCANAS
+# =========================================================
+
+class NearbyCompaniesTests(TestCase):
+    def setUp(self):
+        license = License.objects.create(start_date=datetime.date(2020, 1, 1), end_date=datetime.date(2030, 1, 1))
+        self.obelisco = Company.objects.create(
+            name="Centro", license=license, latitude=Decimal('-34.6037'), longitude=Decimal('-58.3816')
+        )
+        self.palermo = Company.objects.create(
+            name="Palermo", license=License.objects.create(start_date=license.start_date, end_date=license.end_date),
+            latitude=Decimal('-34.5889'), longitude=Decimal('-58.4306')
+        )
+        self.la_plata = Company.objects.create(
+            name="La Plata", license=License.objects.create(start_date=license.start_date, end_date=license.end_date),
+            latitude=Decimal('-34.9214'), longitude=Decimal('-57.9545')
+        )
+
+    def test_sorted_by_distance_within_radius(self):
+        response = self.client.get('/api/companies/nearby/', {'lat': -34.6, 'lng': -58.39, 'radius': 15})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['id'] for c in response.data], [self.obelisco.id, self.palermo.id])
+        self.assertLess(response.data[0]['distance_km'], response.data[1]['distance_km'])
+
+        response = self.client.get('/api/companies/nearby/', {'lat': -34.6, 'lng': -58.39, 'radius': 60})
+        self.assertEqual([c['id'] for c in response.data][-1], self.la_plata.id)
+
+    def test_bounding_box_crosses_antimeridian(self):
+        from core.geo import bounding_box, haversine_km
+
+        _, _, lng_ranges = bounding_box(0, 179.9, 50)
+        self.assertEqual(len(lng_ranges), 2)
+        self.assertAlmostEqual(haversine_km(0, 179.9, 0, -179.9), 22.24, places=1)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/companies/nearby/', {'lat': -34.6}).status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/companies/nearby/', {'lat': -34.6, 'lng': -58.39, 'radius': 5000}).status_code, 400
+        )
+
+
+# =========================================================
+#  PRÓXIMO TURNO LIBRE
+# =========================================================
+
+class NextAvailableSlotTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        user = User.objects.create_user('cliente')
+        # Cancha 1 ocupada de 08:00 a 10:00, cancha 2 de 08:00 a 09:00
+        Reservation.objects.create(court=self.courts[0], user=user, start_time=local_dt(1, 8), end_time=local_dt(1, 10))
+        Reservation.objects.create(court=self.courts[1], user=user, start_time=local_dt(1, 8), end_time=local_dt(1, 9))
+
+    def test_earliest_slots_across_courts_are_priced(self):
+        day = (timezone.localdate() + datetime.timedelta(days=1)).isoformat()
+        self.client.get('/api/courts/next-available/', {'duration': 90, 'from': day, 'to': day})  # calienta tarifarios
+
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/api/courts/next-available/', {'duration': 90, 'from': day, 'to': day, 'limit': 3}
+            )
+        self.assertEqual(response.status_code, 200)
+        slots = [(r['court_id'], r['start'][11:16], r['end'][11:16]) for r in response.data['results']]
+        self.assertEqual(slots, [
+            (self.courts[1].id, '09:00', '10:30'),
+            (self.courts[1].id, '09:30', '11:00'),
+            (self.courts[0].id, '10:00', '11:30'),
+        ])
+        self.assertEqual(response.data['results'][0]['price'], Decimal('90.00'))
+
+    def test_slots_crossing_price_bands_and_closing_time(self):
+        day = (timezone.localdate() + datetime.timedelta(days=1)).isoformat()
+        response = self.client.get(
+            '/api/courts/next-available/',
+            {'duration': 120, 'from': f'{day}T17:00', 'to': day, 'court_type': 'fútbol 7', 'limit': 50}
+        )
+        results = response.data['results']
+        # 17:00-19:00 = 1h a 60 + 1h a 90; el último turno termina al cierre (23:00)
+        self.assertEqual(results[0]['price'], Decimal('150.00'))
+        self.assertEqual(max(r['end'][11:16] for r in results), '23:00')
+
+    def test_nearby_search_prices_every_court_type_in_one_query(self):
+        from core.pricing import clear_price_schedules
+
+        Company.objects.filter(pk=self.company.id).update(latitude=Decimal('-34.6037'), longitude=Decimal('-58.3816'))
+        padel = CourtType.objects.create(company=self.company, name="Pádel")
+        court = Court.objects.create(company=self.company, court_type=padel, name="Pádel 1")
+        for time_slot in TimeSlot.objects.filter(company=self.company):
+            CourtTypePrice.objects.create(company=self.company, court_type=padel, time_slot=time_slot, price=Decimal('40.00'))
+        clear_price_schedules()
+
+        day = (timezone.localdate() + datetime.timedelta(days=1)).isoformat()
+        params = {'duration': 60, 'from': day, 'to': day, 'limit': 3, 'lat': -34.6, 'lng': -58.39, 'radius': 5}
+        with self.assertNumQueries(6):  # empresas cercanas (2), canchas, horarios, ocupación y tarifarios
+            response = self.client.get('/api/courts/next-available/', params)
+        self.assertEqual(response.status_code, 200)
+        prices = {(r['court_id'], r['start'][11:16]): r['price'] for r in response.data['results']}
+        self.assertEqual(prices, {
+            (self.courts[1].id, '09:00'): Decimal('60.00'),
+            (court.id, '08:00'): Decimal('40.00'),
+            (court.id, '08:30'): Decimal('40.00'),
+        })
+
+    def test_unknown_court_type_returns_nothing(self):
+        response = self.client.get('/api/courts/next-available/', {'duration': 60, 'court_type': 'Pádel'})
+        self.assertEqual(response.data['results'], [])
+
+
+# =========================================================
+#  MAPAS DE OCUPACIÓN
+# =========================================================
+
+class OccupancyIndexTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        self.user = User.objects.create_user('cliente')
+        self.day = timezone.localdate() + datetime.timedelta(days=1)
+
+    def masks(self):
+        from core.occupancy import get_masks
+        return get_masks([court.id for court in self.courts], self.day, self.day + datetime.timedelta(days=1))
+
+    def test_create_void_and_free_checks(self):
+        from core.occupancy import free_courts, range_mask
+        from core.reservations import void_reservations
+
+        reservation = Reservation.objects.create(
+            court=self.courts[0], user=self.user, start_time=local_dt(1, 19), end_time=local_dt(1, 20, 30)
+        )
+        self.assertEqual(self.masks()[(self.courts[0].id, self.day)], range_mask(local_dt(1, 19), local_dt(1, 20, 30), self.day))
+        self.assertEqual(bin(self.masks()[(self.courts[0].id, self.day)]).count('1'), 6)
+
+        court_ids = [court.id for court in self.courts]
+        self.assertEqual(free_courts(court_ids, local_dt(1, 20), local_dt(1, 21)), [self.courts[1].id])
+        self.assertEqual(free_courts(court_ids, local_dt(1, 20, 30), local_dt(1, 21)), court_ids)
+
+        void_reservations([reservation.id])
+        self.assertEqual(self.masks()[(self.courts[0].id, self.day)], 0)
+
+    def test_reservation_across_midnight_marks_both_days(self):
+        next_day = self.day + datetime.timedelta(days=1)
+        Reservation.objects.create(
+            court=self.courts[1], user=self.user, start_time=local_dt(1, 23), end_time=local_dt(2, 1)
+        )
+        masks = self.masks()
+        self.assertEqual(bin(masks[(self.courts[1].id, self.day)]).count('1'), 4)
+        self.assertEqual(masks[(self.courts[1].id, next_day)], 0b1111)
+
+    def test_occupancy_endpoint_and_invalid_dates(self):
+        Reservation.objects.create(court=self.courts[0], user=self.user, start_time=local_dt(1, 0), end_time=local_dt(1, 1))
+        url = f'/api/companies/{self.company.id}/occupancy/'
+        data = self.client.get(url, {'from': self.day.isoformat()}).data
+        self.assertEqual(data['courts'][self.courts[0].id][self.day.isoformat()], '0f' + '00' * 11)
+
+        for params in [{'from': '2023-02-30'}, {'from': '2023-11-01', 'to': '2023-11-31'}, {}]:
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+    def test_next_available_search_reads_the_masks(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from core.occupancy import mask_intervals, range_mask
+        from core.search import find_free_slots
+
+        mask = range_mask(local_dt(1, 8), local_dt(1, 9, 30), self.day) | range_mask(local_dt(1, 10), local_dt(1, 11), self.day)
+        self.assertEqual(mask_intervals(mask, self.day), [(local_dt(1, 8), local_dt(1, 9, 30)), (local_dt(1, 10), local_dt(1, 11))])
+
+        Reservation.objects.create(court=self.courts[0], user=self.user, start_time=local_dt(1, 8), end_time=local_dt(1, 12))
+        with CaptureQueriesContext(connection) as queries:
+            slots = find_free_slots(60, local_dt(1, 8), local_dt(1, 13), company_ids={self.company.id}, limit=10)
+        self.assertFalse([q for q in queries.captured_queries if '"core_reservation"' in q['sql']])
+        starts = {(slot['court_id'], slot['start'][11:16]) for slot in slots}
+        self.assertIn((self.courts[0].id, '12:00'), starts)
+        self.assertNotIn((self.courts[0].id, '11:30'), starts)
+        self.assertIn((self.courts[1].id, '08:00'), starts)
+
+    def test_check_and_rebuild_commands(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from core.models import CourtDayOccupancy
+
+        Reservation.objects.create(court=self.courts[0], user=self.user, start_time=local_dt(1, 9), end_time=local_dt(1, 10))
+        call_command('check_occupancy', stdout=io.StringIO())
+
+        CourtDayOccupancy.objects.update(mask=bytes(12))
+        with self.assertRaises(CommandError):
+            call_command('check_occupancy', stdout=io.StringIO())
+
+        call_command('rebuild_occupancy', company=self.company.id, stdout=io.StringIO())
+        call_command('check_occupancy', stdout=io.StringIO())
+
+    def test_payment_saves_do_not_touch_the_index(self):
+        reservation = Reservation.objects.create(
+            court=self.courts[0], user=self.user, start_time=local_dt(1, 9), end_time=local_dt(1, 10)
+        )
+        reservation = Reservation.objects.select_related('court__company').get(pk=reservation.pk)
+        reservation.amount_paid = Decimal('10.00')
+        with self.assertNumQueries(1):
+            reservation.save()
+
+
+# =========================================================
+#  EVENTOS DE DISPONIBILIDAD (SSE)
+# =========================================================
+
+class AvailabilityStreamTests(TestCase):
+    async def test_stream_pushes_reservation_deltas(self):
+        from asgiref.sync import sync_to_async
+        from core.reservations import void_reservations
+
+        company, courts = await sync_to_async(create_catalog)()
+        user = await sync_to_async(User.objects.create_user)('cliente')
+        day = (timezone.localdate() + datetime.timedelta(days=1)).isoformat()
+
+        response = await self.async_client.get(f'/api/stream/companies/{company.id}/availability/{day}/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertIn(b'event: ready', await anext(stream))
+
+        def book():
+            with self.captureOnCommitCallbacks(execute=True):
+                reservation = Reservation.objects.create(
+                    court=courts[0], user=user, start_time=local_dt(1, 19), end_time=local_dt(1, 20)
+                )
+            with self.captureOnCommitCallbacks(execute=True):
+                void_reservations([reservation.id])
+            # Otro día: no llega a este canal
+            with self.captureOnCommitCallbacks(execute=True):
+                Reservation.objects.create(court=courts[0], user=user, start_time=local_dt(2, 19), end_time=local_dt(2, 20))
+
+        await sync_to_async(book)()
+
+        created = await asyncio.wait_for(anext(stream), 2)
+        voided = await asyncio.wait_for(anext(stream), 2)
+        self.assertIn(b'event: reservation.created', created)
+        self.assertIn(b'event: reservation.voided', voided)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(anext(stream), 0.2)
+        await stream.aclose()
+
+    def test_unknown_company_is_404(self):
+        self.assertEqual(self.client.get('/api/stream/companies/999/availability/2030-01-01/').status_code, 404)
+
+    def test_impossible_date_is_400(self):
+        self.assertEqual(self.client.get('/api/stream/companies/1/availability/2030-02-30/').status_code, 400)
+
+    def test_saving_without_a_snapshot_moves_the_occupancy(self):
+        from unittest import mock
+        from core.occupancy import get_masks
+        from core.signals import reservation_changed
+
+        company, courts = create_catalog()
+        user = User.objects.create_user('cliente')
+        day, next_day = local_dt(1, 0).date(), local_dt(2, 0).date()
+        reservation = Reservation.objects.create(court=courts[0], user=user, start_time=local_dt(1, 19), end_time=local_dt(1, 20))
+
+        # Campos diferidos: from_db no puede tomar la foto de ocupación
+        deferred = Reservation.objects.only('id').get(pk=reservation.pk)
+        deferred.start_time, deferred.end_time = local_dt(2, 19), local_dt(2, 20)
+        with mock.patch('core.signals.publish_reservation_event') as publish:
+            deferred.save()
+        masks = get_masks([courts[0].id], day, next_day)
+        self.assertEqual(masks[(courts[0].id, day)], 0)
+        self.assertNotEqual(masks[(courts[0].id, next_day)], 0)
+        self.assertEqual([c.args[0] for c in publish.call_args_list], ['voided', 'created'])
+
+        # Si aun así no hay foto, el receiver no falla: refresca y manda un evento de estado
+        del deferred._occupancy_snapshot
+        with mock.patch('core.signals.publish_reservation_event') as publish:
+            reservation_changed(Reservation, deferred, created=False)
+        self.assertEqual([c.args[0] for c in publish.call_args_list], ['pending'])
+
+
+# =========================================================
+#  VISTAS ASYNC (ASGI)
+# =========================================================
+
+class AsyncReadViewsTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        Reservation.objects.create(
+            court=self.courts[0], user=User.objects.create_user('cliente'),
+            start_time=local_dt(1, 19), end_time=local_dt(1, 20, 30)
+        )
+        self.day = (timezone.localdate() + datetime.timedelta(days=1)).isoformat()
+
+    def assertSameJson(self, sync_response, async_response):
+        self.assertEqual(sync_response.status_code, async_response.status_code)
+        sync_data, async_data = json.loads(sync_response.content), json.loads(async_response.content)
+        # 'next' apunta a la misma vista que respondió
+        if isinstance(sync_data, dict) and sync_data.get('next'):
+            sync_data['next'] = sync_data['next'].replace('/api/', '/api/async/')
+        self.assertEqual(sync_data, async_data)
+
+    def test_availability_matches_sync_views(self):
+        court_id = self.courts[0].id
+        self.assertSameJson(
+            self.client.get(f'/api/courts/{court_id}/availability/', {'date': self.day}),
+            self.client.get(f'/api/async/courts/{court_id}/availability/', {'date': self.day}),
+        )
+        query = {'from': self.day, 'to': '2099-01-01'}
+        sync_grid = self.client.get(f'/api/companies/{self.company.id}/availability/', query)
+        async_grid = self.client.get(f'/api/async/companies/{self.company.id}/availability/', query)
+        self.assertSameJson(sync_grid, async_grid)
+        self.assertIn('/api/async/companies/', async_grid.json()['next'])
+
+        etag = async_grid['ETag']
+        not_modified = self.client.get(
+            f'/api/async/companies/{self.company.id}/availability/', query, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_quote_matches_sync_view(self):
+        body = {'court_id': self.courts[0].id, 'start_time': local_dt(1, 17).isoformat(),
+                'end_time': local_dt(1, 19, 30).isoformat()}
+        self.assertSameJson(
+            self.client.post('/api/reservations/quote/', body, content_type='application/json'),
+            self.client.post('/api/async/reservations/quote/', body, content_type='application/json'),
+        )
+        self.assertEqual(
+            self.client.post('/api/async/reservations/quote/', {'court_id': 1}, content_type='application/json').status_code,
+            400
+        )
+
+
+# =========================================================
+#  RESERVAS RECURRENTES
+# =========================================================
+
+@offline_payments
+class ReservationSeriesTests(TestCase):
+    def setUp(self):
+        from core import fakes
+
+        fakes.reset()
+        self.company, self.courts = create_catalog()
+        self.user = User.objects.create_user('liga', 'liga@test.com')
+        # La tercera semana ya está tomada de 19:30 a 20:30
+        self.taken = Reservation.objects.create(
+            court=self.courts[0], user=self.user, start_time=local_dt(15, 19, 30), end_time=local_dt(15, 20, 30)
+        )
+        self.body = {
+            'court': self.courts[0].id,
+            'start_time': local_dt(1, 19).isoformat(),
+            'end_time': local_dt(1, 20).isoformat(),
+            'count': 4,
+        }
+
+    def test_conflicts_are_reported_per_occurrence(self):
+        response = self.client.post('/api/reservations/series/', self.body, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.data['conflicts']), 1)
+        self.assertEqual(response.data['conflicts'][0]['reservation_ids'], [self.taken.id])
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_series_is_created_in_bulk_with_one_preference(self):
+        from core.models import PaymentOutbox
+        from core.outbox import drain_outbox
+        from core.services import preference_item
+
+        response = self.client.post(
+            '/api/reservations/series/', {**self.body, 'skip_conflicts': True}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['reservations']), 3)
+        self.assertEqual(response.data['total_price'], Decimal('270.00'))
+        self.assertEqual(PaymentOutbox.objects.count(), 1)
+
+        first = Reservation.objects.get(pk=response.data['reservations'][0]['id'])
+        title, amount, reference = preference_item(first)
+        self.assertEqual((amount, reference), (Decimal('270.00'), f"series-{response.data['series_id']}"))
+        self.assertEqual(drain_outbox(workers=1), 1)
+
+    def test_series_payment_is_split_across_occurrences(self):
+        from core import fakes
+        from core.inbox import process_payment_notification
+
+        response = self.client.post(
+            '/api/reservations/series/', {**self.body, 'skip_conflicts': True}, content_type='application/json'
+        )
+        fakes.register_payment('mp-serie', f"series-{response.data['series_id']}", 135)
+        with self.assertLogs('core.payments', level='INFO') as logs:
+            process_payment_notification('mp-serie')
+        self.assertIn('serie', logs.output[0])
+        process_payment_notification('mp-serie')  # reintento: no se aplica dos veces
+
+        paid = list(
+            Reservation.objects.filter(series_id=response.data['series_id'])
+            .order_by('start_time').values_list('amount_paid', 'status')
+        )
+        self.assertEqual(paid, [
+            (Decimal('90.00'), 'confirmed'), (Decimal('45.00'), 'confirmed'), (Decimal('0.00'), 'pending')
+        ])
+
+    def test_overpayment_is_flagged_for_refund(self):
+        from core import fakes
+        from core.inbox import process_payment_notification
+        from core.models import Payment
+
+        response = self.client.post(
+            '/api/reservations/series/', {**self.body, 'skip_conflicts': True}, content_type='application/json'
+        )
+        series_id = response.data['series_id']
+        fakes.register_payment('mp-de-mas', f"series-{series_id}", 300)
+        process_payment_notification('mp-de-mas')
+
+        reservations = Reservation.objects.filter(series_id=series_id).order_by('start_time')
+        self.assertEqual(
+            list(reservations.values_list('amount_paid', 'amount_pending', 'status')),
+            [(Decimal('90.00'), Decimal('0.00'), 'confirmed')] * 3
+        )
+        surplus = Payment.objects.get(transaction_id='mp-de-mas', status='refund_required')
+        self.assertEqual((surplus.reservation_id, surplus.amount), (reservations.last().id, Decimal('30.00')))
+
+    def test_payment_after_the_series_expired(self):
+        from core import fakes
+        from core.inbox import process_payment_notification
+        from core.models import Payment
+        from core.reservations import void_reservations
+
+        def expired_series():
+            response = self.client.post(
+                '/api/reservations/series/', {**self.body, 'skip_conflicts': True}, content_type='application/json'
+            )
+            series_id = response.data['series_id']
+            reservations = Reservation.objects.filter(series_id=series_id).order_by('start_time')
+            void_reservations(list(reservations.values_list('id', flat=True)), status='expired')
+            return series_id, reservations
+
+        # Las fechas siguen libres: se reactivan y el pago se reparte
+        series_id, reservations = expired_series()
+        fakes.register_payment('mp-tarde', f"series-{series_id}", 135)
+        process_payment_notification('mp-tarde')
+        self.assertEqual(list(reservations.values_list('status', flat=True)), ['confirmed', 'confirmed', 'pending'])
+
+        # Las fechas se tomaron después del vencimiento: no se reactiva nada y el pago entero se devuelve
+        void_reservations(list(reservations.values_list('id', flat=True)))
+        series_id, reservations = expired_series()
+        for reservation in reservations:
+            Reservation.objects.create(
+                court=reservation.court, user=self.user, start_time=reservation.start_time, end_time=reservation.end_time
+            )
+        fakes.register_payment('mp-tarde-2', f"series-{series_id}", 135)
+        process_payment_notification('mp-tarde-2')
+        self.assertEqual(set(reservations.values_list('status', flat=True)), {'expired'})
+        refund = Payment.objects.get(transaction_id='mp-tarde-2')
+        self.assertEqual((refund.status, refund.amount, refund.reservation_id),
+                         ('refund_required', Decimal('135.00'), reservations.last().id))
+
+    def test_until_before_the_first_date_is_rejected(self):
+        body = {key: value for key, value in self.body.items() if key != 'count'}
+        response = self.client.post(
+            '/api/reservations/series/', {**body, 'until': '2000-01-01'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+# =========================================================
+#  RESÚMENES DIARIOS (REPORTES)
+# =========================================================
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        self.user = User.objects.create_user('cliente')
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        self.day = timezone.localdate() + datetime.timedelta(days=1)
+
+    def book(self, court, start_hour, end_hour, **kwargs):
+        start, end = local_dt(1, start_hour), local_dt(1, end_hour)
+        price, _ = quote_price(court, start, end, with_breakdown=False)
+        return Reservation.objects.create(
+            court=court, user=self.user, start_time=start, end_time=end, subtotal_court=price, **kwargs
+        )
+
+    def test_events_mark_rows_and_job_refreshes_them(self):
+        from core.models import DailyRollup
+        from core.rollups import refresh_dirty
+
+        self.book(self.courts[0], 17, 19)   # 1h a 60 + 1h a 90
+        self.assertTrue(DailyRollup.objects.get(court=self.courts[0], day=self.day).dirty)
+
+        self.assertEqual(refresh_dirty(), 1)
+        rollup = DailyRollup.objects.get(court=self.courts[0], day=self.day)
+        self.assertFalse(rollup.dirty)
+        self.assertEqual((rollup.open_minutes, rollup.booked_minutes, rollup.reservations), (900, 120, 1))
+        self.assertEqual(rollup.booked_revenue, Decimal('150.00'))
+        self.assertEqual(rollup.slots['Día'], {'open_minutes': 600, 'booked_minutes': 60, 'revenue': '60.00'})
+        self.assertEqual(rollup.slots['Noche']['revenue'], '90.00')
+
+    def test_report_reads_rollups_and_backfill_matches(self):
+        from django.core.management import call_command
+        from core.models import DailyRollup, Payment
+        from core.reservations import approve_payments
+        from core.rollups import refresh_dirty
+
+        reservation = self.book(self.courts[0], 19, 21)
+        self.book(self.courts[1], 9, 10)
+        payment = Payment.objects.create(reservation=reservation, amount=Decimal('90.00'), payment_method='cash')
+        approve_payments([payment.id], self.admin)
+        refresh_dirty()
+
+        self.client.force_login(self.admin)
+        url = f'/api/companies/{self.company.id}/report/'
+        query = {'from': timezone.localdate().isoformat(), 'to': self.day.isoformat()}
+        with self.assertNumQueries(4):  # sesión + usuario + empresa + resúmenes
+            report = self.client.get(url, query).json()
+
+        tomorrow = report['by_day'][-1]
+        self.assertEqual((tomorrow['booked_minutes'], tomorrow['open_minutes']), (180, 1800))
+        self.assertEqual(tomorrow['occupancy_pct'], 10.0)
+        self.assertEqual(report['by_day'][0]['collected_revenue'], 90.0)
+        self.assertEqual(sum(court['booked_revenue'] for court in report['by_court']), 240.0)
+        self.assertEqual(report['pending_refresh'], 0)
+
+        before = {(r.court_id, r.day): (r.booked_minutes, r.booked_revenue, r.slots) for r in DailyRollup.objects.all()}
+        DailyRollup.objects.all().delete()
+        call_command('refresh_rollups', backfill=True, first_day=query['from'], last_day=query['to'], stdout=io.StringIO())
+        after = {(r.court_id, r.day): (r.booked_minutes, r.booked_revenue, r.slots) for r in DailyRollup.objects.all()}
+        self.assertEqual({k: v for k, v in after.items() if k in before}, before)
+
+    def test_overnight_hours_count_after_midnight(self):
+        from core.models import DailyRollup
+        from core.rollups import refresh_dirty
+
+        BusinessHour.objects.filter(company=self.company).update(open_time=datetime.time(18), close_time=datetime.time(2))
+        Reservation.objects.create(court=self.courts[0], user=self.user, start_time=local_dt(1, 0), end_time=local_dt(1, 1, 30))
+        refresh_dirty()
+
+        # 00:00 - 02:00 (horario del día anterior) + 18:00 - 24:00
+        rollup = DailyRollup.objects.get(court=self.courts[0], day=self.day)
+        self.assertEqual((rollup.open_minutes, rollup.booked_minutes), (480, 90))
+
+    def test_report_requires_admin(self):
+        response = self.client.get(f'/api/companies/{self.company.id}/report/', {'from': self.day.isoformat()})
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_report_rejects_impossible_dates(self):
+        self.client.force_login(self.admin)
+        url = f'/api/companies/{self.company.id}/report/'
+        for params in [{'from': '2023-02-30'}, {'from': '2023-11-01', 'to': '2023-11-31'}, {'from': 'ayer'}]:
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+# =========================================================
+#  EXPORTACIÓN STREAMING
+# =========================================================
+
+@offline_payments
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+        self.user = User.objects.create_user('cliente')
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        other, other_courts = create_catalog()
+        self.reservations = [
+            Reservation.objects.create(
+                court=self.courts[i % 2], user=self.user, start_time=local_dt(1, 8 + i), end_time=local_dt(1, 9 + i),
+                subtotal_court=Decimal('60.00')
+            )
+            for i in range(5)
+        ]
+        Reservation.objects.create(
+            court=other_courts[0], user=self.user, start_time=local_dt(1, 8), end_time=local_dt(1, 9)
+        )
+
+    def test_csv_streams_filtered_rows_in_one_query(self):
+        import csv
+
+        self.client.force_login(self.admin)
+        day = timezone.localdate() + datetime.timedelta(days=1)
+        with self.assertNumQueries(3):  # sesión + usuario + un único SELECT al consumir el stream
+            response = self.client.get('/api/reservations/export/', {
+                'company': self.company.id, 'from': day.isoformat(), 'to': day.isoformat()
+            })
+            self.assertTrue(response.streaming)
+            body = b''.join(response.streaming_content).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(f'company-{self.company.id}', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([int(row['id']) for row in rows], [r.id for r in self.reservations])
+        self.assertEqual(rows[0]['total_price'], '60.00')
+        self.assertEqual(rows[0]['start_time'], timezone.localtime(self.reservations[0].start_time).isoformat())
+
+    def test_payments_jsonl_and_validation(self):
+        from core.models import Payment
+
+        Payment.objects.create(reservation=self.reservations[0], amount=Decimal('30.00'), payment_method='cash')
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/payments/export/', {'company': self.company.id, 'output': 'jsonl'})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual((lines[0]['reservation_id'], lines[0]['amount']), (self.reservations[0].id, '30.00'))
+
+        self.assertEqual(self.client.get('/api/payments/export/', {'output': 'xlsx'}).status_code, 400)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/reservations/export/').status_code, 403)
+
+
+# =========================================================
+#  IMPORTACIÓN MASIVA DEL CATÁLOGO
+# =========================================================
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        license = License.objects.create(start_date=datetime.date(2020, 1, 1), end_date=datetime.date(2030, 1, 1))
+        self.company = Company.objects.create(name="Club Nuevo", license=license)
+        self.admin = User.objects.create_user('admin', is_staff=True)
+        self.spec = {
+            "business_hours": [{"weekday": day, "open_time": "08:00", "close_time": "23:00"} for day in range(7)],
+            "court_types": [{"name": "Fútbol 5"}, {"name": "Pádel"}],
+            "time_slots": [
+                {"name": "Día", "start_time": "08:00", "end_time": "18:00"},
+                {"name": "Noche", "start_time": "18:00", "end_time": "23:00"},
+            ],
+            "courts": [{"name": f"Cancha {i}", "court_type": "Fútbol 5" if i % 2 else "Pádel"} for i in range(1, 41)],
+            "prices": [
+                {"court_type": court_type, "time_slot": slot, "price": price}
+                for court_type in ("Fútbol 5", "Pádel") for slot, price in (("Día", "50"), ("Noche", "80.5"))
+            ],
+        }
+
+    def test_json_import_writes_everything_in_bulk(self):
+        from core.catalog_import import import_catalog, parse_json_spec
+        from core.models import BusinessHour, CourtTypePrice
+
+        with self.assertNumQueries(3 + 5 + 2):  # lecturas + un INSERT por tabla + savepoint
+            counts = import_catalog(self.company, parse_json_spec(self.spec))
+        self.assertEqual(counts, {'business_hours': 7, 'court_types': 2, 'time_slots': 2, 'courts': 40, 'prices': 4})
+        self.assertEqual(self.company.courts.filter(court_type__name="Pádel").count(), 20)
+        self.assertEqual(BusinessHour.objects.filter(company=self.company).count(), 7)
+
+        court = self.company.courts.get(name="Cancha 1")
+        start = local_dt(1, 17)
+        self.assertEqual(quote_price(court, start, start + datetime.timedelta(hours=2), with_breakdown=False)[0],
+                         Decimal('130.50'))
+
+        # Re-importar las tarifas las actualiza en vez de duplicarlas
+        import_catalog(self.company, parse_json_spec({"prices": [
+            {"court_type": "Pádel", "time_slot": "Día", "price": "55"}
+        ]}))
+        self.assertEqual(CourtTypePrice.objects.filter(court_type__name="Pádel").count(), 2)
+        self.assertEqual(CourtTypePrice.objects.get(court_type__name="Pádel", time_slot__name="Día").price, Decimal('55'))
+
+    def test_api_reports_row_errors_and_writes_nothing(self):
+        self.spec["time_slots"].append({"name": "Tarde", "start_time": "17:00", "end_time": "19:00"})
+        self.spec["courts"][3]["court_type"] = "Tenis"
+        self.spec["prices"][0]["price"] = "-1"
+
+        self.client.force_login(self.admin)
+        url = f'/api/companies/{self.company.id}/catalog-import/'
+        response = self.client.post(url, self.spec, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            [(error['section'], error['row']) for error in response.json()['errors']],
+            [('time_slots', 3), ('courts', 4), ('prices', 1)]
+        )
+        self.assertFalse(self.company.courts.exists())
+
+    def test_overnight_hours_and_slots(self):
+        from core.catalog_import import CatalogImportError, import_catalog, parse_json_spec
+
+        TimeSlot.objects.create(company=self.company, name="Trasnoche", start_time=datetime.time(23), end_time=datetime.time(1))
+        self.spec["business_hours"] = [
+            {"weekday": 4, "open_time": "18:00", "close_time": "02:00"},
+            {"weekday": 5, "open_time": "10:00", "close_time": "00:00"},
+        ]
+        counts = import_catalog(self.company, parse_json_spec(self.spec))
+        self.assertEqual((counts['business_hours'], counts['time_slots']), (2, 2))
+
+        # Una franja nocturna nueva choca con la existente después de medianoche
+        with self.assertRaises(CatalogImportError) as raised:
+            import_catalog(self.company, parse_json_spec({"time_slots": [
+                {"name": "Madrugada", "start_time": "00:30", "end_time": "06:00"},
+                {"name": "Cierre", "start_time": "22:00", "end_time": "23:30"},
+                {"name": "Vacía", "start_time": "09:00", "end_time": "09:00"},
+            ]}))
+        self.assertEqual([error['row'] for error in raised.exception.errors], [1, 2, 3])
+
+    def test_csv_upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        content = (
+            "kind,name,weekday,open_time,close_time,start_time,end_time,court_type,time_slot,price,is_active\n"
+            "business_hour,,0,08:00,22:00,,,,,,\n"
+            "court_type,Tenis,,,,,,,,,\n"
+            "time_slot,Todo el día,,,,08:00,22:00,,,,\n"
+            "court,Central,,,,,,Tenis,,,no\n"
+            "price,,,,,,,Tenis,Todo el día,40,\n"
+        )
+        self.client.force_login(self.admin)
+        url = f'/api/companies/{self.company.id}/catalog-import/'
+        upload = SimpleUploadedFile('catalogo.csv', content.encode(), content_type='text/csv')
+        response = self.client.post(url, {'file': upload})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['imported']['courts'], 1)
+        self.assertFalse(self.company.courts.get(name="Central").is_active)
+
+
+# =========================================================
+#  DATOS SINTÉTICOS Y SUITE DE BENCHMARKS
+# =========================================================
+
+class BenchmarkSuiteTests(TestCase):
+    def test_seed_is_reproducible_and_suite_leaves_no_trace(self):
+        from core.benchmarks import build_context, compare, flush_bench_data, seed, run_suite
+
+        counts = seed(companies=1, courts_per_company=2, days=4, per_court_day=3, users=5)
+        self.assertEqual(counts['reservations'], 1 * 2 * 4 * 3)
+        first = list(Reservation.objects.order_by('id').values_list('court__name', 'start_time', 'status'))
+        flush_bench_data()
+        self.assertFalse(Reservation.objects.exists())
+        seed(companies=1, courts_per_company=2, days=4, per_court_day=3, users=5)
+        self.assertEqual(list(Reservation.objects.order_by('id').values_list('court__name', 'start_time', 'status')), first)
+
+        result = run_suite(build_context(), iterations=2, warmup=1)
+        self.assertEqual(set(result['results']), {'court_availability', 'company_availability', 'quote', 'create', 'webhook'})
+        self.assertTrue(all(r['errors'] == 0 and r['queries'] > 0 for r in result['results'].values()))
+        self.assertEqual(Reservation.objects.count(), 24)  # Todo lo escrito por la suite se revierte
+
+        baseline = json.loads(json.dumps(result))
+        self.assertFalse(any(row['regression'] for row in compare(result, baseline)))
+        baseline['results']['quote']['queries'] -= 1
+        self.assertEqual([row['scenario'] for row in compare(result, baseline) if row['regression']], ['quote'])
+
+
+# =========================================================
+#  MÉTRICAS Y LOGS POR REQUEST
+# =========================================================
+
+@offline_payments
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.company, self.courts = create_catalog()
+
+    def test_request_metrics_and_structured_log(self):
+        from core.gateway import get_gateway
+        from core import fakes
+
+        url = f'/api/courts/{self.courts[0].id}/availability/'
+        with self.assertLogs('core.requests', level='INFO') as logs:
+            response = self.client.get(url, {'date': (timezone.localdate() + datetime.timedelta(days=1)).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line['route'], line['status'], line['path']), ('court-availability', 200, url))
+        self.assertGreater(line['db_queries'], 0)
+
+        fakes.reset()
+        get_gateway().create_preference({"external_reference": "1"})
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="court-availability",status="200"}', body)
+        self.assertIn('http_request_db_queries_bucket{method="GET",route="court-availability",status="200",le="+Inf"}', body)
+        self.assertIn('payment_gateway_request_duration_seconds_count{operation="create_preference",outcome="201"}', body)
+
+    @override_settings(METRICS_TOKEN='secreto')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='', DEBUG=False, METRICS_ALLOWED_IPS=['127.0.0.1'])
+    def test_metrics_without_token_only_answer_internal_ips(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 403)
+
+
+# =========================================================
+#  DETECTOR DE N+1 Y PRESUPUESTOS DE CONSULTAS
+# =========================================================
+
+class QueryChecksTests(TestCase):
+    def setUp(self):
+        for _ in range(4):
+            company, courts = create_catalog()
+        self.courts = courts
+        self.admin = User.objects.create_superuser('admin', 'admin@test.com', 'x')
+
+    def test_budget_reports_repeated_shapes_with_call_site(self):
+        from core.catalog import court_type_queryset
+        from core.models import CourtType
+        from core.query_checks import QueryBudgetExceeded, query_budget, query_shape
+        from core.serializers import CourtTypeSerializer
+
+        self.assertEqual(
+            query_shape('SELECT * FROM t WHERE id = %s AND code IN (%s, %s) LIMIT 21'),
+            query_shape("SELECT * FROM t WHERE id = 7 AND code IN ('a', 'b', 'c') LIMIT 1"),
+        )
+        with self.assertRaises(QueryBudgetExceeded) as failure:
+            with query_budget(10):
+                CourtTypeSerializer(CourtType.objects.order_by('id'), many=True).data
+        self.assertIn('consultas repetidas', str(failure.exception))
+        self.assertIn('core/serializers/CourtSerializer.py', str(failure.exception))
+
+        with query_budget(2):
+            CourtTypeSerializer(court_type_queryset(), many=True).data
+
+    def test_reservation_reads_advance_percentage_without_loading_court_and_company(self):
+        reservation = Reservation(court_id=self.courts[0].pk, user=self.admin)
+        with self.assertNumQueries(1):  # Antes: cancha + empresa
+            self.assertEqual(reservation.advance_payment_percentage(), 50)
+        reservation.court = Court.objects.select_related('company').get(pk=self.courts[0].pk)
+        with self.assertNumQueries(0):
+            reservation.advance_payment_percentage()
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_budgets_ignore_the_database_cache_table(self):
+        from django.core.management import call_command
+
+        # Como en desarrollo sin CACHE_URL: las versiones se leen de la tabla core_cache
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'core_cache'
+        }}):
+            call_command('createcachetable', verbosity=0)
+            company_id = self.courts[0].company_id
+            day = local_dt(1, 0).date().isoformat()
+            for url in ('/api/companies/', f'/api/companies/{company_id}/',
+                        f'/api/companies/{company_id}/availability/?from={day}',
+                        f'/api/courts/?company={company_id}', f'/api/courts/{self.courts[0].id}/',
+                        f'/api/courts/{self.courts[0].id}/availability/?date={day}'):
+                for _ in range(2):  # en frío y con el caché caliente
+                    self.assertEqual(self.client.get(url).status_code, 200, url)
+
+    @override_settings(QUERY_INSPECTOR=True, QUERY_INSPECTOR_RAISE=True)
+    def test_admin_changelists_have_no_per_row_queries(self):
+        for court in Court.objects.all():
+            Reservation.objects.create(court=court, user=self.admin, start_time=local_dt(2, 10), end_time=local_dt(2, 11))
+        self.client.force_login(self.admin)
+        for model in ('company', 'license', 'court', 'courttype', 'timeslot', 'reservation'):
+            response = self.client.get(f'/admin/core/{model}/')
+            self.assertEqual(response.status_code, 200, model)
+            self.assertIn('X-Query-Count', response)
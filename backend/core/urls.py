@@ -4,6 +4,8 @@ from .routers import router
 # --- AGREGAR ESTA IMPORTACIÓN ---
 # OJO: Respetando las mayúsculas de tu archivo WebHookViews.py
 from core.views.WebHookViews import MercadoPagoWebhookView
+from core.views.StreamViews import availability_stream
+from core.views import AsyncViews
 
 urlpatterns = [
     # 1. Aquí se cargan todas las rutas del router (reservations, courts, etc.)
@@ -12,4 +14,12 @@ urlpatterns = [
     # 2. --- AGREGAR ESTA RUTA MANUAL ---
     # Esta es la dirección que le diste a Ngrok y a Mercado Pago
     path('webhooks/mercadopago/', MercadoPagoWebhookView.as_view(), name='mp-webhook'),
+
+    # 3. Cambios de disponibilidad en tiempo real (Server-Sent Events, servidor ASGI)
+    path('stream/companies/<int:company_id>/availability/<str:day>/', availability_stream, name='availability-stream'),
+
+    # 4. Versiones async (ASGI) de las lecturas más frecuentes: mismas respuestas
+    path('async/courts/<int:court_id>/availability/', AsyncViews.court_availability, name='async-court-availability'),
+    path('async/companies/<int:company_id>/availability/', AsyncViews.company_availability, name='async-company-availability'),
+    path('async/reservations/quote/', AsyncViews.quote, name='async-quote'),
 ]
\ No newline at end of file
@@ -0,0 +1,91 @@
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+# =========================================================
+#  CONTADORES DE VERSIÓN
+# =========================================================
+# Cada "scope" (pricing, catalog, ...) tiene un contador por empresa que
+# se incrementa cuando cambian los datos. Los cachés comparan la versión
+# guardada con la actual para saber si deben reconstruirse.
+# El valor es un timestamp en microsegundos: crece aunque el contador se
+# pierda (reinicio del caché) y se reinicialice.
+
+VERSION_TIMEOUT = None  # Sin expiración
+
+
+def _cache_key(scope, key):
+    return f"version:{scope}:{key}"
+
+
+def _now_version():
+    return time.time_ns() // 1000
+
+
+def get_version(scope, key='all'):
+    cache_key = _cache_key(scope, key)
+    version = cache.get(cache_key)
+    if version is None:
+        # Primera lectura: inicializamos sin pisar a otro proceso
+        cache.add(cache_key, _now_version(), VERSION_TIMEOUT)
+        version = cache.get(cache_key)
+    return version
+
+
+def _increment(scope, key):
+    cache_key = _cache_key(scope, key)
+    previous = cache.get(cache_key) or 0
+    version = max(_now_version(), previous + 1)
+    cache.set(cache_key, version, VERSION_TIMEOUT)
+    return version
+
+
+def bump_version(scope, key='all'):
+    """
+    Incrementa la versión ahora y otra vez al confirmar la transacción: un lector
+    concurrente que alcance a cachear datos viejos con la versión intermedia
+    queda invalidado por el segundo incremento.
+    """
+    version = _increment(scope, key)
+    transaction.on_commit(lambda: _increment(scope, key))
+    return version
+
+
+def get_versions(stamps):
+    """
+    Versiones de varios (scope, key) en una sola lectura del caché.
+    Devuelve {(scope, key): versión}.
+    """
+    keys = {_cache_key(scope, key): (scope, key) for scope, key in stamps}
+    found = cache.get_many(list(keys))
+    versions = {}
+    for cache_key, stamp in keys.items():
+        version = found.get(cache_key)
+        versions[stamp] = version if version is not None else get_version(*stamp)
+    return versions
+
+
+async def aget_version(scope, key='all'):
+    cache_key = _cache_key(scope, key)
+    version = await cache.aget(cache_key)
+    if version is None:
+        await cache.aadd(cache_key, _now_version(), VERSION_TIMEOUT)
+        version = await cache.aget(cache_key)
+    return version
+
+
+async def aget_versions(stamps):
+    """Versión async de get_versions() para las vistas ASGI."""
+    keys = {_cache_key(scope, key): (scope, key) for scope, key in stamps}
+    found = await cache.aget_many(list(keys))
+    versions = {}
+    for cache_key, stamp in keys.items():
+        version = found.get(cache_key)
+        versions[stamp] = version if version is not None else await aget_version(*stamp)
+    return versions
+
+
+def bump_company_version(scope, company_id):
+    """Incrementa la versión de la empresa y la global del scope (usada por listados)."""
+    bump_version(scope, company_id)
+    bump_version(scope, 'all')
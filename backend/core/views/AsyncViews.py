@@ -0,0 +1,132 @@
+import json
+from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.availability import abuild_company_grid, parse_grid_range, serialize_business_hours, serialize_slot
+from core.conditional import aconditional_response
+from core.models import BusinessHour, Company, Court, Reservation
+from core.pricing import aquote_price
+from core.serializers import QuoteSerializer
+
+# =========================================================
+#  VISTAS ASYNC (ASGI) DE LOS CAMINOS DE LECTURA MÁS USADOS
+# =========================================================
+# Mismas respuestas que CourtViewSet.availability, CompanyViewSet.availability
+# y ReservationViewSet.quote, pero como vistas async de Django con el ORM async:
+# bajo config/asgi.py una request esperando a la BD no ocupa un thread del
+# servidor. Bajo WSGI también funcionan (Django las ejecuta en un event loop
+# por request), pero sin ventaja. Comparar con 'manage.py bench_asgi'.
+
+
+def json_response(data, status=200):
+    # El encoder de DRF: mismo JSON (Decimal, fechas) que las vistas sync
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def not_found():
+    return json_response({"detail": "No encontrado."}, status=404)
+
+
+@require_GET
+async def court_availability(request, court_id):
+    """GET /api/async/courts/1/availability/?date=2023-11-28"""
+    return await aconditional_response(
+        request,
+        [('reservations', f"court:{court_id}"), ('company', 'all'), ('catalog', 'all')],
+        lambda: _court_availability(request, court_id)
+    )
+
+
+async def _court_availability(request, court_id):
+    court = await Court.objects.filter(pk=court_id, is_active=True).afirst()
+    if court is None:
+        return not_found()
+
+    date_str = request.GET.get('date')
+    if not date_str:
+        return json_response({"error": "El parámetro 'date' (YYYY-MM-DD) es obligatorio."}, status=400)
+    try:
+        target_date = parse_date(date_str)
+    except ValueError:
+        target_date = None
+    if not target_date:
+        return json_response({"error": "Formato de fecha inválido."}, status=400)
+
+    reservations = Reservation.objects.filter(
+        court=court,
+        start_time__date=target_date,
+        status__in=Reservation.ACTIVE_STATUSES
+    ).values('start_time', 'end_time', 'status')
+    booked_slots = [
+        serialize_slot(res['start_time'], res['end_time'], res['status'])
+        async for res in reservations
+    ]
+    business_hours = await BusinessHour.objects.filter(
+        company_id=court.company_id, weekday=target_date.weekday()
+    ).afirst()
+
+    return json_response({
+        "court_id": court.id,
+        "date": date_str,
+        "business_hours": serialize_business_hours(business_hours),
+        "booked_slots": booked_slots
+    })
+
+
+@require_GET
+async def company_availability(request, company_id):
+    """GET /api/async/companies/1/availability/?from=2023-11-27&to=2023-12-03"""
+    return await aconditional_response(
+        request,
+        [('company', company_id), ('catalog', company_id), ('reservations', company_id)],
+        lambda: _company_availability(request, company_id)
+    )
+
+
+async def _company_availability(request, company_id):
+    company = await Company.objects.filter(pk=company_id).afirst()
+    if company is None:
+        return not_found()
+    try:
+        first_day, page_last_day, next_params = parse_grid_range(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+
+    response_data = await abuild_company_grid(company, first_day, page_last_day)
+    response_data['next'] = (
+        request.build_absolute_uri(f"{request.path}?{next_params.urlencode()}") if next_params else None
+    )
+    return json_response(response_data)
+
+
+@csrf_exempt  # Solo cotiza: no modifica nada
+@require_POST
+async def quote(request):
+    """POST /api/async/reservations/quote/ con el mismo cuerpo que /api/reservations/quote/."""
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return json_response({"error": "JSON inválido."}, status=400)
+
+    serializer = QuoteSerializer(data=payload)
+    if not serializer.is_valid():
+        return json_response(serializer.errors, status=400)
+
+    data = serializer.validated_data
+    court = await Court.objects.filter(pk=data['court_id']).afirst()
+    if court is None:
+        return not_found()
+    start_dt = data['start_time']
+    end_dt = data['end_time']
+
+    total_price, breakdown = await aquote_price(court, start_dt, end_dt)
+    return json_response({
+        "court_name": court.name,
+        "total_price": total_price,
+        "currency": "PEN",
+        "duration_hours": (end_dt - start_dt).total_seconds() / 3600,
+        "breakdown": breakdown
+    })
@@ -1,7 +1,188 @@
-from rest_framework import viewsets
+import datetime
+import json
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
 from core.models import Company
-from core.serializers import CompanySerializer
+from core.serializers import CompanySerializer, NearbyCompanySerializer
+from core.availability import build_company_grid, parse_day, parse_grid_range, MAX_GRID_DAYS
+from core.geo import nearby_companies, MAX_RADIUS_KM, MAX_RESULTS
+from core.occupancy import get_masks, mask_to_hex, SLOT_MINUTES
+from core.rollups import build_report
+from core.conditional import ConditionalGetMixin
+from core.catalog_import import CatalogImportError, import_catalog, parse_csv_spec, parse_json_spec
+from core.query_checks import query_budget
 
-class CompanyViewSet(viewsets.ReadOnlyModelViewSet):
+class CompanyViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Company.objects.all()
-    serializer_class = CompanySerializer
\ No newline at end of file
+    serializer_class = CompanySerializer
+
+    @query_budget(2)
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, [('company', 'all')],
+            lambda: super(CompanyViewSet, self).list(request, *args, **kwargs)
+        )
+
+    @query_budget(1)
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, [('company', self.kwargs['pk'])],
+            lambda: super(CompanyViewSet, self).retrieve(request, *args, **kwargs)
+        )
+
+    @action(detail=False, methods=['get'])
+    @query_budget(2)
+    def nearby(self, request):
+        """
+        Empresas cercanas ordenadas por distancia.
+        Uso: GET /api/companies/nearby/?lat=-34.60&lng=-58.38&radius=10
+        radius en km (por defecto 10, máximo MAX_RADIUS_KM); limit opcional.
+        """
+        try:
+            lat = float(request.query_params['lat'])
+            lng = float(request.query_params['lng'])
+            radius = float(request.query_params.get('radius', 10))
+            limit = int(request.query_params.get('limit', MAX_RESULTS))
+        except KeyError:
+            return Response(
+                {"error": "Los parámetros 'lat' y 'lng' son obligatorios."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except ValueError:
+            return Response(
+                {"error": "Parámetros numéricos inválidos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or not (0 < radius <= MAX_RADIUS_KM) or limit < 1:
+            return Response(
+                {"error": f"Coordenadas fuera de rango o radio no válido (máximo {MAX_RADIUS_KM} km)."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return self.conditional_response(
+            request, [('company', 'all')],
+            lambda: Response(NearbyCompanySerializer(
+                nearby_companies(lat, lng, radius, min(limit, MAX_RESULTS)), many=True
+            ).data)
+        )
+
+    @action(detail=True, methods=['get'])
+    @query_budget(4)
+    def availability(self, request, pk=None):
+        """
+        Grilla de disponibilidad de todas las canchas activas de la empresa.
+        Uso: GET /api/companies/1/availability/?from=2023-11-27&to=2023-12-03
+
+        Si el rango supera MAX_GRID_DAYS días se devuelve paginado:
+        'next' trae la URL de la siguiente página.
+        """
+        company_id = self.kwargs['pk']
+        return self.conditional_response(
+            request,
+            [('company', company_id), ('catalog', company_id), ('reservations', company_id)],
+            lambda: self._availability(request)
+        )
+
+    def _availability(self, request):
+        company = self.get_object()
+        try:
+            first_day, page_last_day, next_params = parse_grid_range(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response_data = build_company_grid(company, first_day, page_last_day)
+        response_data['next'] = (
+            request.build_absolute_uri(f"{request.path}?{next_params.urlencode()}") if next_params else None
+        )
+        return Response(response_data)
+
+    @action(detail=True, methods=['get'])
+    @query_budget(3)
+    def occupancy(self, request, pk=None):
+        """
+        Mapas de ocupación compactos (un hex de 96 bits por cancha y día, bit 0 = 00:00-00:15).
+        Uso: GET /api/companies/1/occupancy/?from=2023-11-27&to=2023-12-03
+        """
+        company_id = self.kwargs['pk']
+        return self.conditional_response(
+            request,
+            [('catalog', company_id), ('reservations', company_id)],
+            lambda: self._occupancy(request)
+        )
+
+    def _occupancy(self, request):
+        company = self.get_object()
+        first_day = parse_day(request.query_params.get('from'))
+        last_day = parse_day(request.query_params.get('to')) if request.query_params.get('to') else first_day
+        if not first_day or not last_day or last_day < first_day:
+            return Response(
+                {"error": "Parámetros 'from'/'to' (YYYY-MM-DD) inválidos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        last_day = min(last_day, first_day + datetime.timedelta(days=MAX_GRID_DAYS - 1))
+
+        court_ids = list(company.courts.filter(is_active=True).order_by('id').values_list('id', flat=True))
+        masks = get_masks(court_ids, first_day, last_day)
+        days = [first_day + datetime.timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+        return Response({
+            "company_id": company.id,
+            "slot_minutes": SLOT_MINUTES,
+            "from": first_day.isoformat(),
+            "to": last_day.isoformat(),
+            "courts": {
+                court_id: {day.isoformat(): mask_to_hex(masks[(court_id, day)]) for day in days}
+                for court_id in court_ids
+            }
+        })
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAdminUser])
+    @query_budget(2)
+    def report(self, request, pk=None):
+        """
+        Ocupación e ingresos por día, cancha y franja horaria (desde los resúmenes diarios).
+        Uso: GET /api/companies/1/report/?from=2023-11-01&to=2023-11-30
+        """
+        company = self.get_object()
+        first_day = parse_day(request.query_params.get('from'))
+        last_day = parse_day(request.query_params.get('to')) if request.query_params.get('to') else first_day
+        if not first_day or not last_day or last_day < first_day:
+            return Response(
+                {"error": "Parámetros 'from'/'to' (YYYY-MM-DD) inválidos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if (last_day - first_day).days > 366:
+            return Response({"error": "El rango máximo es de un año."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(build_report(company.id, first_day, last_day))
+
+    @action(detail=True, methods=['post'], url_path='catalog-import', permission_classes=[IsAdminUser])
+    def catalog_import(self, request, pk=None):
+        """
+        Importa horarios, tipos, canchas, franjas y tarifas en una sola transacción.
+        Uso: POST /api/companies/1/catalog-import/ con el JSON en el body,
+             o multipart con un archivo 'file' (.csv o .json). ?dry_run=1 solo valida.
+        400 con 'errors' (uno por fila) si algo no es válido; no se escribe nada.
+        """
+        company = self.get_object()
+        upload = request.FILES.get('file')
+        try:
+            if upload is None:
+                rows = parse_json_spec(request.data)
+            else:
+                content = upload.read().decode('utf-8-sig')
+                if upload.name.lower().endswith('.csv'):
+                    rows = parse_csv_spec(content)
+                else:
+                    rows = parse_json_spec(json.loads(content))
+            dry_run = request.query_params.get('dry_run') in ('1', 'true')
+            counts = import_catalog(company, rows, dry_run=dry_run)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return Response({"error": "El archivo no es un CSV/JSON UTF-8 válido."}, status=status.HTTP_400_BAD_REQUEST)
+        except CatalogImportError as e:
+            return Response({"error": e.message, "errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {"dry_run": dry_run, "imported": counts},
+            status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED
+        )
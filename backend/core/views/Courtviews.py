@@ -1,21 +1,156 @@
-from rest_framework import viewsets
-from core.models import Court
-from core.serializers import CourtSerializer
+import datetime
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
-from django.utils.dateparse import parse_date
-from core.models import Court, Reservation
 from rest_framework.response import Response
 
-class CourtViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Court.objects.filter(is_active=True).select_related('court_type', 'company')
+from core.models import Court, Reservation
+from core.serializers import CourtSerializer
+from core.availability import serialize_business_hours, serialize_slot
+from core.catalog import court_queryset, get_court_catalog
+from core.conditional import ConditionalGetMixin
+from core.geo import nearby_companies, MAX_RADIUS_KM
+from core.search import find_free_slots, MAX_SEARCH_DAYS, MAX_SEARCH_RESULTS, DEFAULT_STEP_MINUTES
+from core.query_checks import query_budget
+
+
+def parse_moment(value, end_of_day=False):
+    """Acepta 'YYYY-MM-DD' o un datetime ISO. Devuelve un datetime aware o None."""
+    try:
+        day = parse_date(value)
+        moment = None if day is not None else parse_datetime(value)
+    except ValueError:
+        return None
+    if day is not None:
+        if end_of_day:
+            day += datetime.timedelta(days=1)
+        moment = datetime.datetime.combine(day, datetime.time.min)
+    if moment is None:
+        return None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class CourtViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = court_queryset()
     serializer_class = CourtSerializer
 
+    def get_queryset(self):
+        # La disponibilidad no serializa precios: evitamos el prefetch
+        if self.action == 'availability':
+            return Court.objects.filter(is_active=True).select_related('company')
+        return super().get_queryset()
+
+    @query_budget(3)
+    def list(self, request, *args, **kwargs):
+        """
+        Con ?company=<id> se sirve el catálogo cacheado de la empresa
+        (invalidado por signals); sin filtro, el listado con prefetch.
+        """
+        company_id = request.query_params.get('company')
+        if not company_id:
+            return self.conditional_response(
+                request, [('catalog', 'all')],
+                lambda: super(CourtViewSet, self).list(request, *args, **kwargs)
+            )
+        if not company_id.isdigit():
+            return Response({"error": "'company' debe ser un ID numérico."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return self.conditional_response(
+            request, [('catalog', int(company_id))],
+            lambda: self._company_catalog(int(company_id))
+        )
+
+    def _company_catalog(self, company_id):
+        catalog = get_court_catalog(company_id)
+        page = self.paginate_queryset(catalog)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(catalog)
+
+    @query_budget(3)
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, [('catalog', 'all')],
+            lambda: super(CourtViewSet, self).retrieve(request, *args, **kwargs)
+        )
+
+    @action(detail=False, methods=['get'], url_path='next-available')
+    @query_budget(6)  # empresas cercanas (2) + canchas, horarios, ocupación y tarifarios
+    def next_available(self, request):
+        """
+        Primeros turnos libres de una duración dada, en todas las canchas que cumplan los filtros.
+        Uso: GET /api/courts/next-available/?duration=90&from=2023-11-27&to=2023-11-28
+             &court_type=Fútbol 7&company=1&lat=-34.6&lng=-58.4&radius=10&limit=10
+        'from'/'to' aceptan fecha o fecha-hora; sin 'to' se busca MAX_SEARCH_DAYS días.
+        """
+        params = request.query_params
+        try:
+            duration = int(params.get('duration', 60))
+            limit = min(int(params.get('limit', 10)), MAX_SEARCH_RESULTS)
+            step = int(params.get('step', DEFAULT_STEP_MINUTES))
+        except ValueError:
+            return Response({"error": "Parámetros numéricos inválidos."}, status=status.HTTP_400_BAD_REQUEST)
+        if not (15 <= duration <= 24 * 60) or limit < 1 or not (5 <= step <= 120):
+            return Response(
+                {"error": "'duration' va de 15 a 1440 minutos y 'step' de 5 a 120."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        window_start = parse_moment(params['from']) if params.get('from') else timezone.now()
+        if window_start is None:
+            return Response({"error": "Formato de fecha inválido en 'from'."}, status=status.HTTP_400_BAD_REQUEST)
+        max_end = window_start + datetime.timedelta(days=MAX_SEARCH_DAYS)
+        window_end = parse_moment(params['to'], end_of_day=True) if params.get('to') else max_end
+        if window_end is None:
+            return Response({"error": "Formato de fecha inválido en 'to'."}, status=status.HTTP_400_BAD_REQUEST)
+        window_end = min(window_end, max_end)
+
+        company_ids = None
+        if params.get('company'):
+            if not params['company'].isdigit():
+                return Response({"error": "'company' debe ser un ID numérico."}, status=status.HTTP_400_BAD_REQUEST)
+            company_ids = {int(params['company'])}
+        if params.get('lat') or params.get('lng'):
+            try:
+                lat, lng = float(params['lat']), float(params['lng'])
+                radius = min(float(params.get('radius', 10)), MAX_RADIUS_KM)
+            except (KeyError, ValueError):
+                return Response(
+                    {"error": "'lat' y 'lng' deben enviarse juntos y ser numéricos."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            nearby = {company.id for company in nearby_companies(lat, lng, radius)}
+            company_ids = nearby if company_ids is None else company_ids & nearby
+
+        results = find_free_slots(
+            duration, window_start, window_end,
+            court_type=params.get('court_type'), company_ids=company_ids,
+            limit=limit, step_minutes=step,
+        )
+        return Response({
+            "duration": duration,
+            "from": timezone.localtime(window_start).isoformat(),
+            "to": timezone.localtime(window_end).isoformat(),
+            "results": results,
+        })
+
     @action(detail=True, methods=['get'])
+    @query_budget(3)
     def availability(self, request, pk=None):
         """
         Devuelve las reservas existentes para una fecha específica.
         Uso: GET /api/courts/1/availability/?date=2023-11-28
         """
+        return self.conditional_response(
+            request,
+            [('reservations', f"court:{pk}"), ('company', 'all'), ('catalog', 'all')],
+            lambda: self._availability(request)
+        )
+
+    def _availability(self, request):
         court = self.get_object()
         date_str = request.query_params.get('date')
 
@@ -37,17 +172,14 @@ class CourtViewSet(viewsets.ReadOnlyModelViewSet):
         reservations = Reservation.objects.filter(
             court=court,
             start_time__date=target_date,
-            status__in=['pending', 'confirmed', 'completed']
+            status__in=Reservation.ACTIVE_STATUSES
         ).values('start_time', 'end_time', 'status')
 
         # 2. Formateamos la respuesta para que el Frontend la entienda fácil
-        booked_slots = []
-        for res in reservations:
-            booked_slots.append({
-                "start": res['start_time'].strftime('%H:%M'),
-                "end": res['end_time'].strftime('%H:%M'),
-                "status": res['status']
-            })
+        booked_slots = [
+            serialize_slot(res['start_time'], res['end_time'], res['status'])
+            for res in reservations
+        ]
 
         # 3. Obtenemos el horario de atención de la empresa para ese día de la semana
         # weekday(): Lunes=0, Domingo=6
@@ -57,11 +189,7 @@ class CourtViewSet(viewsets.ReadOnlyModelViewSet):
         response_data = {
             "court_id": court.id,
             "date": date_str,
-            "business_hours": {
-                "open": business_hours.open_time.strftime('%H:%M') if business_hours else None,
-                "close": business_hours.close_time.strftime('%H:%M') if business_hours else None,
-                "is_open": business_hours is not None
-            },
+            "business_hours": serialize_business_hours(business_hours),
             "booked_slots": booked_slots
         }
 
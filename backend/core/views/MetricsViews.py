@@ -0,0 +1,22 @@
+import hmac
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+
+from core.metrics import render_metrics
+
+
+@require_GET
+def metrics(request):
+    """
+    Métricas del proceso en formato de texto de Prometheus (ver core/metrics.py).
+    Con METRICS_TOKEN exige el Bearer; sin token, fuera de DEBUG, solo IPs internas.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        provided = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(provided, token):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG and request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
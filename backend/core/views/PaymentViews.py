@@ -0,0 +1,40 @@
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from core.models import Payment
+from core.serializers import PaymentSerializer, ApprovePaymentsSerializer
+from core.reservations import approve_payments
+from core.exports import parse_export_filters, payment_rows, export_response, PAYMENT_COLUMNS
+
+class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
+    """Pagos: solo para administradores."""
+    queryset = Payment.objects.all().order_by('-created_at')
+    serializer_class = PaymentSerializer
+    permission_classes = [IsAdminUser]
+
+    @action(detail=False, methods=['post'])
+    def approve(self, request):
+        """
+        Aprueba varios pagos en una sola transacción.
+        Uso: POST /api/payments/approve/ {"ids": [1, 2, 3]}
+        """
+        serializer = ApprovePaymentsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        approved = approve_payments(serializer.validated_data['ids'], request.user)
+        return Response({"approved": approved})
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Exportación completa en streaming, ordenada por fecha de registro.
+        Uso: GET /api/payments/export/?company=1&from=2023-11-01&to=2023-11-30&output=csv|jsonl
+        """
+        try:
+            filters = parse_export_filters(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = payment_rows(filters['company_id'], filters['first_day'], filters['last_day'])
+        return export_response('payments', PAYMENT_COLUMNS, rows, filters)
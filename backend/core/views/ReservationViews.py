@@ -1,24 +1,100 @@
+import logging
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
 from django.shortcuts import get_object_or_404
-from django.db import transaction
-from decimal import Decimal
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction, IntegrityError
 import dateutil.parser
-import datetime
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 # Modelos y Serializers (Ajustado)
-from core.models import Reservation, Court, CourtTypePrice
-from core.serializers.ReservationSerializer import ReservationSerializer, QuoteSerializer # Asumimos 'reservation.py'
+from core.models import Reservation, Court, PaymentOutbox
+from core.serializers.ReservationSerializer import ReservationSerializer, QuoteSerializer, AttachAddOnsSerializer, SeriesBookingSerializer # Asumimos 'reservation.py'
 
 # Servicios (Para Mercado Pago)
-from core.services import create_payment_preference
+from core.outbox import enqueue_payment_preference
+from core.pricing import quote_price
+from core.availability import day_bounds
+from core.pagination import ReservationCursorPagination
+from core.reservations import attach_addons, void_reservations, InsufficientStock
+from core.series import create_series, occurrences, SeriesConflict
+from core.exports import parse_export_filters, reservation_rows, export_response, RESERVATION_COLUMNS
+from core.query_checks import query_budget
+
+logger = logging.getLogger('core.reservations')
+
+def is_overlap_error(error):
+    """True si el IntegrityError viene del constraint de solapamiento de reservas."""
+    return 'reservation_no_overlap' in str(error)
+
+def parse_list_filters(query_params):
+    """
+    Filtros del listado (todos opcionales):
+    ?court=1&company=2&status=pending,confirmed&from=2023-11-01&to=2023-11-30
+    Lanza ValueError con el mensaje para el cliente si algún parámetro es inválido.
+    """
+    filters = {}
+    for name in ('court', 'company'):
+        value = query_params.get(name)
+        if value:
+            if not value.isdigit():
+                raise ValueError(f"Parámetro '{name}' inválido.")
+            filters[name] = int(value)
+
+    if query_params.get('status'):
+        statuses = query_params['status'].split(',')
+        valid = {key for key, _ in Reservation.STATUS_CHOICES}
+        if not set(statuses) <= valid:
+            raise ValueError(f"Parámetro 'status' inválido (valores: {', '.join(sorted(valid))}).")
+        filters['status'] = statuses
+
+    for name in ('from', 'to'):
+        if query_params.get(name):
+            try:
+                day = parse_date(query_params[name])
+            except ValueError:  # Bien formada pero inexistente (2023-02-30)
+                day = None
+            if not day:
+                raise ValueError(f"Parámetro '{name}' (YYYY-MM-DD) inválido.")
+            filters[name] = day
+    if 'from' in filters and 'to' in filters and filters['to'] < filters['from']:
+        raise ValueError("'to' no puede ser anterior a 'from'.")
+    return filters
 
 class ReservationViewSet(viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
+    pagination_class = ReservationCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+
+        filters = self.list_filters
+        if 'court' in filters:
+            queryset = queryset.filter(court_id=filters['court'])
+        if 'company' in filters:
+            queryset = queryset.filter(court__company_id=filters['company'])
+        if 'status' in filters:
+            queryset = queryset.filter(status__in=filters['status'])
+        if 'from' in filters:
+            queryset = queryset.filter(start_time__gte=day_bounds(filters['from'], filters['from'])[0])
+        if 'to' in filters:
+            queryset = queryset.filter(start_time__lt=day_bounds(filters['to'], filters['to'])[1])
+        return queryset
 
+    def list(self, request, *args, **kwargs):
+        try:
+            self.list_filters = parse_list_filters(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
+
+    @query_budget(14)
     def create(self, request, *args, **kwargs):
         data = request.data
         
@@ -28,7 +104,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
             end_time = data.get('end_time')
             
             with transaction.atomic():
-                court = get_object_or_404(Court, pk=court_id)
+                court = get_object_or_404(Court.objects.select_related('company'), pk=court_id)
                 
                 # ... (Validación de Disponibilidad y Precios - sin cambios) ...
                 start_dt = dateutil.parser.parse(start_time)
@@ -40,12 +116,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 total_price, _ = self.calculate_complex_price(court, start_dt, end_dt)
                 
                 # C. Definir el usuario
-                user = request.user if request.user.is_authenticated else None
-                if not user:
-                    from django.contrib.auth.models import User
-                    user = User.objects.first()
-                    if not user:
-                         user = User.objects.create_user(username='invitado', email='invitado@test.com')
+                user = self.booking_user(request)
 
                 reservation = Reservation.objects.create(
                     court=court, user=user, start_time=start_dt, end_time=end_dt,
@@ -53,29 +124,167 @@ class ReservationViewSet(viewsets.ModelViewSet):
                     status='pending', amount_paid=0
                 )
                 
-                # D. INTEGRACIÓN MERCADO PAGO: Llamada al servicio
-                mp_result = create_payment_preference(reservation)
-                
-                # E. Si el servicio devolvió None, significa que falló en MP
-                if mp_result is None:
-                     raise Exception("Fallo en la pasarela de pago (Verificar logs de MP en Django).")
-
-                # Respuesta con los datos de MP
-                response_data = ReservationSerializer(reservation).data
-                response_data['preference_id'] = mp_result.get("id")
-                response_data['payment_url'] = mp_result.get("sandbox_init_point")
-                
-                return Response(response_data, status=status.HTTP_201_CREATED)
+                # D. INTEGRACIÓN MERCADO PAGO: se encola en el outbox (misma transacción).
+                # La preferencia se crea fuera de la transacción (core/outbox.py) y el
+                # cliente consulta GET /api/reservations/{id}/payment/ hasta tener la URL.
+                enqueue_payment_preference(reservation)
+
+            response_data = ReservationSerializer(reservation).data
+            response_data['preference_id'] = None
+            response_data['payment_url'] = None
+            response_data['payment_status'] = 'pending'
+            response_data['payment_status_url'] = request.build_absolute_uri(
+                f"/api/reservations/{reservation.id}/payment/"
+            )
+            return Response(response_data, status=status.HTTP_201_CREATED)
+
+        except IntegrityError as e:
+            # PostgreSQL rechazó la reserva: otra reserva activa ocupa ese horario
+            if is_overlap_error(e):
+                return Response(
+                    {"error": "La cancha ya está reservada en ese horario."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            logger.error(f"Error al crear la reserva: {e}")
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         except Exception as e:
             # Ahora el error se propagará con el mensaje que generamos
-            print(f"❌ ERROR FATAL AL CREAR RESERVA: {str(e)}")
+            logger.exception(f"Error al crear la reserva: {e}")
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+    def booking_user(self, request):
+        """Usuario de la reserva (invitado si no hay sesión)."""
+        user = request.user if request.user.is_authenticated else None
+        if not user:
+            from django.contrib.auth.models import User
+            user = User.objects.first()
+            if not user:
+                 user = User.objects.create_user(username='invitado', email='invitado@test.com')
+        return user
+
+    @action(detail=False, methods=['post'])
+    @query_budget(13)
+    def series(self, request):
+        """
+        Reserva recurrente con un solo pago.
+        Uso: POST /api/reservations/series/
+             {"court": 1, "start_time": "...", "end_time": "...", "count": 12}
+        409 con 'conflicts' (una entrada por fecha ocupada) si alguna fecha choca
+        y no se pidió skip_conflicts.
+        """
+        serializer = SeriesBookingSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+        court = get_object_or_404(Court.objects.select_related('company'), pk=data['court'], is_active=True)
+
+        dates = occurrences(
+            data['start_time'], data['end_time'], data['interval_weeks'],
+            count=data.get('count'), until=data.get('until')
+        )
+        if not dates:
+            return Response({"error": "La serie no tiene fechas."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                series, reservations, conflicts = create_series(
+                    court, self.booking_user(request), dates,
+                    interval_weeks=data['interval_weeks'], skip_conflicts=data['skip_conflicts']
+                )
+                # Una sola preferencia para toda la serie, colgada de la primera fecha
+                enqueue_payment_preference(reservations[0])
+        except SeriesConflict as e:
+            return Response({"error": e.message, "conflicts": e.conflicts}, status=status.HTTP_409_CONFLICT)
+        except IntegrityError as e:
+            # Otra reserva tomó una de las fechas entre la validación y el INSERT
+            if is_overlap_error(e):
+                return Response(
+                    {"error": "Una de las fechas se reservó recién. Intentá de nuevo."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            raise
+
+        return Response({
+            "series_id": series.id,
+            "reservations": ReservationSerializer(reservations, many=True).data,
+            "conflicts": conflicts,
+            "total_price": sum(reservation.total_price for reservation in reservations),
+            "payment_status": 'pending',
+            "payment_status_url": request.build_absolute_uri(
+                f"/api/reservations/{reservations[0].id}/payment/"
+            ),
+        }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def payment(self, request, pk=None):
+        """
+        Estado de la preferencia de pago de la reserva (polling desde el frontend).
+        'payment_url' viene vacío hasta que el worker crea la preferencia.
+        """
+        reservation = self.get_object()
+        entry = PaymentOutbox.objects.filter(reservation=reservation).first()
+        if entry is None:
+            return Response({"error": "La reserva no tiene un pago asociado."}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "reservation_id": reservation.id,
+            "payment_status": entry.status,
+            "preference_id": entry.preference_id or None,
+            "payment_url": entry.payment_url or None,
+        })
+
+    @action(detail=True, methods=['post'])
+    @query_budget(9)
+    def addons(self, request, pk=None):
+        """
+        Agrega extras en bloque y recalcula los totales una sola vez.
+        Uso: POST /api/reservations/1/addons/ {"items": [{"addon": 3, "quantity": 2}]}
+        """
+        reservation = self.get_object()
+        serializer = AttachAddOnsSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = [(item['addon'], item['quantity']) for item in serializer.validated_data['items']]
+        try:
+            attach_addons(reservation, items)
+        except InsufficientStock as e:
+            return Response({"error": e.messages, "addons": e.addon_ids}, status=status.HTTP_409_CONFLICT)
+        except DjangoValidationError as e:
+            return Response({"error": e.messages}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(ReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+    def void(self, request, pk=None):
+        """Anula la reserva (solo admin) y devuelve el stock de sus extras."""
+        reservation = self.get_object()
+        if not void_reservations([reservation.id]):
+            return Response(
+                {"error": f"No se puede anular una reserva en estado '{reservation.status}'."},
+                status=status.HTTP_409_CONFLICT
+            )
+        reservation.refresh_from_db()
+        return Response(ReservationSerializer(reservation).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def export(self, request):
+        """
+        Exportación completa en streaming (solo admin), ordenada por inicio.
+        Uso: GET /api/reservations/export/?company=1&from=2023-11-01&to=2023-11-30&output=csv|jsonl
+        """
+        try:
+            filters = parse_export_filters(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = reservation_rows(filters['company_id'], filters['first_day'], filters['last_day'])
+        return export_response('reservations', RESERVATION_COLUMNS, rows, filters)
+
     # =========================================================
     # 2. MÉTODO QUOTE (Calculadora de Precios)
     # =========================================================
     @action(detail=False, methods=['post'])
+    @query_budget(2)
     def quote(self, request):
         serializer = QuoteSerializer(data=request.data)
         if not serializer.is_valid():
@@ -100,38 +309,8 @@ class ReservationViewSet(viewsets.ModelViewSet):
     # 3. LÓGICA INTERNA DE PRECIOS
     # =========================================================
     def calculate_complex_price(self, court, start_dt, end_dt):
-        total = Decimal('0.00')
-        breakdown = []
-
-        type_prices = CourtTypePrice.objects.filter(
-            court_type=court.court_type, 
-            company=court.company
-        ).select_related('time_slot')
-
-        req_start_time = start_dt.time()
-        req_end_time = end_dt.time()
-
-        for tp in type_prices:
-            slot = tp.time_slot
-            price_per_hour = tp.price
-
-            overlap_start = max(req_start_time, slot.start_time)
-            overlap_end = min(req_end_time, slot.end_time)
-
-            if overlap_start < overlap_end:
-                dummy_date = datetime.date(2000, 1, 1)
-                dt1 = datetime.datetime.combine(dummy_date, overlap_start)
-                dt2 = datetime.datetime.combine(dummy_date, overlap_end)
-                
-                duration_hours = Decimal((dt2 - dt1).total_seconds() / 3600)
-                cost = duration_hours * price_per_hour
-                total += cost
-
-                breakdown.append({
-                    "slot_name": slot.name,
-                    "price_per_hour": price_per_hour,
-                    "hours": round(duration_hours, 2),
-                    "subtotal": round(cost, 2)
-                })
-
-        return total, breakdown
\ No newline at end of file
+        """
+        Cotiza usando el tarifario precompilado de (empresa, tipo de cancha).
+        Ver core/pricing.py: búsqueda binaria sobre precios acumulados por minuto.
+        """
+        return quote_price(court, start_dt, end_dt)
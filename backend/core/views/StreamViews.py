@@ -0,0 +1,61 @@
+import asyncio
+import json
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+
+from core.availability import parse_day
+from core.events import subscribe
+from core.models import Company
+
+# =========================================================
+#  SSE: CAMBIOS DE DISPONIBILIDAD POR EMPRESA Y DÍA
+# =========================================================
+# Uso (navegador):
+#   const es = new EventSource('/api/stream/companies/1/availability/2023-11-28/')
+#   es.addEventListener('reservation.created', e => ...)
+# El cliente pide la grilla una vez (GET /api/companies/1/availability/) y
+# aplica los deltas. Con 'resync' (se perdieron mensajes) vuelve a pedirla.
+# Necesita un servidor ASGI: bajo WSGI la conexión ocuparía un worker entero.
+
+RETRY_MILLISECONDS = 3000
+
+
+def format_event(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(company_id, day):
+    subscription = subscribe(company_id, day)
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n" + format_event('ready', {"company_id": company_id, "date": day.isoformat()})
+        event_id = 0
+        while True:
+            try:
+                message = await subscription.get(settings.AVAILABILITY_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if subscription.overflowed:
+                subscription.drain()
+                yield format_event('resync', {})
+                continue
+            event_id += 1
+            yield format_event(message["type"], message, event_id)
+    finally:
+        subscription.close()
+
+
+async def availability_stream(request, company_id, day):
+    target_day = parse_day(day)
+    if not target_day:
+        return JsonResponse({"error": "Formato de fecha inválido."}, status=400)
+    if not await Company.objects.filter(pk=company_id).aexists():
+        return JsonResponse({"error": "Empresa no encontrada."}, status=404)
+
+    response = StreamingHttpResponse(event_stream(company_id, target_day), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no bufferizar el stream
+    return response
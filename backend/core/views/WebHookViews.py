@@ -1,17 +1,16 @@
-import mercadopago
 import os
 import hashlib
+import logging
 import hmac
 import urllib.parse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db import transaction
-from django.shortcuts import get_object_or_404
 from django.http import HttpRequest # Necesaria para obtener la URL completa
 
-from core.models import Reservation, Payment
-from decimal import Decimal
+from core.inbox import record_event
+
+logger = logging.getLogger('core.payments')
 
 # --- LÓGICA DE SEGURIDAD HMAC ---
 def validate_signature(request: HttpRequest, secret_key):
@@ -23,7 +22,7 @@ def validate_signature(request: HttpRequest, secret_key):
     xRequestId = request.headers.get("x-request-id")
     
     if not xSignature or not xRequestId:
-        print("❌ VALIDACIÓN FALLIDA: Faltan headers X-Signature o X-Request-Id")
+        logger.warning("Webhook: faltan headers X-Signature o X-Request-Id")
         return False
 
     # 1. Obtener Query params (Django usa request.GET)
@@ -46,7 +45,7 @@ def validate_signature(request: HttpRequest, secret_key):
                 hash_v1 = value
     
     if not ts or not hash_v1 or not dataID:
-        print("❌ VALIDACIÓN FALLIDA: Datos incompletos en el header/query.")
+        logger.warning("Webhook: datos incompletos en el header/query.")
         return False
 
     # 3. Generar el template: id:[data.id_url];request-id:[x-request-id_header];ts:[ts_header];
@@ -60,7 +59,7 @@ def validate_signature(request: HttpRequest, secret_key):
     if sha_calculated == hash_v1:
         return True
     else:
-        print(f"❌ VALIDACIÓN FALLIDA: Firma no coincide.")
+        logger.warning("Webhook: la firma no coincide.")
         return False
 # --- FIN LÓGICA DE SEGURIDAD ---
 
@@ -76,61 +75,16 @@ class MercadoPagoWebhookView(APIView):
         
         if secret_key and not validate_signature(request, secret_key):
              # Si no pasa la validación de firma, ignoramos (para prevenir fraude)
-             print("🚨 ALERTA DE SEGURIDAD: Webhook con firma inválida ignorado.")
+             logger.warning(f"Webhook con firma inválida ignorado: Tipo={event_type}, ID={data_id}")
              return Response(status=status.HTTP_200_OK)
         
-        print(f"🔔 WEBHOOK RECIBIDO: Tipo={event_type}, ID={data_id}")
+        logger.info(f"Webhook recibido: Tipo={event_type}, ID={data_id}")
         
-        if event_type == 'payment' and data_id:
-            return self.handle_payment(data_id)
+        # 3. Guardamos el evento crudo en el inbox y respondemos de inmediato.
+        # La consulta a MP y la actualización de la reserva las hace el worker
+        # (manage.py process_webhook_inbox), fuera del ciclo de la request.
+        if event_type and data_id:
+            record_event(event_type, data_id, request.data if isinstance(request.data, dict) else {})
         
         # Siempre responder 200 OK para evitar que Mercado Pago reintente (Regla de los 22s)
         return Response(status=status.HTTP_200_OK)
-
-    def handle_payment(self, payment_id):
-        """ Lógica para consultar el SDK y actualizar la BD. """
-        try:
-            sdk = mercadopago.SDK(os.getenv("MP_ACCESS_TOKEN"))
-            payment_info = sdk.payment().get(payment_id)
-            
-            if payment_info["status"] != 200:
-                print(f"❌ Pago ID {payment_id} no encontrado en MP.")
-                return Response(status=status.HTTP_200_OK)
-
-            payment_data = payment_info["response"]
-            
-            # Extraer datos clave
-            external_ref = payment_data.get("external_reference") 
-            status_mp = payment_data.get("status") 
-            transaction_amount = payment_data.get("transaction_amount")
-
-            if not external_ref:
-                return Response(status=status.HTTP_200_OK)
-
-            # Actualizar la Reserva en nuestra BD (Transacción Atómica)
-            with transaction.atomic():
-                reservation = Reservation.objects.select_for_update().get(id=external_ref)
-                
-                # Idempotencia: Si ya procesamos este ID, no hacemos nada
-                if Payment.objects.filter(transaction_id=str(payment_id)).exists():
-                    return Response(status=status.HTTP_200_OK)
-
-                # Creamos el registro del pago
-                Payment.objects.create(
-                    reservation=reservation,
-                    amount=transaction_amount,
-                    payment_method='gateway',
-                    status='approved' if status_mp == 'approved' else 'rejected',
-                    transaction_id=str(payment_id)
-                )
-
-                # Si está aprobado, confirmamos la reserva
-                if status_mp == 'approved':
-                    reservation.amount_paid += Decimal(str(transaction_amount))
-                    reservation.save()
-                    print(f"   ✅ ¡RESERVA CONFIRMADA! Saldo pagado: {reservation.amount_paid}")
-
-        except Exception as e:
-            print(f"Error interno webhook: {e}")
-        
-        return Response(status=status.HTTP_200_OK)
\ No newline at end of file
@@ -1,3 +1,4 @@
 from .CompanyViews import CompanyViewSet
 from .Courtviews import CourtViewSet
-from .ReservationViews import ReservationViewSet
\ No newline at end of file
+from .ReservationViews import ReservationViewSet
+from .PaymentViews import PaymentViewSet
@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+# =========================================================
+#  UTILIDADES PARA COLAS RESPALDADAS EN LA BD
+# =========================================================
+# Las tablas de cola (outbox/inbox) tienen 'status', 'attempts' y
+# 'available_at'. Un worker "reclama" filas con SKIP LOCKED y las marca
+# con un lease: si el proceso muere, la fila vuelve a estar disponible
+# cuando vence el lease.
+
+
+def backoff_delay(attempts, base=2, cap=300):
+    """Segundos de espera antes del siguiente intento (exponencial con tope)."""
+    return min(cap, base ** attempts)
+
+
+def claim_batch(queryset, batch_size, lease_seconds=60):
+    """
+    Reclama hasta batch_size filas del queryset que estén disponibles.
+    Devuelve la lista de IDs reclamados. La transacción es corta: solo
+    bloquea las filas el tiempo de marcarlas como 'processing'.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            queryset.filter(available_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('available_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            queryset.model.objects.filter(id__in=ids).update(
+                status='processing',
+                attempts=F('attempts') + 1,
+                available_at=now + timedelta(seconds=lease_seconds),
+            )
+    return ids
+
+
+def run_in_pool(func, items, workers):
+    """Ejecuta func(item) en un pool de threads; cada thread cierra su conexión al terminar."""
+    def wrapped(item):
+        try:
+            return func(item)
+        finally:
+            connection.close()
+
+    if workers <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(wrapped, items))
+
+
+def run_loop(drain, interval, once=False, stdout=None):
+    """Llama a drain() hasta que se interrumpa; duerme 'interval' segundos si no hubo trabajo."""
+    while True:
+        processed = drain()
+        if stdout and processed:
+            stdout.write(f"Procesados: {processed}")
+        if once:
+            return processed
+        if not processed:
+            time.sleep(interval)
@@ -4,6 +4,18 @@ import { useState } from 'react';
 import axios, { isAxiosError } from 'axios';
 // Ya no necesitamos importar MercadoPagoButton.
 
+// La preferencia de pago se crea en segundo plano (outbox en el backend):
+// consultamos /reservations/{id}/payment/ hasta que tenga la URL.
+async function waitForPaymentUrl(reservationId: number, attempts = 20, delayMs = 500): Promise<string | null> {
+  for (let i = 0; i < attempts; i++) {
+    const { data } = await axios.get(`${process.env.NEXT_PUBLIC_API_URL}/reservations/${reservationId}/payment/`);
+    if (data.payment_url) return data.payment_url;
+    if (data.payment_status === 'failed') return null;
+    await new Promise((resolve) => setTimeout(resolve, delayMs));
+  }
+  return null;
+}
+
 export default function Home() {
   // Almacenamos la URL de pago. Si está llena, mostramos el enlace de redirección.
   const [paymentUrl, setPaymentUrl] = useState<string | null>(null); 
@@ -27,7 +39,7 @@ export default function Home() {
 
       console.log("Respuesta Backend:", response.data);
       
-      const { payment_url } = response.data;
+      const payment_url = response.data.payment_url ?? await waitForPaymentUrl(response.data.id);
       
       if (payment_url) {
         // Redirigir al usuario al link de pago de Mercado Pago